@@ -0,0 +1,184 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import inc
+
+# Analyses running at once in this process, across all sessions
+MAX_ACTIVE_ANALYSES = int(os.environ.get("COPYCHECK_MAX_ACTIVE_ANALYSES", 4))
+# Analyses one user may run at once; their other submissions wait behind other users
+MAX_ACTIVE_PER_USER = 1
+# Submissions waiting for a slot; beyond this new ones are turned away at once
+MAX_QUEUED_ANALYSES = int(os.environ.get("COPYCHECK_MAX_QUEUED_ANALYSES", 50))
+# Seconds a submission may wait for a slot before giving up
+MAX_QUEUE_WAIT = 120
+
+
+class AdmissionError(Exception):
+    """Raised when an analysis is not admitted because the queue is full or the wait too long"""
+
+
+class _Call:
+    """One in-flight call whose result is shared by every caller with the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.completed = False
+        self.followers = 0
+
+    def wait(self):
+        """Wait for the call to finish and return its result (None if the leader stopped first), or raise its error"""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls: the first caller does the work, the others wait for its result"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Return (call, leader); the leader must call finish, the others call.wait()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                inc("copycheck_coalesced_requests_total", stage=self.name)
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None, completed=True):
+        """Publish the leader's result (or error) to the waiting callers; completed is False when
+        the leader stopped before the end"""
+        with self._lock:
+            self._calls.pop(key, None)
+        call.result = result
+        call.error = error
+        call.completed = completed
+        call.done.set()
+        if call.followers:
+            logging.info(f"{call.followers} identical {self.name} request(s) served by one upstream call")
+
+    def do(self, key, function, *args, **kwargs):
+        """Run function once for every concurrent caller with the same key and return its result"""
+        call, leader = self.join(key)
+        if not leader:
+            result = call.wait()
+            if call.completed:
+                return result
+            # The leader stopped before the end, so this caller runs the call itself
+            return self.do(key, function, *args, **kwargs)
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        except BaseException:
+            # The leader was interrupted (a Streamlit rerun): the followers retry on their own
+            self.finish(key, call, completed=False)
+            raise
+        self.finish(key, call, result)
+        return result
+
+
+class AdmissionController:
+    """Fair admission of analyses: global and per-user limits on running analyses, with a bounded
+    queue served round-robin across users so one user's burst does not hold everyone else back"""
+
+    def __init__(self, max_active=MAX_ACTIVE_ANALYSES, max_active_per_user=MAX_ACTIVE_PER_USER,
+                 max_queued=MAX_QUEUED_ANALYSES, max_wait=MAX_QUEUE_WAIT):
+        self.max_active = max_active
+        self.max_active_per_user = max_active_per_user
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._active = {}
+        self._waiting = []
+        self._sequence = itertools.count()
+        # Start-time fair queueing: each submission is tagged one round after the user's previous one
+        # (or the round being served), and the lowest tag is admitted first
+        self._round = 0
+        self._last_round = {}
+
+    @contextmanager
+    def admit(self, user, on_wait=None):
+        """Hold an analysis slot for user during the block, waiting in the queue if needed.
+
+        on_wait(position) is called each time the 1-based queue position changes while waiting.
+        Raises AdmissionError when the queue is full or the wait exceeds max_wait.
+        """
+        user = (user or "").strip().lower()
+        with self._condition:
+            ticket = (max(self._round, self._last_round.get(user, 0)) + 1, next(self._sequence), user)
+            self._waiting.append(ticket)
+            if len(self._waiting) > self.max_queued and not self._can_start(ticket, sorted(self._waiting)):
+                self._waiting.remove(ticket)
+                inc("copycheck_admission_total", result="rejected")
+                logging.warning(f"Analysis queue full ({len(self._waiting)} waiting), submission turned away")
+                raise AdmissionError("Too many analyses are waiting")
+            self._last_round[user] = ticket[0]
+
+        deadline = time.monotonic() + self.max_wait
+        position = None
+        try:
+            while True:
+                with self._condition:
+                    order = sorted(self._waiting)
+                    if self._can_start(ticket, order):
+                        self._waiting.remove(ticket)
+                        self._active[user] = self._active.get(user, 0) + 1
+                        self._round = max(self._round, ticket[0])
+                        self._last_round = {name: last for name, last in self._last_round.items() if last > self._round}
+                        break
+                    current = order.index(ticket) + 1
+                    if current == position:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            inc("copycheck_admission_total", result="timed_out")
+                            raise AdmissionError(f"No analysis slot within {self.max_wait}s")
+                        self._condition.wait(min(remaining, 1.0))
+                        continue
+                # The callback may draw in the UI, so it runs outside the lock
+                position = current
+                if on_wait:
+                    on_wait(position)
+        except BaseException:
+            with self._condition:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+            raise
+        inc("copycheck_admission_total", result="queued" if position else "admitted")
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active[user] -= 1
+                if not self._active[user]:
+                    del self._active[user]
+                self._condition.notify_all()
+
+    def stats(self):
+        """Return the number of running and waiting analyses"""
+        with self._condition:
+            return {"active": sum(self._active.values()), "queued": len(self._waiting)}
+
+    def _can_start(self, ticket, order):
+        if sum(self._active.values()) >= self.max_active:
+            return False
+        for candidate in order:
+            if self._active.get(candidate[2], 0) < self.max_active_per_user:
+                return candidate == ticket
+        return False
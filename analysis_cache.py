@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Default location of the on-disk cache tier
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "analysis_cache.sqlite3")
+
+# Function to normalize text before hashing
+def normalize_text(text):
+    """Normalize text so that cosmetic whitespace changes map to the same key"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r'\s+', ' ', text).strip()
+
+# Function to build a cache key
+def make_cache_key(text, model, system_prompt, params):
+    """Build a content-addressed key from the text and everything that shapes the response"""
+    payload = json.dumps({
+        "text": normalize_text(text),
+        "model": model,
+        "system_prompt": system_prompt,
+        "params": params
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier cache (in-process LRU + SQLite) for raw analysis responses"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, memory_size=256, ttl=7 * 24 * 3600, max_disk_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._db = None
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)")
+            self._db.commit()
+        except Exception as e:
+            # The memory tier keeps working even if the disk tier is unavailable
+            logging.error(f"Analysis cache disk tier disabled: {str(e)}")
+            self._db = None
+
+    def get(self, key):
+        """Return the cached response for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, created_at = row
+                        if now - created_at <= self.ttl:
+                            self._db.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                            self._db.commit()
+                            self._remember(key, value, created_at)
+                            self._stats["disk_hits"] += 1
+                            return value
+                        self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    logging.error(f"Analysis cache read failed: {str(e)}")
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        """Store a response in both tiers"""
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["writes"] += 1
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, len(value.encode("utf-8")))
+                )
+                self._evict_disk(now)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Analysis cache write failed: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = 0
+            stats["disk_bytes"] = 0
+            if self._db is not None:
+                try:
+                    count, total = self._db.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache"
+                    ).fetchone()
+                    stats["disk_entries"] = count
+                    stats["disk_bytes"] = total
+                except sqlite3.Error as e:
+                    logging.error(f"Analysis cache stats failed: {str(e)}")
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM analysis_cache")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.error(f"Analysis cache clear failed: {str(e)}")
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        # Expired entries go first, then least recently used until under the size cap
+        cursor = self._db.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,))
+        self._stats["evictions"] += max(cursor.rowcount, 0)
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM analysis_cache ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            total -= size
+            self._stats["evictions"] += 1
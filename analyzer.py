@@ -0,0 +1,506 @@
+import json
+import logging
+import os
+import re
+import time
+from admission import SingleFlight
+from analysis_cache import make_cache_key
+from compaction import compact_text, fit_to_budget
+from metrics import inc, record_stage, record_usage, span
+
+# Criteria recognized in the model response, in prompt order
+CRITERIA_DESCRIPTIONS = {
+    'Empathy': 'audience understanding',
+    'Clarity': 'clear message',
+    'Attention': 'headlines/hooks',
+    'Flow': 'structure',
+    'Benefits': 'value focus',
+    'Action': 'call-to-action',
+    'Trust': 'credibility',
+    'Emotion': 'storytelling',
+    'Adaptation': 'medium fit',
+    'Influence': 'persuasion'
+}
+CRITERIA = list(CRITERIA_DESCRIPTIONS)
+
+# Function to list criteria for a prompt
+def describe_criteria(criteria):
+    """Numbered criterion list used in the prompts"""
+    return "\n".join(f"{i}. {name} ({CRITERIA_DESCRIPTIONS[name]})" for i, name in enumerate(criteria, start=1))
+
+# Completion tokens reserved per criterion: two sentences capped at 25 words, the name, the score
+# and the JSON syntax (about 90 tokens), with some headroom
+TOKENS_PER_CRITERION = 120
+# Completion tokens reserved for the wrapping object
+OUTPUT_OVERHEAD_TOKENS = 32
+
+# Function to size the completion
+def output_token_budget(criteria_count):
+    """max_tokens for a response scoring criteria_count criteria"""
+    return TOKENS_PER_CRITERION * criteria_count + OUTPUT_OVERHEAD_TOKENS
+
+# Analysis model settings (also part of the cache key)
+ANALYSIS_MODEL = "llama-3.3-70b-versatile"
+SYSTEM_PROMPT = (
+    "Evaluate the article on 10 copywriting criteria (10 points each):\n" + describe_criteria(CRITERIA) +
+    "\n\nFor each criterion provide:\nScore: X/10\nReasoning: Brief explanation (at most 25 words)\n"
+    "Improvement: One key suggestion (at most 25 words)"
+)
+ANALYSIS_PARAMS = {
+    "temperature": 0.1,
+    "max_tokens": output_token_budget(len(CRITERIA)),
+    "top_p": 1,
+    "seed": 42
+}
+
+# Structured (JSON mode) variant used when the response is not streamed
+STRUCTURED_OUTPUT_FORMAT = (
+    'Respond with a JSON object of the form {"criteria": [{"name": "<criterion>", "score": <integer 0-10>, '
+    '"reasoning": "<brief explanation, at most 25 words>", "improvement": "<one key suggestion, at most 25 words>"}]} '
+    'with one entry per criterion.'
+)
+STRUCTURED_SYSTEM_PROMPT = (
+    "Evaluate the article on 10 copywriting criteria (10 points each):\n" + describe_criteria(CRITERIA) +
+    "\n\n" + STRUCTURED_OUTPUT_FORMAT
+)
+STRUCTURED_PARAMS = dict(ANALYSIS_PARAMS, response_format={"type": "json_object"})
+
+# Longer texts are analyzed in chunks (see chunking.py)
+MAX_TEXT_LENGTH = 12000
+# Prompt tokens of text sent in one request; longer texts are cut at a sentence boundary
+MAX_INPUT_TOKENS = int(os.environ.get("COPYCHECK_MAX_INPUT_TOKENS", 4000))
+
+# Single tokenizer for the legacy text format. Reasoning and Improvement consume the rest
+# of their line so criterion names mentioned inside them are not taken as headers.
+_TOKEN_RE = re.compile(
+    r'Reasoning:[^\n]*'
+    r'|Score:[*\s]*(?P<score>\d+(?:\.\d+)?)'
+    r'|Improvement:[*\s]*(?P<improvement>[^\n]*)'
+    r'|\b(?P<criterion>' + '|'.join(CRITERIA) + r')\b'
+)
+_CRITERIA_BY_NAME = {name.lower(): name for name in CRITERIA}
+
+
+class AnalysisError(Exception):
+    """Raised when the model returns an unusable response"""
+
+
+# Function to prepare text for the model
+def prepare_text(text):
+    """Compact text (whitespace, duplicates, cookie banners) and fit it into the input token budget"""
+    with span("compact_text", input_bytes=len(text.encode('utf-8'))) as attributes:
+        text = fit_to_budget(compact_text(text), MAX_INPUT_TOKENS)
+        attributes["output_bytes"] = len(text.encode('utf-8'))
+    return text
+
+# Identical analyses requested at the same time (one shared link, many sessions) share one model call
+_analysis_calls = SingleFlight("llm")
+
+# Function to get the cache key of a text
+def analysis_cache_key(text, structured=True):
+    """Get the cache key for an already prepared text"""
+    if structured:
+        return make_cache_key(text, ANALYSIS_MODEL, STRUCTURED_SYSTEM_PROMPT, STRUCTURED_PARAMS)
+    return make_cache_key(text, ANALYSIS_MODEL, SYSTEM_PROMPT, ANALYSIS_PARAMS)
+
+# Function to build the chat messages
+def build_messages(text, system_prompt=SYSTEM_PROMPT):
+    """Build the system and user messages sent to the model"""
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
+
+# Function to look up a cached response
+def get_cached_response(cache, cache_key):
+    """Return the cached response for cache_key (or None) and count the lookup"""
+    if cache is None:
+        return None
+    response = cache.get(cache_key)
+    inc("copycheck_cache_requests_total", result="hit" if response else "miss")
+    return response
+
+# Function to get the model that answered
+def answering_model(completion):
+    """Model named in a completion or stream chunk, defaulting to the analysis model"""
+    return getattr(completion, "model", None) or ANALYSIS_MODEL
+
+# Function to record the model that answered in a response
+def mark_model(response, model):
+    """Return a structured response naming model when it is not the analysis model"""
+    if model == ANALYSIS_MODEL or not response:
+        return response
+    try:
+        data = json.loads(response)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or "criteria" not in data:
+        scores, suggestions, _ = parse_analysis(response)
+        data = {"criteria": json.loads(format_analysis(scores, suggestions))["criteria"]}
+    data["model"] = model
+    return json.dumps(data, ensure_ascii=False)
+
+# Function to get the model that produced a response
+def response_model(response):
+    """Model named in a structured response (a fallback model), defaulting to the analysis model"""
+    if response and isinstance(response, str) and response.lstrip().startswith('{'):
+        try:
+            data = json.loads(response)
+        except ValueError:
+            return ANALYSIS_MODEL
+        if isinstance(data, dict) and data.get("model"):
+            return data["model"]
+    return ANALYSIS_MODEL
+
+# Function to request an analysis from the model
+def request_analysis(client, text, cache=None):
+    """Request a structured analysis and return it as JSON, using the cache when given"""
+    text = prepare_text(text)
+
+    cache_key = analysis_cache_key(text)
+    cached_response = get_cached_response(cache, cache_key)
+    if cached_response:
+        logging.info(f"Analysis cache hit ({cache.stats()['hit_rate']:.0%} hit rate)")
+        return cached_response
+    return _analysis_calls.do(cache_key, fetch_analysis, client, text, cache_key, cache)
+
+# Function to call the model for an analysis
+def fetch_analysis(client, text, cache_key, cache=None):
+    """Request a structured analysis of a prepared text from the model and cache it"""
+    with span("llm", input_bytes=len(text.encode('utf-8'))) as attributes:
+        completion = client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_messages(text, STRUCTURED_SYSTEM_PROMPT),
+            stream=False,
+            stop=None,
+            **STRUCTURED_PARAMS
+        )
+        response = completion.choices[0].message.content
+        attributes["output_bytes"] = len((response or "").encode('utf-8'))
+    model = answering_model(completion)
+    record_usage(getattr(completion, "usage", None), model)
+    logging.debug(f"Response length: {len(response or '')} characters")
+
+    if not response or not response.strip():
+        raise AnalysisError("Réponse vide reçue de l'API")
+
+    response = complete_analysis(client, text, mark_model(response, model), cache=cache)
+    # Answers from a fallback model are not cached, so the next request tries the analysis model again
+    if cache is not None and response_model(response) == ANALYSIS_MODEL:
+        cache.set(cache_key, response)
+    return response
+
+# Function to request a structured response with a custom prompt
+def request_structured(client, text, system_prompt, max_tokens, cache=None):
+    """Send text with a custom JSON-mode system prompt and return the raw response"""
+    params = dict(STRUCTURED_PARAMS, max_tokens=max_tokens)
+
+    cache_key = make_cache_key(text, ANALYSIS_MODEL, system_prompt, params)
+    cached_response = get_cached_response(cache, cache_key)
+    if cached_response:
+        return cached_response
+
+    with span("llm", input_bytes=len(text.encode('utf-8'))) as attributes:
+        completion = client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_messages(text, system_prompt),
+            stream=False,
+            stop=None,
+            **params
+        )
+        response = completion.choices[0].message.content or ""
+        attributes["output_bytes"] = len(response.encode('utf-8'))
+    model = answering_model(completion)
+    record_usage(getattr(completion, "usage", None), model)
+    if cache is not None and response.strip() and model == ANALYSIS_MODEL:
+        cache.set(cache_key, response)
+    return mark_model(response, model)
+
+# Function to request only some criteria
+def request_missing_criteria(client, text, missing, cache=None):
+    """Ask the model to score only the missing criteria and return the raw JSON response"""
+    system_prompt = (
+        f"Evaluate the article on these {len(missing)} copywriting criteria (10 points each):\n" +
+        describe_criteria(missing) + "\n\n" + STRUCTURED_OUTPUT_FORMAT
+    )
+    logging.info(f"Re-querying missing criteria: {', '.join(missing)}")
+    inc("copycheck_retries_total", stage="missing_criteria")
+    return request_structured(client, text, system_prompt, output_token_budget(len(missing)), cache=cache)
+
+# Function to fill in criteria missing from a response
+def complete_analysis(client, text, response, cache=None):
+    """Re-query only the criteria missing from response and return the merged result as JSON"""
+    scores, suggestions, missing = parse_analysis(response)
+    if not missing:
+        return response
+
+    try:
+        extra = request_missing_criteria(client, text, missing, cache=cache)
+    except Exception as e:
+        logging.error(f"Re-query of missing criteria failed: {str(e)}")
+        return response
+    extra_scores, extra_suggestions, still_missing = parse_analysis(extra)
+
+    if still_missing:
+        logging.warning(f"Criteria still missing after re-query: {', '.join(still_missing)}")
+    scores.update(extra_scores)
+    suggestions.update(extra_suggestions)
+    return format_analysis(scores, suggestions, model=fallback_model(response, extra))
+
+# Function to find a fallback model among responses
+def fallback_model(*responses):
+    """First fallback model that produced one of responses, or None if the analysis model answered them all"""
+    for response in responses:
+        model = response_model(response)
+        if model != ANALYSIS_MODEL:
+            return model
+    return None
+
+# Function to serialize scores and suggestions
+def format_analysis(scores, suggestions, model=None):
+    """Serialize scores and suggestions in the structured response format, naming model if it was a fallback"""
+    data = {"criteria": [
+        {"name": name, "score": scores[name], "improvement": suggestions.get(name, "")}
+        for name in CRITERIA if name in scores
+    ]}
+    if model and model != ANALYSIS_MODEL:
+        data["model"] = model
+    return json.dumps(data, ensure_ascii=False)
+
+# Function to stream an analysis from the model
+def stream_analysis(client, text, cache=None, answer=None):
+    """Yield the model response in chunks as they arrive, using the cache when given.
+
+    answer, if given, is a dict whose "model" is set to the model that answered.
+    """
+    answer = {} if answer is None else answer
+    answer["model"] = ANALYSIS_MODEL
+    text = prepare_text(text)
+
+    cache_key = analysis_cache_key(text, structured=False)
+    cached_response = get_cached_response(cache, cache_key)
+    if cached_response:
+        logging.info(f"Analysis cache hit ({cache.stats()['hit_rate']:.0%} hit rate)")
+        yield cached_response
+        return
+
+    # A session streaming the same analysis already pays for it: wait for its full response instead
+    call, leader = _analysis_calls.join(cache_key)
+    if not leader:
+        result = call.wait()
+        if result:
+            response, answer["model"] = result
+            yield response
+            return
+    else:
+        try:
+            response = yield from stream_response(client, text, cache_key, cache, answer)
+        except Exception as e:
+            _analysis_calls.finish(cache_key, call, error=e)
+            raise
+        except BaseException:
+            # The consumer stopped early (a Streamlit rerun): the waiting sessions stream on their own
+            _analysis_calls.finish(cache_key, call, completed=False)
+            raise
+        _analysis_calls.finish(cache_key, call, (response, answer["model"]))
+        return
+    # The session being waited on stopped before the end
+    yield from stream_response(client, text, cache_key, cache, answer)
+
+# Function to stream a response from the model
+def stream_response(client, text, cache_key, cache=None, answer=None):
+    """Yield the model response to a prepared text in chunks, cache it and return it whole
+    (the model that answered goes in answer["model"])"""
+    parts = []
+    usage = None
+    model = None
+    # Only the time spent waiting on the model is recorded, not the time the caller spends between chunks
+    attributes = {"input_bytes": len(text.encode('utf-8')), "stream": True}
+    waited = 0.0
+    status = "error"
+    try:
+        started = time.perf_counter()
+        stream = iter(client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_messages(text),
+            stream=True,
+            stop=None,
+            **ANALYSIS_PARAMS
+        ))
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration:
+                waited += time.perf_counter() - started
+                break
+            waited += time.perf_counter() - started
+            attributes.setdefault("first_token_ms", round(waited * 1000, 3))
+            model = model or answering_model(chunk)
+            # Groq reports usage on the last chunk of a stream
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+            started = time.perf_counter()
+        status = "ok"
+    finally:
+        attributes["output_bytes"] = sum(len(part.encode('utf-8')) for part in parts)
+        record_stage("llm", waited, status, attributes)
+    model = model or ANALYSIS_MODEL
+    record_usage(usage, model)
+    if answer is not None:
+        answer["model"] = model
+
+    response = "".join(parts)
+    logging.debug(f"Response length: {len(response)} characters")
+    if not response.strip():
+        raise AnalysisError("Réponse vide reçue de l'API")
+
+    if cache is not None and model == ANALYSIS_MODEL:
+        cache.set(cache_key, response)
+    return response
+
+# Function to stream criteria including re-queried ones
+def stream_criteria(client, text, cache=None, answer=None):
+    """Yield (criterion, score, suggestion) from the stream, then re-query any missing criteria.
+
+    answer, if given, is a dict whose "model" is set to the model that answered
+    (a fallback model if it answered any part).
+    """
+    answer = {} if answer is None else answer
+    seen = set()
+    for item in iter_parsed_criteria(stream_analysis(client, text, cache=cache, answer=answer)):
+        seen.add(item[0])
+        yield item
+
+    missing = [name for name in CRITERIA if name not in seen]
+    if not missing:
+        return
+    try:
+        extra = request_missing_criteria(client, prepare_text(text), missing, cache=cache)
+    except Exception as e:
+        logging.error(f"Re-query of missing criteria failed: {str(e)}")
+        return
+    scores, suggestions, _ = parse_analysis(extra)
+    if answer["model"] == ANALYSIS_MODEL:
+        answer["model"] = response_model(extra)
+    for name in missing:
+        if name in scores:
+            yield (name, scores[name], suggestions.get(name, ""))
+
+# Function to parse criteria incrementally
+def iter_parsed_criteria(chunks):
+    """Yield (criterion, score, suggestion) as soon as each criterion block is complete"""
+    buffer = ""
+    current = {"criterion": None, "score": None, "suggestion": ""}
+    emitted = set()
+
+    def finish():
+        if current["criterion"] and current["score"] is not None and current["criterion"] not in emitted:
+            emitted.add(current["criterion"])
+            return (current["criterion"], current["score"], current["suggestion"])
+        return None
+
+    def handle(line):
+        done = []
+        for match in _TOKEN_RE.finditer(line):
+            if match.group('criterion'):
+                # A new header closes the previous block even without an improvement line
+                if match.group('criterion') != current["criterion"]:
+                    done.append(finish())
+                    current.update(criterion=match.group('criterion'), score=None, suggestion="")
+            elif match.group('score'):
+                current["score"] = to_score(match.group('score'))
+            elif match.group('improvement') is not None:
+                current["suggestion"] = match.group('improvement').strip().strip('*').strip()
+                done.append(finish())
+        return [item for item in done if item]
+
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            yield from handle(line)
+
+    yield from handle(buffer)
+    done = finish()
+    if done:
+        yield done
+
+# Function to normalize a score value
+def to_score(value):
+    """Convert a score to a number clamped to 0-10, or None"""
+    try:
+        score = float(str(value).split('/')[0].strip())
+    except ValueError:
+        return None
+    score = float(min(max(score, 0), 10))
+    return int(score) if score.is_integer() else score
+
+# Function to parse a structured response
+def parse_structured_result(data):
+    """Validate a JSON response in one pass and return scores and suggestions"""
+    items = data.get("criteria", data) if isinstance(data, dict) else data
+    if isinstance(items, dict):
+        items = [dict(value, name=name) if isinstance(value, dict) else {"name": name, "score": value}
+                 for name, value in items.items()]
+
+    scores = {}
+    suggestions = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        name = _CRITERIA_BY_NAME.get(str(item.get("name", "")).strip().lower())
+        score = to_score(item.get("score"))
+        if name is None or score is None or name in scores:
+            continue
+        scores[name] = score
+        suggestions[name] = str(item.get("improvement") or "").strip()
+    return scores, suggestions
+
+# Function to parse a response in either format
+def parse_analysis(result):
+    """Parse a JSON or legacy text response and report which criteria are missing"""
+    scores = {}
+    suggestions = {}
+    if result and isinstance(result, str):
+        data = None
+        if result.lstrip().startswith(('{', '[')):
+            try:
+                data = json.loads(result)
+            except ValueError:
+                logging.warning("Response is not valid JSON, falling back to the text format")
+        if data is not None:
+            scores, suggestions = parse_structured_result(data)
+        else:
+            for name, score, suggestion in iter_parsed_criteria([result]):
+                scores[name] = score
+                suggestions[name] = suggestion
+
+    missing = [name for name in CRITERIA if name not in scores]
+    if missing:
+        logging.warning(f"Criteria missing from response: {', '.join(missing)}")
+    return scores, suggestions, missing
+
+# Function to parse analysis result
+def parse_analysis_result(result):
+    """Parse the analysis result and extract scores and suggestions"""
+    if not result or not isinstance(result, str):
+        logging.error("Invalid result format")
+        return {}, {}
+
+    with span("parse_analysis_result", input_bytes=len(result.encode('utf-8'))):
+        scores, suggestions, _ = parse_analysis(result)
+    if not scores:
+        logging.error("No scores found in response")
+        return {}, {}
+
+    logging.debug(f"Parsed scores: {scores}")
+    logging.debug(f"Parsed suggestions: {suggestions}")
+    return scores, suggestions
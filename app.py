@@ -1,18 +1,23 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
-from groq import Groq
-import re
 import time
-from fpdf import FPDF
-from fpdf.enums import XPos, YPos
 import validators
-import base64
 from datetime import datetime
-import requests
-import json
-from bs4 import BeautifulSoup
 import logging
+import os
+import uuid
+from engine import (configure, get_admission_controller, get_analysis_cache, get_groq_client, get_history_store,
+                    get_near_duplicate_index)
+from admission import AdmissionError
+from analyzer import (ANALYSIS_MODEL, CRITERIA, AnalysisError, parse_analysis_result, response_model,
+                      stream_criteria)
+from chunking import analyze_document, fits_in_one_request
+from drafts import DraftStore, analyze_draft
+from ingestion import extract_articles
+from charts import overall_gauge_svg, score_gauge_svg
+from delivery import DeliveryQueue
+from report import create_pdf_report, get_improvement_summary
+from metrics import span, start_metrics_server
+from routing import REJECTION_MESSAGES, WARNING_MESSAGES, triage
 
 # Configure logging
 logging.basicConfig(
@@ -20,26 +25,45 @@ logging.basicConfig(
     format='%(levelname)s - %(message)s'
 )
 
+DEGRADED_MESSAGE = "The AI analysis is unavailable right now, so these are preliminary local scores. Please try again later for the full analysis and emailed report."
+HISTORY_MESSAGE = "You analyzed this exact text on {date}, so its saved results are shown without a new analysis."
+NEAR_DUPLICATE_MESSAGE = "This text is {similarity:.0%} similar to one analyzed recently, so its scores were reused."
+QUEUE_MESSAGE = "Many analyses are running right now. You are number {position} in the queue."
+PARTIAL_MESSAGE = "The AI analysis stopped before scoring every criterion, so the missing ones show preliminary local scores. Please try again later for the full analysis and emailed report."
+BUSY_MESSAGE = "Copycheck is very busy right now, so these are preliminary local scores. Please try again in a few minutes for the full analysis and emailed report."
+
 # Load API keys from Streamlit secrets
 try:
-    groq_api_key = st.secrets["groq"]["api_key"]
-    if not groq_api_key or groq_api_key.isspace():
-        raise ValueError("Groq API key is empty")
-    resend_api_key = st.secrets["resend"]["api_key"]
-    sender_email = st.secrets["resend"]["sender_email"]
-    audience_id = st.secrets["resend"]["audience_id"]
+    settings = configure(st.secrets.to_dict())
+    resend_api_key = settings["resend_api_key"]
+    sender_email = settings["sender_email"]
+    audience_id = settings["audience_id"]
+    if not (resend_api_key and sender_email and audience_id):
+        raise ValueError("Resend settings are incomplete")
 except Exception as e:
     st.error("Erreur de configuration : Vérifiez que le fichier secrets.toml contient toutes les clés API nécessaires.")
     logging.error(f"Configuration error: {str(e)}")
     st.stop()
 
-# Initialize Groq client
-try:
-    groq_client = Groq(api_key=groq_api_key)
-except Exception as e:
-    st.error("Erreur d'initialisation de l'API Groq. Veuillez vérifier votre clé API.")
-    logging.error(f"Groq client initialization error: {str(e)}")
-    st.stop()
+# Metrics endpoint for Prometheus, one per process (set METRICS_PORT to enable)
+@st.cache_resource
+def get_metrics_server():
+    """Start the metrics endpoint once per process"""
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return start_metrics_server(int(port))
+    except Exception as e:
+        logging.error(f"Metrics endpoint error: {str(e)}")
+        return None
+
+# Function to describe a failed Groq call
+def api_error_message(api_error):
+    """Message shown to the user, telling rate limiting apart from other API errors"""
+    if getattr(api_error, "status_code", None) == 429:
+        return "Erreur lors de l'appel à l'API Groq: trop de demandes en ce moment, veuillez réessayer dans quelques minutes."
+    return f"Erreur lors de l'appel à l'API Groq: {str(api_error)}"
 
 # Function to analyze text based on copywriting criteria
 def analyze_text(text):
@@ -48,389 +72,244 @@ def analyze_text(text):
         logging.debug("Starting analysis...")
         logging.debug(f"Text length: {len(text)} characters")
         
-        # Truncate text if it's too long
-        max_text_length = 12000
-        if len(text) > max_text_length:
-            text = text[:max_text_length] + "..."
-            logging.warning(f"Text truncated to {max_text_length} characters")
+        try:
+            with span("analyze_text", input_bytes=len(text.encode('utf-8'))):
+                response = analyze_document(get_groq_client(), text, cache=get_analysis_cache())
+            logging.debug("Analysis complete")
+        except AnalysisError:
+            raise
+        except Exception as api_error:
+            logging.error(f"API call failed: {str(api_error)}")
+            raise Exception(api_error_message(api_error))
         
-        logging.debug("Preparing API call to Groq...")
-        logging.debug(f"Using API key: {groq_api_key[:4]}{'*' * (len(groq_api_key)-8)}{groq_api_key[-4:]}")
+        return response
+            
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        error_msg = str(e) if "Erreur lors de l'appel à l'API Groq" in str(e) else "Une erreur s'est produite lors de l'analyse. Veuillez réessayer ou contacter le support si le problème persiste."
+        st.error(error_msg)
+        return None
+
+# Function to analyze a new version of a named draft
+def analyze_draft_text(text, owner, draft_name):
+    """Analyze a draft version, re-scoring only what changed since the previous one"""
+    try:
+        logging.debug(f"Starting analysis of draft '{draft_name}'...")
         
-        # Use non-streaming API call
         try:
-            completion = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Evaluate the article on 10 copywriting criteria (10 points each):\n1. Empathy (audience understanding)\n2. Clarity (clear message)\n3. Attention (headlines/hooks)\n4. Flow (structure)\n5. Benefits (value focus)\n6. Action (call-to-action)\n7. Trust (credibility)\n8. Emotion (storytelling)\n9. Adaptation (medium fit)\n10. Influence (persuasion)\n\nFor each criterion provide:\nScore: X/10\nReasoning: Brief explanation\nImprovement: One key suggestion"
-                    },
-                    {
-                        "role": "user",
-                        "content": text
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=2048,
-                top_p=1,
-                stream=False,
-                stop=None,
-                seed=42
-            )
-            logging.debug("API call successful")
+            with span("analyze_text", input_bytes=len(text.encode('utf-8')), draft=True):
+                response, version = analyze_draft(get_groq_client(), get_draft_store(), owner, draft_name, text, cache=get_analysis_cache())
+            logging.debug("Analysis complete")
+        except AnalysisError:
+            raise
         except Exception as api_error:
             logging.error(f"API call failed: {str(api_error)}")
-            raise Exception(f"Erreur lors de l'appel à l'API Groq: {str(api_error)}")
-        
-        response = completion.choices[0].message.content
-        logging.debug("Analysis complete")
-        logging.debug(f"Response length: {len(response)} characters")
+            raise Exception(api_error_message(api_error))
         
-        if not response or not response.strip():
-            raise Exception("Réponse vide reçue de l'API")
+        return response, version
             
-        return response
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        error_msg = str(e) if "Erreur lors de l'appel à l'API Groq" in str(e) else "Une erreur s'est produite lors de l'analyse. Veuillez réessayer ou contacter le support si le problème persiste."
+        st.error(error_msg)
+        return None, None
+
+# Function to analyze text with streaming
+def analyze_text_stream(text, answer=None):
+    """Yield (criterion, score, suggestion) as each criterion of the analysis completes
+    (answer["model"] is set to the model that answered)"""
+    try:
+        logging.debug("Starting streaming analysis...")
+        logging.debug(f"Text length: {len(text)} characters")
+        
+        try:
+            yield from stream_criteria(get_groq_client(), text, cache=get_analysis_cache(), answer=answer)
+            logging.debug("Analysis complete")
+        except AnalysisError:
+            raise
+        except Exception as api_error:
+            logging.error(f"API call failed: {str(api_error)}")
+            raise Exception(api_error_message(api_error))
             
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         error_msg = str(e) if "Erreur lors de l'appel à l'API Groq" in str(e) else "Une erreur s'est produite lors de l'analyse. Veuillez réessayer ou contacter le support si le problème persiste."
         st.error(error_msg)
-        return None
 
-# Function to get score color
-def get_score_color(score):
-    """Get color based on score value"""
-    if score >= 8:
-        return "#28a745"  # Green
-    elif score >= 6:
-        return "#ffc107"  # Yellow
-    elif score >= 4:
-        return "#fd7e14"  # Orange
-    else:
-        return "#dc3545"  # Red
+# Draft version history, shared across reruns and sessions
+@st.cache_resource
+def get_draft_store():
+    """Get the process-wide draft store"""
+    return DraftStore()
 
-# Function to get improvement summary
-def get_improvement_summary(scores):
-    """Get a summary of the main areas for improvement"""
-    # Sort scores by value to find lowest scores
-    sorted_scores = sorted(scores.items(), key=lambda x: x[1])
-    lowest_scores = sorted_scores[:3]  # Get 3 lowest scores
+# Function to display the versions of a draft
+def display_draft_versions(owner, draft_name, version):
+    """Show how this version was scored and compare all versions of the draft"""
+    if version['mode'] == 'unchanged':
+        st.info(f"Draft '{draft_name}' has not changed since version {version['version']}; showing its saved results.")
+    elif version['mode'] == 'incremental':
+        st.info(f"Version {version['version']} of '{draft_name}': only the edited paragraphs ({version['changed_ratio']:.0%} of the text) were re-analyzed.")
     
-    if lowest_scores[0][1] < 5:
-        urgency = "urgent"
+    history = get_draft_store().history(owner, draft_name)
+    if len(history) > 1:
+        st.markdown("### Version Comparison")
+        st.dataframe([
+            {"Version": item['version'], "Overall": round(sum(item['scores'].values()) / len(item['scores']), 1), **item['scores']}
+            for item in history
+        ], hide_index=True)
+
+# Background report delivery, shared across reruns and sessions
+@st.cache_resource
+def get_delivery_queue():
+    """Get the process-wide delivery queue with its worker running"""
+    queue = DeliveryQueue(resend_api_key, sender_email, audience_id)
+    queue.start()
+    return queue
+
+# Function to show the final delivery status of a report
+def show_delivery_result(status):
+    """Show the outcome of a finished report delivery"""
+    if status == 'sent':
+        st.success('Analysis complete! Check your email for the detailed report.')
     else:
-        urgency = "important"
-    
-    areas = ", ".join([f"{area}" for area, score in lowest_scores])
-    return f"The {urgency} areas for improvement are: {areas}. Focus on these aspects to significantly enhance your copy's effectiveness."
+        st.error('There was an issue sending the email. Please try again.')
+
+# Function to show report delivery status
+@st.fragment(run_every=2)
+def show_delivery_status(job_id):
+    """Show the delivery status of a report, refreshed in place until it is sent or failed"""
+    job = get_delivery_queue().status(job_id)
+    if job is None:
+        return
+    if job['status'] in ('sent', 'failed'):
+        # Remember the outcome and rerun once so the page stops polling the queue
+        st.session_state['delivery_result'] = {'job_id': job_id, 'status': job['status']}
+        st.rerun()
+    elif job['attempts']:
+        st.warning(f"Email delivery is being retried (attempt {job['attempts'] + 1})...")
+    else:
+        st.info('Your PDF report is being prepared and will arrive in your inbox shortly.')
 
 # Function to display score bar
 def display_score_bar(score, title, suggestions):
     """Display a criterion score with a circular progress indicator"""
-    color = get_score_color(score)
-    
     # Create columns for layout
     col1, col2 = st.columns([1, 4])
     
     with col1:
-        # Create circular progress indicator
-        fig, ax = plt.subplots(figsize=(2, 2))
-        # Outer circle (background)
-        ax.add_patch(plt.Circle((0.5, 0.5), 0.4, color='#f0f2f6', zorder=1))
-        # Progress arc
-        theta = np.linspace(0, 2*np.pi*(score/10), 50)
-        x = 0.5 + 0.4*np.cos(theta)
-        y = 0.5 + 0.4*np.sin(theta)
-        ax.plot(x, y, color=color, linewidth=8, zorder=2)
-        # Score text
-        ax.text(0.5, 0.5, f'{score:.1f}', ha='center', va='center', 
-               fontsize=20, fontweight='bold', zorder=3)
-        ax.set_xlim(0, 1)
-        ax.set_ylim(0, 1)
-        ax.axis('off')
-        st.pyplot(fig)
-        plt.close()
+        # Circular progress indicator (memoized SVG, no figure per render)
+        st.markdown(score_gauge_svg(score), unsafe_allow_html=True)
     
     with col2:
         st.markdown(f"### {title}")
         st.progress(score/10)
         st.markdown(f"_{suggestions}_")
 
-# Function to create PDF report
-def create_pdf_report(text, scores, suggestions, final_comment):
-    """Create a PDF report with the analysis results"""
+# Function to save an analysis to the history
+def save_to_history(text, scores, suggestions, email, url, language, duration, model, source):
+    """Record a finished analysis so it can be looked up later without a new model call"""
     try:
-        # Initialize PDF
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Set default font
-        pdf.set_font('helvetica', size=12)
-        
-        # Add title
-        pdf.set_font('helvetica', 'B', 24)
-        pdf.cell(0, 20, 'Copycheck Analysis Report', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(10)
-        
-        # Add date
-        pdf.set_font('helvetica', 'I', 12)
-        pdf.cell(0, 10, f'Generated on {datetime.now().strftime("%Y-%m-%d %H:%M")}', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(20)
-        
-        # Add analyzed text
-        pdf.set_font('helvetica', 'B', 14)
-        pdf.cell(0, 10, 'Analyzed Text:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(5)
-        pdf.set_font('helvetica', size=12)
-        pdf.multi_cell(0, 10, text[:500] + '...' if len(text) > 500 else text)
-        pdf.ln(10)
-        
-        # Add scores and suggestions
-        pdf.set_font('helvetica', 'B', 14)
-        pdf.cell(0, 10, 'Analysis Results:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(10)
-        
-        # Calculate average score
-        average_score = sum(scores.values()) / len(scores) if scores else 0
-        
-        pdf.set_font('helvetica', 'B', 12)
-        pdf.cell(0, 10, f'Overall Score: {int(average_score*10)}%', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(10)
-        
-        for criterion, score in scores.items():
-            pdf.set_font('helvetica', 'B', 12)
-            pdf.cell(0, 10, f'{criterion}: {score:.1f}/10', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_font('helvetica', 'I', 12)
-            if criterion in suggestions:
-                pdf.multi_cell(0, 10, f'Suggestion: {suggestions[criterion]}')
-            pdf.ln(5)
-        
-        # Add areas for improvement
-        pdf.ln(10)
-        pdf.set_font('helvetica', 'B', 14)
-        pdf.cell(0, 10, 'Areas for Improvement:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(5)
-        pdf.set_font('helvetica', size=12)
-        pdf.multi_cell(0, 10, get_improvement_summary(scores))
-        
-        return pdf.output()
+        get_history_store().record(text, scores, suggestions, email=email, url=url, language=language,
+                                   model=model, source=source, duration=duration)
     except Exception as e:
-        logging.error(f"Error creating PDF: {e}")
-        return None
+        logging.error(f"History error: {str(e)}")
+    remember_history_email(email)
 
-# Function to add to audience
-def add_to_audience(email):
-    """Add email to Copycheck audience in Resend using direct API call"""
-    try:
-        # Resend API endpoint for adding contacts to an audience
-        url = f"https://api.resend.com/audiences/{audience_id}/contacts"
-        
-        # Request headers
-        headers = {
-            "Authorization": f"Bearer {resend_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Request payload
-        payload = {
-            "email": email,
-            "first_name": "",
-            "last_name": "",
-            "data": {
-                "source": "copycheck_app",
-                "signup_date": datetime.now().isoformat()
-            }
-        }
-        
-        # Make the POST request
-        response = requests.post(url, headers=headers, json=payload)
-        
-        # Log response for debugging
-        logging.debug(f"Resend API Response Status: {response.status_code}")
-        logging.debug(f"Resend API Response Body: {response.text}")
-        
-        # Check if request was successful
-        if response.status_code in [200, 201]:
-            logging.info(f"Successfully added {email} to audience {audience_id}")
-            return True
-        else:
-            logging.error(f"Failed to add contact. Status code: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error adding to audience: {str(e)}")
-        return False
+# Function to look up a previous analysis of the same text
+def find_in_history(text, email):
+    """Return the saved analysis of this exact text by email, or None.
 
-# Function to send PDF email
-def send_pdf_email(email, pdf_content, scores):
-    """Send PDF report via email using Resend"""
+    Only complete analyses of the analysis model are returned, like the analysis cache.
+    """
     try:
-        # First, add to audience
-        add_to_audience(email)
-        
-        # Encode PDF in base64
-        encoded_pdf = base64.b64encode(pdf_content).decode()
-        
-        # Calculate average score
-        average_score = sum(scores.values()) / len(scores) if scores else 0
-        
-        # Create email with attachment
-        params = {
-            "from": sender_email,
-            "to": [email],
-            "subject": "Your Copycheck Analysis Report",
-            "html": f"""
-                <h2>Your Copycheck Results</h2>
-                <p>Thank you for using Copycheck!</p>
-                <p>Your overall score is: {average_score:.1f}/10</p>
-                <p>A detailed analysis report is attached to this email.</p>
-                <p>Feel free to reach out if you have any questions.</p>
-                <br>
-                <p>Best regards,<br>
-                Copycheck Team</p>
-            """,
-            "attachments": [{
-                "filename": "copycheck_analysis.pdf",
-                "content": encoded_pdf
-            }]
-        }
-        
-        try:
-            # Send email
-            response = requests.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {resend_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=params
-            )
-            
-            if response.status_code in [200, 201]:
-                logging.info("Email sent successfully")
-                return True
-            else:
-                logging.error(f"Failed to send email. Status: {response.status_code}, Response: {response.text}")
-                raise Exception(f"Failed to send email: {response.text}")
-                
-        except Exception as send_error:
-            logging.error(f"Error sending email via Resend: {send_error}")
-            raise Exception(f"Error sending email: {str(send_error)}")
-            
+        analysis = get_history_store().find(text, email=email)
     except Exception as e:
-        logging.error(f"Error preparing email: {e}")
-        st.error(f"There was an issue sending the email. Please try again: {str(e)}")
-        return False
+        logging.error(f"History error: {str(e)}")
+        return None
+    if analysis is None or analysis['model'] != ANALYSIS_MODEL or len(analysis['scores']) < len(CRITERIA):
+        return None
+    remember_history_email(email)
+    return analysis
 
-# Function to parse analysis result
-def parse_analysis_result(result):
-    """Parse the analysis result and extract scores and suggestions"""
-    try:
-        # Ensure we have a valid result
-        if not result or not isinstance(result, str):
-            logging.error("Invalid result format")
-            return {}, {}
-            
-        scores = {}
-        suggestions = {}
-        
-        # Parse the text response
-        sections = result.split('\n\n')
-        current_criterion = None
-        
-        for section in sections:
-            # Look for criterion headers
-            if ':' in section:
-                lines = section.strip().split('\n')
-                for line in lines:
-                    if 'Score:' in line:
-                        # Extract score
-                        try:
-                            score_str = line.split('Score:')[1].strip()
-                            score = int(score_str.split('/')[0])
-                            if current_criterion:
-                                scores[current_criterion] = score
-                        except:
-                            continue
-                    elif 'Improvement:' in line:
-                        # Extract improvement suggestion
-                        suggestion = line.split('Improvement:')[1].strip()
-                        if current_criterion:
-                            suggestions[current_criterion] = suggestion
-                    else:
-                        # Try to identify criterion
-                        for criterion in ['Empathy', 'Clarity', 'Attention', 'Flow', 'Benefits', 
-                                       'Action', 'Trust', 'Emotion', 'Adaptation', 'Influence']:
-                            if criterion in line:
-                                current_criterion = criterion
-                                break
-        
-        # Validate scores
-        if not scores or len(scores) == 0:
-            logging.error("No scores found in response")
-            return {}, {}
-            
-        logging.debug(f"Parsed scores: {scores}")
-        logging.debug(f"Parsed suggestions: {suggestions}")
-        
-        return scores, suggestions
-    except Exception as e:
-        logging.error(f"Error parsing analysis result: {e}")
-        return {}, {}
+# Function to allow the History page to show an email
+def remember_history_email(email):
+    """Add email to the emails the History page may show in this session"""
+    emails = st.session_state.setdefault('history_emails', [])
+    if email.strip().lower() not in emails:
+        emails.append(email.strip().lower())
 
-# Function to get final comment
-def get_final_comment(average_score):
-    """Get final assessment comment based on average score"""
-    if not isinstance(average_score, (int, float)) or average_score < 0:
-        return "Unable to calculate score. Please try again."
-        
-    if average_score >= 9:
-        return "Excellent! Your copy is highly effective and persuasive."
-    elif average_score >= 7:
-        return "Very good! Your copy is effective with some room for improvement."
-    elif average_score >= 5:
-        return "Good start. Your copy needs some work to be more effective."
-    else:
-        return "Your copy needs significant improvement. Consider implementing the suggestions above."
+# Function to display the analysis summary
+def display_summary(scores):
+    """Display the overall score and the areas for improvement"""
+    st.markdown("## Analysis Results")
+    
+    # Create two columns for layout
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Display overall score
+        st.markdown("### Overall Score")
+        st.markdown(overall_gauge_svg(sum(scores.values()) / len(scores)), unsafe_allow_html=True)
+    
+    with col2:
+        # Areas for improvement
+        st.markdown("### Areas for Improvement")
+        st.write(get_improvement_summary(scores))
 
-# Function to extract article content from URL
-def extract_article_content(url):
-    """Extract article content from URL"""
-    try:
-        # Get the webpage content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove unwanted elements
-        for element in soup.find_all(['script', 'style', 'nav', 'footer', 'header']):
-            element.decompose()
-        
-        # Find the main content
-        article = soup.find('article') or soup.find('main') or soup.find('div', class_='post-content')
-        
-        if article:
-            # Extract text from paragraphs
-            paragraphs = article.find_all('p')
-            content = ' '.join([p.get_text().strip() for p in paragraphs])
-            
-            # Clean up the text
-            content = re.sub(r'\s+', ' ', content)  # Remove extra whitespace
-            content = content.strip()
-            
-            return content
-        else:
-            return None
-            
-    except Exception as e:
-        print(f"Error extracting content: {str(e)}")
-        return None
+# Function to display the detailed scores
+def display_details(scores, suggestions):
+    """Display every criterion score with its suggestion"""
+    st.markdown("## Detailed Analysis")
+    for criterion, score in scores.items():
+        display_score_bar(score, criterion, suggestions.get(criterion, ""))
+
+# Function to render the PDF report
+def render_report(text, scores, suggestions):
+    """Render the PDF report of an analysis once, or None if it failed"""
+    pdf_content = create_pdf_report(text, scores, suggestions, get_improvement_summary(scores))
+    return bytes(pdf_content) if pdf_content is not None else None
+
+# Function to display the results of the last analysis
+def display_results(results):
+    """Redraw the last analysis of this session from memory"""
+    if results['degraded']:
+        st.info(results['notice'])
+    display_summary(results['scores'])
+    display_details(results['scores'], results['suggestions'])
+    if results['draft_version']:
+        display_draft_versions(results['email'], results['draft_name'], results['draft_version'])
+
+# Function to offer the report of the last analysis
+def display_report_actions(results, email):
+    """Offer the already rendered PDF report for download or by email"""
+    if results['pdf'] is None:
+        return
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button('Download PDF report', data=results['pdf'], file_name='copycheck_analysis.pdf',
+                           mime='application/pdf')
+    with col2:
+        if st.button('Email me this report'):
+            if not email or not validators.email(email):
+                st.error('Please enter a valid email address to receive your analysis.')
+            else:
+                # The report of these results is queued once per address, however often the button is clicked
+                job_id = get_delivery_queue().enqueue(email, results['text'], results['scores'], results['suggestions'],
+                                                      pdf=results['pdf'], report_key=results['report_key'])
+                if job_id == st.session_state.get('delivery_job_id'):
+                    st.info('This report is already on its way to this address.')
+                st.session_state['delivery_job_id'] = job_id
+
+# Function to display preliminary scores
+def display_preliminary_scores(scores):
+    """Display the instant local scores as a compact grid of gauges"""
+    st.markdown("## Preliminary Scores")
+    st.caption("Instant local estimate, refined when the AI analysis arrives.")
+    columns = st.columns(5)
+    for i, (criterion, score) in enumerate(scores.items()):
+        with columns[i % 5]:
+            st.markdown(f"**{criterion}**")
+            st.markdown(score_gauge_svg(score), unsafe_allow_html=True)
 
 # Streamlit app layout
 st.set_page_config(
@@ -438,6 +317,7 @@ st.set_page_config(
     page_icon="✍️",
     layout="wide"
 )
+get_metrics_server()
 
 # Custom CSS for better styling
 st.markdown("""
@@ -458,86 +338,187 @@ st.write("✍️")
 st.markdown("Analyze and improve your copywriting with AI-powered insights")
 
 # User inputs
-user_input = st.text_area('Enter your text or URL to analyze:', height=200)
+user_input = st.text_area('Enter your text or URL(s) to analyze:', height=200)
+uploaded_file = st.file_uploader('Or upload a document (PDF, DOCX or TXT):', type=["pdf", "docx", "txt"])
 email = st.text_input('Enter your email to receive the analysis:')
+draft_name = st.text_input('Draft name (optional, to track versions and re-analyze only your edits):').strip()
+stream_results = st.toggle('Show scores as they arrive', value=True)
 
 # Analyze button
+analyzed = False
 if st.button('Analyze', type='primary'):
-    if user_input:
+    if user_input or uploaded_file:
         if not email or not validators.email(email):
             st.error('Please enter a valid email address to receive your analysis.')
         else:
-            # Check if input is URL
-            if validators.url(user_input):
+            # Check if input is one or more URLs
+            urls = [] if uploaded_file else user_input.split()
+            source_url = None
+            if uploaded_file:
+                # An uploaded document takes the place of the text box; it is read in a worker process
+                from uploads import UploadError, extract_upload
+                with st.spinner('Reading your document...'):
+                    try:
+                        user_input = extract_upload(uploaded_file)
+                    except UploadError as e:
+                        st.error(f'Could not read {uploaded_file.name}: {str(e)}')
+                        st.stop()
+            elif urls and all(validators.url(url) for url in urls):
+                source_url = " ".join(urls)
                 with st.spinner('Extracting article content...'):
-                    content = extract_article_content(user_input)
-                    if content:
-                        user_input = content
+                    contents = [content for content in extract_articles(urls) if content]
+                    if contents:
+                        user_input = "\n\n".join(contents)
                     else:
                         st.error('Could not extract article content. Please try copying and pasting the text directly.')
                         st.stop()
             
+            # Empty, junk and boilerplate submissions are turned away before any model call
+            verdict = triage(user_input)
+            if not verdict["accepted"]:
+                st.warning(REJECTION_MESSAGES[verdict["reason"]])
+                st.stop()
+            # Doubtful but plausible copy (numbers, a boilerplate phrase) is analyzed anyway
+            for warning in verdict["warnings"]:
+                st.warning(WARNING_MESSAGES[warning])
+            
+            # Local scores are shown right away and replaced once the model has answered
+            # (the scorer and numpy are loaded with the first analysis, not at startup)
+            from heuristics import heuristic_scores
+            preliminary_scores, preliminary_suggestions = heuristic_scores(user_input)
+            preliminary_container = st.empty()
+            with preliminary_container.container():
+                display_preliminary_scores(preliminary_scores)
+            
+            started = time.perf_counter()
             with st.spinner('Analyzing your text...'):
-                analysis_result = analyze_text(user_input)
-                if analysis_result is None:
-                    st.stop()
-                scores, suggestions = parse_analysis_result(analysis_result)
+                # The summary stays above the detailed scores even though those arrive first when streaming
+                summary_container = st.container()
+                details_placeholder = st.empty()
+                details_container = details_placeholder.container()
+                
+                # A text this email already analyzed gets its saved results back, and near-duplicates
+                # of a recent text (a changed date, one swapped sentence) reuse its scores
+                stored = None if draft_name else find_in_history(user_input, email)
+                near_duplicate = None if draft_name or stored else get_near_duplicate_index().lookup(user_input)
+                
+                # Long documents and drafts are scored in pieces, which needs the complete responses
+                streaming = (stream_results and not draft_name and not stored and not near_duplicate
+                             and fits_in_one_request(user_input))
+                draft_version = None
+                scores, suggestions = {}, {}
+                answer = {"model": ANALYSIS_MODEL}
+                busy = False
+                if stored:
+                    scores, suggestions = stored['scores'], stored['suggestions']
+                    st.info(HISTORY_MESSAGE.format(date=datetime.fromtimestamp(stored['created_at']).strftime('%Y-%m-%d %H:%M')))
+                elif near_duplicate:
+                    (scores, suggestions), similarity = near_duplicate
+                    scores, suggestions = dict(scores), dict(suggestions)
+                    st.info(NEAR_DUPLICATE_MESSAGE.format(similarity=similarity))
+                else:
+                    # Analyses wait their turn in a queue shared by all sessions, one running analysis per email
+                    queue_container = st.empty()
+                    try:
+                        with get_admission_controller().admit(
+                                email, on_wait=lambda position: queue_container.info(QUEUE_MESSAGE.format(position=position))):
+                            queue_container.empty()
+                            if streaming:
+                                for criterion, score, suggestion in analyze_text_stream(user_input, answer):
+                                    with details_container:
+                                        if not scores:
+                                            st.markdown("## Detailed Analysis")
+                                        display_score_bar(score, criterion, suggestion)
+                                    scores[criterion] = score
+                                    suggestions[criterion] = suggestion
+                            elif draft_name:
+                                analysis_result, draft_version = analyze_draft_text(user_input, email, draft_name)
+                                if analysis_result is None:
+                                    st.stop()
+                                scores, suggestions = parse_analysis_result(analysis_result)
+                                answer["model"] = response_model(analysis_result)
+                            else:
+                                analysis_result = analyze_text(user_input)
+                                scores, suggestions = parse_analysis_result(analysis_result) if analysis_result else ({}, {})
+                                answer["model"] = response_model(analysis_result)
+                    except AdmissionError as e:
+                        logging.warning(f"Analysis not admitted: {str(e)}")
+                        queue_container.empty()
+                        busy = True
+                
+                # When Groq is unavailable or the queue is full the local scores stand in, without the emailed report.
+                # A partial analysis (a stream cut off part-way) is completed with them and handled the same way.
+                partial = bool(scores) and len(scores) < len(CRITERIA)
+                degraded = partial or (not scores and (busy or not draft_name))
+                notice = None
+                if partial:
+                    suggestions = {criterion: suggestions[criterion] if criterion in scores else preliminary_suggestions[criterion]
+                                   for criterion in CRITERIA}
+                    scores = {criterion: scores.get(criterion, preliminary_scores[criterion]) for criterion in CRITERIA}
+                    notice = PARTIAL_MESSAGE
+                elif degraded:
+                    scores, suggestions = preliminary_scores, preliminary_suggestions
+                    notice = BUSY_MESSAGE if busy else DEGRADED_MESSAGE
+                if degraded:
+                    draft_version = None
+                    st.info(notice)
+                    # The criteria streamed so far are drawn again with the rest
+                    details_container = details_placeholder.container()
                 
                 # Check if we got valid scores
                 if not scores:
                     st.error("Sorry, there was an error analyzing your text. Please try again.")
                     st.stop()
                 
-                # Calculate average score
-                average_score = sum(scores.values()) / len(scores)
+                if not degraded and not stored:
+                    save_to_history(user_input, scores, suggestions, email, source_url, verdict["language"],
+                                    time.perf_counter() - started, answer["model"],
+                                    "near_duplicate" if near_duplicate else "llm")
+                    # Only complete answers of the analysis model are reused, like the analysis cache
+                    if (not draft_name and not near_duplicate and answer["model"] == ANALYSIS_MODEL
+                            and len(scores) == len(CRITERIA)):
+                        get_near_duplicate_index().add(user_input, (dict(scores), dict(suggestions)))
                 
                 # Display results
-                st.markdown("## Analysis Results")
-                
-                # Create two columns for layout
-                col1, col2 = st.columns(2)
+                with summary_container:
+                    display_summary(scores)
+                preliminary_container.empty()
                 
-                with col1:
-                    # Display overall score
-                    st.markdown("### Overall Score")
-                    fig, ax = plt.subplots(figsize=(3, 3))
-                    # Outer circle (background)
-                    ax.add_patch(plt.Circle((0.5, 0.5), 0.4, color='#f0f2f6', zorder=1))
-                    # Progress arc
-                    theta = np.linspace(0, 2*np.pi*(average_score/10), 50)
-                    x = 0.5 + 0.4*np.cos(theta)
-                    y = 0.5 + 0.4*np.sin(theta)
-                    ax.plot(x, y, color=get_score_color(average_score), linewidth=8, zorder=2)
-                    # Score text
-                    ax.text(0.5, 0.5, f'{int(average_score*10)}%', ha='center', va='center', 
-                           fontsize=24, fontweight='bold', zorder=3)
-                    ax.set_xlim(0, 1)
-                    ax.set_ylim(0, 1)
-                    ax.axis('off')
-                    st.pyplot(fig)
-                    plt.close()
+                # Display individual scores
+                if not streaming or degraded:
+                    with details_container:
+                        display_details(scores, suggestions)
                 
-                with col2:
-                    # Areas for improvement
-                    st.markdown("### Areas for Improvement")
-                    st.write(get_improvement_summary(scores))
+                if draft_version:
+                    display_draft_versions(email, draft_name, draft_version)
                 
-                # Display individual scores
-                st.markdown("## Detailed Analysis")
-                for criterion, score in scores.items():
-                    display_score_bar(score, criterion, suggestions.get(criterion, ""))
+                # Keep the results and the rendered report so reruns and report actions do not recompute them
+                st.session_state['results'] = {
+                    "text": user_input, "scores": scores, "suggestions": suggestions, "degraded": degraded, "notice": notice,
+                    "email": email, "draft_name": draft_name, "draft_version": draft_version,
+                    "pdf": None if degraded else render_report(user_input, scores, suggestions),
+                    "report_key": uuid.uuid4().hex
+                }
+                analyzed = True
                 
-                # Create and send PDF report
-                with st.spinner('Generating PDF report...'):
-                    pdf_content = create_pdf_report(user_input, scores, suggestions, get_improvement_summary(scores))
-                    if pdf_content:
-                        if send_pdf_email(email, pdf_content, scores):
-                            st.success('Analysis complete! Check your email for the detailed report.')
-                        else:
-                            st.error('There was an issue sending the email. Please try again.')
-                            st.stop()
-                    else:
-                        st.error('There was an issue generating the PDF report. Please try again.')
-                        st.stop()
+                # Queue the PDF report for email delivery
+                if not degraded:
+                    st.session_state['delivery_job_id'] = get_delivery_queue().enqueue(
+                        email, user_input, scores, suggestions, pdf=st.session_state['results']['pdf'],
+                        report_key=st.session_state['results']['report_key'])
     else:
         st.error('Please enter some text to analyze.')
+
+# Results of the last analysis, redrawn from memory when another widget triggers a rerun
+if 'results' in st.session_state:
+    if not analyzed:
+        display_results(st.session_state['results'])
+    display_report_actions(st.session_state['results'], email)
+
+# Report delivery status
+if 'delivery_job_id' in st.session_state:
+    delivery_result = st.session_state.get('delivery_result')
+    if delivery_result and delivery_result['job_id'] == st.session_state['delivery_job_id']:
+        show_delivery_result(delivery_result['status'])
+    else:
+        show_delivery_status(st.session_state['delivery_job_id'])
@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from itertools import islice
+from urllib.parse import urldefrag, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from analysis_cache import AnalysisCache, normalize_text
+from analyzer import CRITERIA
+from batch import DEFAULT_CONCURRENCY, DEFAULT_MAX_RETRIES, DEFAULT_RPM, DEFAULT_TPM, run_batch
+from compaction import get_boilerplate_index
+from engine import get_settings
+from ingestion import REQUEST_TIMEOUT, fetch_page, get_http_session
+
+DEFAULT_AUDIT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "audit.sqlite3")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audit_results")
+DEFAULT_MAX_PAGES = 5000
+# Seconds between two requests to the same host, raised to the Crawl-delay of robots.txt
+DEFAULT_HOST_DELAY = 1.0
+# URLs taken from the sitemaps at a time; their pages are checked concurrently
+CRAWL_WINDOW = 16
+# Levels of sitemap indexes followed
+MAX_SITEMAP_DEPTH = 3
+# Name matched against the User-agent lines of robots.txt
+ROBOTS_AGENT = "Copycheck"
+# Pages listed under each of the weakest criteria in the report
+REPORT_PAGES_PER_CRITERION = 10
+
+
+class HostLimiter:
+    """Space the requests to each host by a minimum delay, across threads (host names ignore case)"""
+
+    def __init__(self, delay=DEFAULT_HOST_DELAY):
+        self.delay = delay
+        self._delays = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def set_delay(self, host, delay):
+        """Use a longer delay for host (never shorter than the default)"""
+        with self._lock:
+            self._delays[host.lower()] = max(self.delay, delay)
+
+    def wait(self, host):
+        """Block until a request to host is allowed"""
+        host = host.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self._delays.get(host, self.delay)
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class AuditStore:
+    """SQLite record of the audited pages of each site: HTTP validators, content hash and last scores"""
+
+    def __init__(self, path=DEFAULT_AUDIT_PATH):
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "site TEXT NOT NULL, url TEXT NOT NULL, status TEXT NOT NULL, error TEXT, etag TEXT, last_modified TEXT, "
+            "content_hash TEXT, scores TEXT, suggestions TEXT, average_score REAL, analyzed_at REAL, "
+            "checked_at REAL NOT NULL, PRIMARY KEY (site, url))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_pages_checked ON pages (site, checked_at)")
+        self._db.commit()
+
+    def get(self, site, url):
+        """Return the record of a page as a dict, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM pages WHERE site = ? AND url = ?", (site, url)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def save(self, site, url, **fields):
+        """Create or update the record of a page with fields (scores and suggestions as dicts)"""
+        fields = {key: json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else value
+                  for key, value in fields.items()}
+        columns = ["site", "url", *fields]
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO pages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT (site, url) DO UPDATE SET {', '.join(f'{key} = excluded.{key}' for key in fields)}",
+                (site, url, *fields.values())
+            )
+            self._db.commit()
+
+    def pages(self, site, since=0):
+        """Return the records of the pages of site checked since a timestamp"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM pages WHERE site = ? AND checked_at >= ? ORDER BY url", (site, since)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row):
+        page = dict(row)
+        page["scores"] = json.loads(page["scores"]) if page["scores"] else {}
+        page["suggestions"] = json.loads(page["suggestions"]) if page["suggestions"] else {}
+        return page
+
+
+# Function to normalize the start of an audit
+def site_root(start):
+    """Return (site host, scheme://host) of a domain, URL or sitemap URL"""
+    parts = urlsplit(start if "://" in start else "https://" + start)
+    return parts.netloc.lower(), f"{parts.scheme}://{parts.netloc}"
+
+# Function to read robots.txt
+def load_robots(root, session=None, limiter=None):
+    """Fetch and parse root/robots.txt.
+
+    A missing file allows everything; a forbidden or unreachable one disallows everything,
+    as crawlers are expected to do.
+    """
+    session = session or get_http_session()
+    robots = RobotFileParser(root + "/robots.txt")
+    if limiter:
+        limiter.wait(urlsplit(root).netloc)
+    try:
+        response = session.get(robots.url, timeout=REQUEST_TIMEOUT)
+        if response.status_code in (401, 403):
+            robots.disallow_all = True
+        elif 400 <= response.status_code < 500:
+            robots.allow_all = True
+        else:
+            response.raise_for_status()
+            robots.parse(response.text.splitlines())
+    except Exception as e:
+        logging.error(f"Could not read {robots.url} ({str(e)}), nothing will be crawled")
+        robots.disallow_all = True
+    return robots
+
+# Function to read a sitemap
+def iter_sitemap(url, session=None, limiter=None, depth=0):
+    """Yield the page URLs of a sitemap (following sitemap indexes), parsing it as it downloads"""
+    session = session or get_http_session()
+    if limiter:
+        limiter.wait(urlsplit(url).netloc)
+    children = []
+    try:
+        with session.get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            body = response.raw
+            if url.endswith(".gz") and response.headers.get("Content-Encoding") != "gzip":
+                body = gzip.GzipFile(fileobj=body)
+            loc = None
+            for _, element in ET.iterparse(body, events=("end",)):
+                tag = element.tag.rsplit("}", 1)[-1]
+                if tag == "loc":
+                    loc = (element.text or "").strip()
+                elif tag in ("url", "sitemap"):
+                    if loc and tag == "url":
+                        yield loc
+                    elif loc:
+                        children.append(loc)
+                    loc = None
+                    # Entries are dropped once read so large sitemaps parse in constant memory
+                    element.clear()
+    except Exception as e:
+        logging.error(f"Could not read sitemap {url}: {str(e)}")
+    for child in children:
+        if depth < MAX_SITEMAP_DEPTH:
+            yield from iter_sitemap(child, session, limiter, depth + 1)
+
+# Function to discover the pages of a site
+def discover_urls(start, robots, session=None, limiter=None, max_pages=DEFAULT_MAX_PAGES):
+    """Yield the URLs of the site's pages allowed by robots.txt, from its sitemaps, as they are read"""
+    site, root = site_root(start)
+    if urlsplit(start).path.endswith((".xml", ".xml.gz")):
+        sitemaps = [start]
+    else:
+        sitemaps = robots.site_maps() or [root + "/sitemap.xml"]
+
+    seen = set()
+    for sitemap in sitemaps:
+        for url in iter_sitemap(sitemap, session, limiter):
+            url = urldefrag(url)[0]
+            if urlsplit(url).netloc.lower() != site or url in seen:
+                continue
+            if not robots.can_fetch(ROBOTS_AGENT, url):
+                logging.debug(f"Disallowed by robots.txt: {url}")
+                continue
+            seen.add(url)
+            yield url
+            if len(seen) >= max_pages:
+                logging.warning(f"Stopping discovery at {max_pages} pages")
+                return
+    if not seen:
+        start_url = start if "://" in start else root + "/"
+        logging.warning(f"No pages found in the sitemaps of {site}, auditing {start_url} only")
+        if robots.can_fetch(ROBOTS_AGENT, start_url):
+            yield start_url
+
+# Function to check a page for changes
+def check_page(url, site, store, limiter, session=None, incremental=True):
+    """Fetch url unless it is unchanged since the last audit.
+
+    Returns (outcome, item): outcome is "changed", "unchanged" or "failed" and item the batch
+    item to analyze for changed pages.
+    """
+    previous = store.get(site, url) if incremental else None
+    scored = bool(previous) and previous["status"] == "ok"
+    now = time.time()
+    limiter.wait(urlsplit(url).netloc)
+    try:
+        page = fetch_page(url, session, previous["etag"] if scored else None,
+                          previous["last_modified"] if scored else None)
+    except Exception as e:
+        logging.error(f"Could not fetch {url}: {str(e)}")
+        store.save(site, url, status="error", error=str(e), checked_at=now)
+        return "failed", None
+    if page["not_modified"]:
+        store.save(site, url, status="ok", etag=page["etag"], last_modified=page["last_modified"], checked_at=now)
+        return "unchanged", None
+    if not page["content"]:
+        store.save(site, url, status="error", error="No article content found", content_hash=None, checked_at=now)
+        return "failed", None
+
+    content_hash = hashlib.sha256(normalize_text(page["content"]).encode('utf-8')).hexdigest()
+    if scored and content_hash == previous["content_hash"]:
+        store.save(site, url, status="ok", etag=page["etag"], last_modified=page["last_modified"], checked_at=now)
+        return "unchanged", None
+    # Validators are kept now; the page counts as scored only once its analysis succeeds
+    store.save(site, url, status="pending", error=None, etag=page["etag"], last_modified=page["last_modified"],
+               content_hash=content_hash, checked_at=now)
+    return "changed", {"id": url, "text": get_boilerplate_index().clean(url, page["content"])}
+
+# Function to crawl the pages of a site
+async def crawl(urls, site, store, limiter, counts, session=None, incremental=True, window=CRAWL_WINDOW):
+    """Check pages as their URLs are discovered and yield batch items for the ones that changed.
+
+    A page whose check raises is recorded as failed and the crawl goes on with the others.
+    """
+    async def check(url):
+        try:
+            return await asyncio.to_thread(check_page, url, site, store, limiter, session, incremental)
+        except Exception as e:
+            logging.error(f"Could not check {url}: {str(e)}")
+            try:
+                await asyncio.to_thread(store.save, site, url, status="error", error=str(e), checked_at=time.time())
+            except Exception as e:
+                logging.error(f"Could not record the failure of {url}: {str(e)}")
+            return "failed", None
+
+    urls = iter(urls)
+    while True:
+        try:
+            batch = await asyncio.to_thread(lambda: list(islice(urls, window)))
+        except Exception as e:
+            logging.error(f"Page discovery of {site} stopped: {str(e)}")
+            return
+        if not batch:
+            return
+        for pending in asyncio.as_completed([check(url) for url in batch]):
+            outcome, item = await pending
+            counts[outcome] += 1
+            if item:
+                yield item
+
+# Function to audit a site
+async def run_audit(start, client, store=None, cache=None, session=None,
+                    max_pages=DEFAULT_MAX_PAGES, delay=DEFAULT_HOST_DELAY, incremental=True,
+                    concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES):
+    """Crawl a site, score the pages that changed since its last audit and return the run summary.
+
+    Every page is scored on its own: pages built from the same template would pass for near-duplicates
+    and share their scores, which would make the per-page ranking meaningless.
+    """
+    store = store or AuditStore()
+    session = session or get_http_session()
+    site, root = site_root(start)
+    started = time.time()
+    limiter = HostLimiter(delay)
+    robots = await asyncio.to_thread(load_robots, root, session, limiter)
+    crawl_delay = robots.crawl_delay(ROBOTS_AGENT)
+    if crawl_delay:
+        limiter.set_delay(site, float(crawl_delay))
+
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "analyzed": 0}
+    urls = discover_urls(start, robots, session, limiter, max_pages)
+    items = crawl(urls, site, store, limiter, counts, session, incremental)
+    async for result in run_batch(items, client, cache=cache, concurrency=concurrency, rpm=rpm, tpm=tpm,
+                                  max_retries=max_retries):
+        now = time.time()
+        if result["status"] == "ok":
+            counts["analyzed"] += 1
+            store.save(site, result["id"], status="ok", scores=result["scores"], suggestions=result["suggestions"],
+                       average_score=round(result["average_score"], 2), analyzed_at=now, checked_at=now)
+        else:
+            counts["failed"] += 1
+            store.save(site, result["id"], status="error", error=result["error"], checked_at=now)
+    logging.info(f"Audit of {site}: {counts['analyzed']} pages scored, {counts['unchanged']} unchanged, "
+                 f"{counts['failed']} failed in {time.time() - started:.0f}s")
+    return {"site": site, "started_at": started, **counts}
+
+# Function to build the site report
+def build_report(store, summary):
+    """Site-level results of an audit: criterion averages (weakest first), the weakest pages of the
+    weakest criteria, every page ranked by its weakest criterion and the pages that failed"""
+    pages = store.pages(summary["site"], since=summary["started_at"])
+    scored = [page for page in pages if page["status"] == "ok" and page["scores"]]
+    averages = {}
+    for criterion in CRITERIA:
+        values = [page["scores"][criterion] for page in scored if criterion in page["scores"]]
+        if values:
+            averages[criterion] = round(sum(values) / len(values), 2)
+    criteria = sorted(averages, key=averages.get)
+
+    ranked = []
+    for page in sorted(scored, key=lambda page: (min(page["scores"].values()), page["average_score"])):
+        weakest = min(page["scores"], key=page["scores"].get)
+        ranked.append({"url": page["url"], "average_score": page["average_score"], "weakest": weakest,
+                       "score": page["scores"][weakest], "suggestion": page["suggestions"].get(weakest, "")})
+    weakest_pages = {
+        criterion: [{"url": page["url"], "score": page["scores"][criterion],
+                     "suggestion": page["suggestions"].get(criterion, "")}
+                    for page in sorted((page for page in scored if criterion in page["scores"]),
+                                       key=lambda page: page["scores"][criterion])[:REPORT_PAGES_PER_CRITERION]]
+        for criterion in criteria[:3]
+    }
+    return {
+        **summary,
+        "pages": len(pages),
+        "criteria": {criterion: averages[criterion] for criterion in criteria},
+        "weakest_pages": weakest_pages,
+        "ranked": ranked,
+        "failed": [{"url": page["url"], "error": page["error"]} for page in pages if page["status"] != "ok"]
+    }
+
+# Function to format the site report
+def format_report(report):
+    """Render an audit report as Markdown"""
+    lines = [
+        f"# Copy audit of {report['site']}",
+        "",
+        f"{datetime.fromtimestamp(report['started_at']).strftime('%Y-%m-%d %H:%M')}: {report['pages']} pages checked, "
+        f"{report['analyzed']} scored in this run, {report['unchanged']} unchanged since the last audit, "
+        f"{len(report['failed'])} without scores.",
+        "",
+        "## Site averages (weakest first)",
+        "",
+        "| Criterion | Average |",
+        "|---|---|"
+    ]
+    lines += [f"| {criterion} | {average:.1f} |" for criterion, average in report["criteria"].items()]
+    for criterion, pages in report["weakest_pages"].items():
+        lines += ["", f"## Weakest pages for {criterion}", "", "| Page | Score | Suggestion |", "|---|---|---|"]
+        lines += [f"| {page['url']} | {page['score']} | {page['suggestion']} |" for page in pages]
+    lines += ["", "## Pages ranked by weakest criterion", "",
+              "| Page | Average | Weakest criterion | Suggestion |", "|---|---|---|---|"]
+    lines += [f"| {page['url']} | {page['average_score']:.1f} | {page['weakest']} ({page['score']}) | {page['suggestion']} |"
+              for page in report["ranked"]]
+    if report["failed"]:
+        lines += ["", "## Pages without scores", "", "| Page | Reason |", "|---|---|"]
+        lines += [f"| {page['url']} | {page['error']} |" for page in report["failed"]]
+    return "\n".join(lines) + "\n"
+
+# Function to run an audit from the command line
+async def run_cli(args):
+    """Audit a site and write its report"""
+    # Retries are handled by the batch runner so the client must not retry on its own
+    from groq import Groq
+    client = Groq(api_key=get_settings()["groq_api_key"], max_retries=0)
+    store = AuditStore()
+    summary = await run_audit(args.site, client, store=store, cache=AnalysisCache(), max_pages=args.max_pages,
+                              delay=args.delay, incremental=not args.full, concurrency=args.concurrency, rpm=args.rpm,
+                              tpm=args.tpm, max_retries=args.max_retries)
+    report = build_report(store, summary)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{summary['site']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.md")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        if output.endswith(".json"):
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        else:
+            f.write(format_report(report))
+    print(f"Report saved to {output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the copy of every page of a site with Copycheck")
+    parser.add_argument("site", help="Domain, page URL or sitemap.xml URL of the site")
+    parser.add_argument("-o", "--output", help="Report file, Markdown or .json (default: audit_results/<site>-<time>.md)")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="Pages audited at most")
+    parser.add_argument("--delay", type=float, default=DEFAULT_HOST_DELAY, help="Seconds between requests to the site")
+    parser.add_argument("--full", action="store_true", help="Re-score every page, even those unchanged since the last audit")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Pages analyzed at the same time")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Groq requests per minute limit")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="Groq tokens per minute limit")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries per page on 429 and server errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    sys.exit(asyncio.run(run_cli(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import random
+import sys
+import time
+
+import validators
+
+from analysis_cache import AnalysisCache
+from analyzer import (ANALYSIS_MODEL, ANALYSIS_PARAMS, CRITERIA, STRUCTURED_SYSTEM_PROMPT,
+                      parse_analysis_result, response_model)
+from chunking import analyze_document, cached_document_analysis, fits_in_one_request, split_into_chunks
+from compaction import count_tokens
+from engine import get_settings
+from ingestion import extract_article_content
+from metrics import inc
+from routing import REJECTION_MESSAGES, is_retryable, triage
+
+# Default Groq limits for llama-3.3-70b-versatile on the free tier
+DEFAULT_RPM = 30
+DEFAULT_TPM = 6000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        """Wait until amount tokens are available and take them"""
+        amount = min(amount, self.capacity)
+        # Holding the lock while sleeping keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+# Function to estimate the tokens a request will use
+def estimate_tokens(text):
+    """Local token estimate of the prompt plus the reserved completion"""
+    return count_tokens(STRUCTURED_SYSTEM_PROMPT) + count_tokens(text) + ANALYSIS_PARAMS["max_tokens"]
+
+# Function to read batch input
+def read_batch_input(path):
+    """Yield items from a CSV or JSONL file with a text, url or input column"""
+    def to_item(index, record):
+        value = (record.get("text") or record.get("url") or record.get("input") or "").strip()
+        item = {"id": record.get("id") or str(index)}
+        if record.get("url") or (not record.get("text") and validators.url(value)):
+            item["url"] = value
+        else:
+            item["text"] = value
+        return item
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            for index, line in enumerate(f, start=1):
+                if line.strip():
+                    yield to_item(index, json.loads(line))
+        else:
+            for index, row in enumerate(csv.DictReader(f), start=1):
+                yield to_item(index, row)
+
+# Function to get the delay before the next retry
+def retry_delay(error, attempt):
+    """Honor Retry-After when present, otherwise exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+# Function to analyze one batch item
+async def analyze_item(item, client, cache, request_bucket, token_bucket, max_retries, near_duplicates=None):
+    """Fetch, analyze and parse a single item, retrying rate-limited calls"""
+    started = time.monotonic()
+    result = {"id": item["id"], "url": item.get("url"), "status": "ok", "attempts": 0}
+    try:
+        text = item.get("text")
+        if item.get("url"):
+            text = await asyncio.to_thread(extract_article_content, item["url"])
+            if not text:
+                raise ValueError("Could not extract article content")
+        # Junk and near-empty submissions are rejected without a model call
+        verdict = triage(text)
+        result["language"] = verdict["language"]
+        result["warnings"] = verdict["warnings"]
+        if not verdict["accepted"]:
+            raise ValueError(REJECTION_MESSAGES[verdict["reason"]])
+
+        # Near-duplicates of items already scored (a changed date, one swapped sentence) reuse their scores
+        match = near_duplicates.lookup(text) if near_duplicates is not None else None
+        result["near_duplicate"] = match[1] if match else None
+        if match:
+            result["scores"], result["suggestions"] = dict(match[0][0]), dict(match[0][1])
+            result["average_score"] = sum(result["scores"].values()) / len(result["scores"])
+            result["elapsed"] = round(time.monotonic() - started, 3)
+            return result
+
+        # Fully cached documents do not count against the rate limits
+        response = cached_document_analysis(text, cache)
+        result["cached"] = response is not None
+        chunks = [text] if fits_in_one_request(text) else split_into_chunks(text)
+
+        while response is None:
+            for _ in chunks:
+                await request_bucket.acquire()
+            await token_bucket.acquire(sum(estimate_tokens(chunk) for chunk in chunks))
+            result["attempts"] += 1
+            try:
+                # Chunks already scored come from the cache, so a retry only pays for the rest
+                response = await asyncio.to_thread(analyze_document, client, text, cache, 1)
+            except Exception as e:
+                if result["attempts"] > max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, result["attempts"])
+                inc("copycheck_retries_total", stage="batch")
+                logging.warning(f"Item {item['id']} attempt {result['attempts']} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        scores, suggestions = parse_analysis_result(response)
+        if not scores:
+            raise ValueError("No scores found in response")
+        result["scores"] = scores
+        result["suggestions"] = suggestions
+        result["average_score"] = sum(scores.values()) / len(scores)
+        result["model"] = response_model(response)
+        # Only complete answers of the analysis model are reused, like the analysis cache
+        if near_duplicates is not None and result["model"] == ANALYSIS_MODEL and len(scores) == len(CRITERIA):
+            near_duplicates.add(text, (dict(scores), dict(suggestions)))
+    except Exception as e:
+        logging.error(f"Item {item['id']} failed: {str(e)}")
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+# Function to run a batch
+async def run_batch(items, client, cache=None, concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM,
+                    tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES, near_duplicates=None):
+    """Analyze items (an iterable or async iterable) with bounded concurrency and yield each result
+    as soon as it finishes.
+
+    An error raised while iterating items is raised again once the items already read are analyzed.
+    """
+    request_bucket = TokenBucket(rpm)
+    token_bucket = TokenBucket(tpm)
+    pending = asyncio.Queue(maxsize=concurrency * 2)
+    finished = asyncio.Queue()
+    producer_errors = []
+
+    async def produce():
+        # Items may also come from an async generator, such as a site crawl
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await pending.put(item)
+            else:
+                for item in items:
+                    await pending.put(item)
+        except Exception as e:
+            # The workers still have to be stopped, the error is raised once they are done
+            producer_errors.append(e)
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def work():
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            await finished.put(await analyze_item(item, client, cache, request_bucket, token_bucket, max_retries,
+                                                  near_duplicates))
+        await finished.put(None)
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        running = concurrency
+        while running:
+            result = await finished.get()
+            if result is None:
+                running -= 1
+            else:
+                yield result
+        if producer_errors:
+            raise producer_errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# Function to run a batch from the command line
+async def run_cli(args):
+    """Stream batch results to a JSONL file (or stdout)"""
+    # Retries are handled here so the client must not retry on its own
+    from groq import Groq
+    client = Groq(api_key=get_settings()["groq_api_key"], max_retries=0)
+    cache = None if args.no_cache else AnalysisCache()
+    near_duplicates = None
+    if not args.no_cache:
+        from similarity import NearDuplicateIndex
+        near_duplicates = NearDuplicateIndex()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    counts = {"ok": 0, "error": 0}
+    started = time.monotonic()
+    try:
+        async for result in run_batch(read_batch_input(args.input), client, cache=cache,
+                                      concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+                                      max_retries=args.max_retries, near_duplicates=near_duplicates):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            counts[result["status"]] += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logging.info(f"Batch finished in {time.monotonic() - started:.1f}s: {counts['ok']} ok, {counts['error']} failed")
+    return 0 if counts["error"] == 0 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a CSV/JSONL file of texts or URLs with Copycheck")
+    parser.add_argument("input", help="CSV or JSONL file with a text, url or input column")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Items analyzed at the same time")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Groq requests per minute limit")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="Groq tokens per minute limit")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries per item on 429 and server errors")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the analysis cache (nor reuse scores of near-duplicate items)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    sys.exit(asyncio.run(run_cli(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+
+from analyzer import CRITERIA, parse_analysis_result, request_analysis
+from charts import overall_gauge_svg, score_gauge_svg
+from delivery import send_pdf_email
+from ingestion import extract_paragraphs, get_http_session
+from report import create_pdf_report, get_improvement_summary
+from sample_text import SAMPLE_TEXT
+
+STAGES = ["fetch", "extract", "llm", "parse", "chart", "pdf", "email"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+# A stage whose p95 grows by more than this ratio against the baseline is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+# Entry points whose cold start is profiled by --startup
+STARTUP_MODULES = ["engine", "service", "batch", "delivery", "report", "ingestion"]
+# Packages loaded by the stage that needs them, never at import time
+DEFERRED_PACKAGES = ["groq", "fpdf", "fontTools", "numpy", "requests"]
+
+
+# Function to build the default recording
+def default_recording():
+    """Synthetic stand-in responses used when no recording file is given"""
+    paragraphs = [line.strip() for line in SAMPLE_TEXT.strip().split("\n") if line.strip()]
+    return {
+        "page_html": "<html><body><nav><p>Home</p></nav><article>" +
+                     "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs * 20) +
+                     "</article><footer><p>Footer</p></footer></body></html>",
+        "groq_response": json.dumps({"criteria": [
+            {"name": name, "score": 5 + i % 5, "reasoning": "Stand-in reasoning for the benchmark.",
+             "improvement": f"Stand-in suggestion for {name}."}
+            for i, name in enumerate(CRITERIA)
+        ]})
+    }
+
+
+class StandInGroq:
+    """Replays a recorded Groq response after a configurable delay"""
+
+    def __init__(self, response, latency):
+        self.response = response
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.response))])
+
+
+class StandInResend:
+    """Accepts Resend POSTs after a configurable delay"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def post(self, url, json=None, data=None, timeout=None):
+        if data is not None:
+            # Read the streamed body like a real connection would
+            for _ in data:
+                pass
+        time.sleep(self.latency)
+        return SimpleNamespace(status_code=200, text="{}")
+
+
+# Function to serve the recorded page locally
+def start_page_server(html, latency):
+    """Serve html on a local port, answering each request after latency seconds"""
+    body = html.encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Function to record live responses
+def record(path, url=None):
+    """Call the live Groq API (and optionally fetch a page) once and save the responses for replay"""
+    from engine import get_groq_client
+    recording = default_recording()
+    if url:
+        recording["page_html"] = get_http_session().get(url, timeout=(5, 15)).text
+    recording["groq_response"] = request_analysis(get_groq_client(), SAMPLE_TEXT)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recording, f, ensure_ascii=False, indent=2)
+    logging.info(f"Recording saved to {path}")
+
+# Function to run one session through every stage
+def run_session(url, groq, resend, timings):
+    """Run the full pipeline once and append each stage duration to timings"""
+    def timed(stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[stage].append(time.perf_counter() - started)
+        return result
+
+    html = timed("fetch", lambda: get_http_session().get(url, timeout=(5, 15)).text)
+    text = timed("extract", extract_paragraphs, html)
+    # The cache is left out so every session pays for the (stand-in) model call
+    response = timed("llm", request_analysis, groq, text)
+    scores, suggestions = timed("parse", parse_analysis_result, response)
+    average_score = sum(scores.values()) / len(scores)
+    timed("chart", lambda: [overall_gauge_svg(average_score)] + [score_gauge_svg(score) for score in scores.values()])
+    pdf_content = timed("pdf", create_pdf_report, text, scores, suggestions, get_improvement_summary(scores))
+    timed("email", send_pdf_email, resend, "bench@example.com", "user@example.com", bytes(pdf_content), scores)
+
+# Function to summarize durations
+def summarize(durations):
+    """p50/p95/p99/mean in milliseconds"""
+    values = np.array(durations) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50_ms": round(p50, 3), "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3), "mean_ms": round(values.mean(), 3)}
+
+# Function to get the current version
+def current_version():
+    """Short git commit of the working tree, if available"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+# Function to profile the import of a module
+def profile_import(module):
+    """Import module in a fresh interpreter and return its import time, peak RSS, heaviest packages
+    and the deferred packages it loaded"""
+    code = (f"import resource, sys; import {module}; "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss); print(' '.join(sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=120, check=True)
+
+    # -X importtime lines read "import time: <self us> | <cumulative us> | <module>"
+    packages = {}
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[0].split(":")[1].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(fields[0].split(":")[1])
+    rss, loaded = result.stdout.splitlines()[-2:]
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:10]
+    return {
+        "import_ms": round(sum(packages.values()) / 1000, 1),
+        "peak_rss_mb": round(int(rss) / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "heaviest_ms": {package: round(us / 1000, 1) for package, us in heaviest},
+        "deferred_loaded": [package for package in DEFERRED_PACKAGES if package in loaded.split()]
+    }
+
+# Function to profile cold starts
+def run_startup_profile(modules=STARTUP_MODULES, repeats=3):
+    """Profile each module repeats times and keep the fastest run (the least disturbed by the machine)"""
+    return {
+        "version": current_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "modules": {module: min((profile_import(module) for _ in range(repeats)), key=lambda run: run["import_ms"])
+                    for module in modules}
+    }
+
+# Function to run the benchmark
+def run_benchmark(iterations=50, sessions=1, llm_latency=0.0, http_latency=0.0, email_latency=0.0, recording=None):
+    """Run iterations pipelines, sessions at a time, and return the results"""
+    recording = recording or default_recording()
+    server = start_page_server(recording["page_html"], http_latency)
+    url = f"http://127.0.0.1:{server.server_port}/page"
+    groq = StandInGroq(recording["groq_response"], llm_latency)
+    resend = StandInResend(email_latency)
+    timings = {stage: [] for stage in STAGES}
+
+    try:
+        # One warm-up session keeps import and font loading out of the numbers
+        run_session(url, groq, resend, {stage: [] for stage in STAGES})
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            for future in [executor.submit(run_session, url, groq, resend, timings) for _ in range(iterations)]:
+                future.result()
+        wall_time = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    return {
+        "version": current_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"iterations": iterations, "sessions": sessions, "llm_latency": llm_latency,
+                   "http_latency": http_latency, "email_latency": email_latency},
+        "stages": {stage: summarize(durations) for stage, durations in timings.items()},
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_s": round(iterations / wall_time, 3),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    }
+
+# Function to compare against a baseline
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """List stages whose p95 grew by more than threshold compared to baseline"""
+    regressions = []
+    for stage, summary in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous and previous["p95_ms"] > 0 and summary["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{stage}: p95 {previous['p95_ms']:.2f}ms -> {summary['p95_ms']:.2f}ms")
+    return regressions
+
+# Function to compare a startup profile against a baseline
+def find_startup_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """List modules whose import time grew by more than threshold, or that load a deferred package"""
+    regressions = []
+    for module, profile in results["modules"].items():
+        previous = baseline.get("modules", {}).get(module)
+        if previous and previous["import_ms"] > 0 and profile["import_ms"] > previous["import_ms"] * (1 + threshold):
+            regressions.append(f"{module}: import {previous['import_ms']:.1f}ms -> {profile['import_ms']:.1f}ms")
+        if profile["deferred_loaded"]:
+            regressions.append(f"{module}: loads {', '.join(profile['deferred_loaded'])} at import time")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Copycheck pipeline against local stand-ins")
+    parser.add_argument("--iterations", type=int, default=50, help="Pipelines to run")
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent sessions")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stand-in Groq latency in seconds")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Stand-in page server latency in seconds")
+    parser.add_argument("--email-latency", type=float, default=0.0, help="Stand-in Resend latency in seconds")
+    parser.add_argument("--recording", help="JSON file with recorded page_html and groq_response to replay")
+    parser.add_argument("--record", metavar="PATH", help="Call the live APIs once and save a recording to PATH")
+    parser.add_argument("--record-url", help="Page to fetch when recording")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--startup", action="store_true", help="Profile import time and RSS of the entry points instead")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    if args.record:
+        record(args.record, args.record_url)
+        return
+    if args.startup:
+        startup(args)
+        return
+
+    recording = None
+    if args.recording:
+        with open(args.recording, encoding="utf-8") as f:
+            recording = json.load(f)
+
+    results = run_benchmark(args.iterations, args.sessions, args.llm_latency, args.http_latency,
+                            args.email_latency, recording)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'stage':<8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for stage, summary in results["stages"].items():
+        print(f"{stage:<8} {summary['p50_ms']:>10.2f} {summary['p95_ms']:>10.2f} {summary['p99_ms']:>10.2f}")
+    print(f"Throughput: {results['throughput_per_s']:.2f} sessions/s, peak RSS: {results['peak_rss_mb']} MB")
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+# Function to run the startup profile from the command line
+def startup(args):
+    """Print and save the cold-start profile, comparing it with --baseline if given"""
+    results = run_startup_profile()
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'module':<10} {'import ms':>10} {'RSS MB':>8}  heaviest packages")
+    for module, profile in results["modules"].items():
+        heaviest = ", ".join(f"{package} {ms:.0f}ms" for package, ms in list(profile["heaviest_ms"].items())[:3])
+        print(f"{module:<10} {profile['import_ms']:>10.1f} {profile['peak_rss_mb']:>8.1f}  {heaviest}")
+    print(f"Results saved to {output}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = find_startup_regressions(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import math
+from functools import lru_cache
+
+from metrics import timed
+
+GAUGE_BACKGROUND = '#f0f2f6'
+GAUGE_RADIUS = 40
+GAUGE_CIRCUMFERENCE = 2 * math.pi * GAUGE_RADIUS
+
+
+# Function to get score color
+def get_score_color(score):
+    """Get color based on score value"""
+    if score >= 8:
+        return "#28a745"  # Green
+    elif score >= 6:
+        return "#ffc107"  # Yellow
+    elif score >= 4:
+        return "#fd7e14"  # Orange
+    else:
+        return "#dc3545"  # Red
+
+# Function to render a circular gauge
+@lru_cache(maxsize=1024)
+def gauge_svg(fraction, label, color, size=160, font_size=14):
+    """Render a circular progress gauge as an SVG string (memoized per distinct gauge)"""
+    fraction = min(max(fraction, 0.0), 1.0)
+    arc = GAUGE_CIRCUMFERENCE * fraction
+    # The arc starts at 3 o'clock and runs counter-clockwise, like the original matplotlib gauge
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100" width="{size}" height="{size}">'
+        f'<circle cx="50" cy="50" r="{GAUGE_RADIUS}" fill="{GAUGE_BACKGROUND}"/>'
+        f'<circle cx="50" cy="50" r="{GAUGE_RADIUS}" fill="none" stroke="{color}" stroke-width="5.5" '
+        f'stroke-dasharray="{arc:.2f} {GAUGE_CIRCUMFERENCE:.2f}" transform="matrix(1 0 0 -1 0 100)"/>'
+        f'<text x="50" y="50" text-anchor="middle" dominant-baseline="central" '
+        f'font-family="sans-serif" font-size="{font_size}" font-weight="bold" fill="#262730">{label}</text>'
+        f'</svg>'
+    )
+
+# Function to render a criterion gauge
+@timed("chart")
+def score_gauge_svg(score):
+    """Gauge for a 0-10 criterion score"""
+    return gauge_svg(round(score, 1) / 10, f'{score:.1f}', get_score_color(score))
+
+# Function to render the overall gauge
+@timed("chart")
+def overall_gauge_svg(average_score):
+    """Gauge for the overall score shown as a percentage"""
+    percent = int(average_score * 10)
+    return gauge_svg(percent / 100, f'{percent}%', get_score_color(average_score), size=240, font_size=11)
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from analyzer import (CRITERIA, MAX_INPUT_TOKENS, MAX_TEXT_LENGTH, analysis_cache_key, fallback_model, format_analysis,
+                      parse_analysis, prepare_text, request_analysis)
+from compaction import compact_text, count_tokens
+
+# Chunk sizes in characters. A chunk closes on a content-defined boundary once it reaches
+# CHUNK_MIN_LENGTH, so editing one section leaves the other chunks (and their cache entries) intact.
+CHUNK_MIN_LENGTH = 4000
+CHUNK_MAX_LENGTH = MAX_TEXT_LENGTH
+# A chunk also fits in the prompt token budget, so prepare_text never cuts it (non-Latin scripts
+# take more tokens per character)
+CHUNK_MAX_TOKENS = MAX_INPUT_TOKENS
+BOUNDARY_MODULUS = 4
+# Documents longer than this many chunks are cut off
+MAX_CHUNKS = 20
+MAX_CHUNK_WORKERS = 4
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+# Function to tell whether text fits in one request
+def fits_in_one_request(text):
+    """True when text is within both the character and the prompt token limits of one request"""
+    return len(text) <= CHUNK_MAX_LENGTH and count_tokens(text) <= CHUNK_MAX_TOKENS
+
+# Function to find where to cut an oversized paragraph
+def find_cut(block):
+    """Index of the last sentence (or word) boundary before which block fits in one request"""
+    limit = min(len(block), CHUNK_MAX_LENGTH)
+    while True:
+        cut = block.rfind(' ', 0, limit)
+        for match in _SENTENCE_END_RE.finditer(block, 0, limit):
+            cut = match.start()
+        cut = cut if cut > 0 else limit
+        if count_tokens(block[:cut]) <= CHUNK_MAX_TOKENS or limit <= 1:
+            return max(cut, 1)
+        limit = min(cut, limit) * 9 // 10
+
+# Function to split text into paragraphs
+def split_paragraphs(text):
+    """Split text on blank lines, or on single newlines when there are no blank lines"""
+    blocks = re.split(r'\n\s*\n', text.strip())
+    if len(blocks) == 1:
+        blocks = text.strip().split('\n')
+    paragraphs = []
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        # Paragraphs that do not fit in a chunk are split on sentence boundaries
+        while not fits_in_one_request(block):
+            cut = find_cut(block)
+            paragraphs.append(block[:cut].strip())
+            block = block[cut:].strip()
+        if block:
+            paragraphs.append(block)
+    return paragraphs
+
+# Function to tell whether a paragraph ends a chunk
+def is_boundary(paragraph):
+    """Content-defined boundary: depends only on the paragraph itself"""
+    digest = hashlib.md5(paragraph.encode('utf-8')).digest()
+    return digest[0] % BOUNDARY_MODULUS == 0
+
+# Function to split text into chunks
+def split_into_chunks(text):
+    """Pack paragraphs into chunks of at most CHUNK_MAX_LENGTH characters and CHUNK_MAX_TOKENS tokens"""
+    chunks = []
+    current = []
+    length = 0
+    tokens = 0
+    for paragraph in split_paragraphs(text):
+        paragraph_tokens = count_tokens(paragraph)
+        if current and (length + len(paragraph) + 2 > CHUNK_MAX_LENGTH or tokens + paragraph_tokens > CHUNK_MAX_TOKENS):
+            chunks.append('\n\n'.join(current))
+            current, length, tokens = [], 0, 0
+        current.append(paragraph)
+        length += len(paragraph) + 2
+        tokens += paragraph_tokens
+        if length >= CHUNK_MIN_LENGTH and is_boundary(paragraph):
+            chunks.append('\n\n'.join(current))
+            current, length, tokens = [], 0, 0
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    if len(chunks) > MAX_CHUNKS:
+        logging.warning(f"Document cut off after {MAX_CHUNKS} chunks of {len(chunks)}")
+        chunks = chunks[:MAX_CHUNKS]
+    return chunks
+
+# Function to aggregate chunk results
+def aggregate_chunk_results(results):
+    """Combine (chunk_length, scores, suggestions) results with length-weighted scores"""
+    scores = {}
+    suggestions = {}
+    for criterion in CRITERIA:
+        rated = [(length, chunk_scores[criterion], chunk_suggestions.get(criterion, ""))
+                 for length, chunk_scores, chunk_suggestions in results if criterion in chunk_scores]
+        if not rated:
+            continue
+        total = sum(length for length, _, _ in rated)
+        scores[criterion] = round(sum(length * score for length, score, _ in rated) / total, 1)
+        # The weakest section's suggestion is the most useful one
+        suggestions[criterion] = min(rated, key=lambda item: (item[1], -item[0]))[2]
+    return scores, suggestions
+
+# Function to analyze a document of any length
+def analyze_document(client, text, cache=None, max_workers=MAX_CHUNK_WORKERS):
+    """Analyze text, scoring long documents chunk by chunk in parallel, and return the result as JSON"""
+    # Compacting first keeps duplicated and boilerplate paragraphs from adding chunks
+    text = compact_text(text)
+    if fits_in_one_request(text):
+        return request_analysis(client, text, cache=cache)
+
+    chunks = split_into_chunks(text)
+    logging.info(f"Analyzing {len(text)} characters in {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        responses = list(executor.map(lambda chunk: request_analysis(client, chunk, cache=cache), chunks))
+
+    results = []
+    for chunk, response in zip(chunks, responses):
+        chunk_scores, chunk_suggestions, _ = parse_analysis(response)
+        results.append((len(chunk), chunk_scores, chunk_suggestions))
+    scores, suggestions = aggregate_chunk_results(results)
+    return format_analysis(scores, suggestions, model=fallback_model(*responses))
+
+# Function to get a fully cached document analysis
+def cached_document_analysis(text, cache):
+    """Return the analysis of text if every chunk is already cached, otherwise None"""
+    if cache is None:
+        return None
+    text = compact_text(text)
+    if fits_in_one_request(text):
+        return cache.get(analysis_cache_key(prepare_text(text)))
+
+    results = []
+    for chunk in split_into_chunks(text):
+        response = cache.get(analysis_cache_key(prepare_text(chunk)))
+        if response is None:
+            return None
+        chunk_scores, chunk_suggestions, _ = parse_analysis(response)
+        results.append((len(chunk), chunk_scores, chunk_suggestions))
+    scores, suggestions = aggregate_chunk_results(results)
+    return format_analysis(scores, suggestions)
@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from urllib.parse import urlsplit
+
+DEFAULT_BOILERPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "boilerplate.sqlite3")
+
+# A sentence found on at least this many pages of a domain is site boilerplate (navigation, banners, footers)
+BOILERPLATE_MIN_PAGES = 3
+# Pages remembered per domain; the oldest are forgotten first
+MAX_PAGES_PER_DOMAIN = 200
+# Stripping never leaves less than this share of a page, in case a site repeats its articles
+MIN_KEPT_RATIO = 0.3
+# Repeated sentences shorter than this many words are kept (short refrains are often deliberate)
+MIN_DEDUPE_WORDS = 5
+
+# Sentences found on any page, whatever the site: cookie banners, legal lines and script warnings
+BOILERPLATE_SENTENCE_PATTERNS = re.compile(
+    r'we use cookies|(accept|reject) (all )?cookies|cookie (policy|settings|preferences)|all rights reserved|'
+    r'enable javascript|javascript is (disabled|required)',
+    re.IGNORECASE
+)
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["”»)])\s+')
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+_INVISIBLE_RE = re.compile('[\u00ad\u200b\u200c\u200d\u2060\ufeff]')
+
+_boilerplate_index = None
+_lock = threading.Lock()
+
+
+# Function to split a paragraph into lines
+def split_lines(paragraph):
+    """Non-empty lines of a paragraph with their spacing collapsed (headlines and list items stay on their own line)"""
+    return [line for line in (' '.join(line.split()) for line in paragraph.split('\n')) if line]
+
+# Function to split a paragraph into sentences
+def split_sentences(paragraph):
+    """Split a paragraph on sentence-ending punctuation, keeping the punctuation"""
+    return [sentence for sentence in _SENTENCE_END_RE.split(paragraph.strip()) if sentence]
+
+# Function to hash a sentence
+def sentence_hash(sentence):
+    """Hash of a sentence ignoring case, digits and spacing, so dates and counts in banners still match"""
+    key = re.sub(r'\d+', '0', ' '.join(sentence.lower().split()))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+# Function to count tokens locally
+def count_tokens(text):
+    """Estimate the Llama 3 token count of text without a tokenizer.
+
+    Common Latin-script words are one token and longer ones one per 6 characters; other
+    scripts take about one token per 3 characters, digits one per 3 and punctuation one each.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text or ""):
+        if piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece.isascii() or all(unicodedata.name(char, "").startswith("LATIN") for char in piece):
+            tokens += math.ceil(len(piece) / 6)
+        elif piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+# Function to cut text to a token budget
+def fit_to_budget(text, max_tokens):
+    """Cut text at the last sentence that fits in max_tokens (adding "...")"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept = []
+    used = 0
+    for paragraph in text.split("\n\n"):
+        lines = []
+        for line in split_lines(paragraph):
+            sentences = []
+            for sentence in split_sentences(line):
+                used += count_tokens(sentence)
+                if used > max_tokens:
+                    break
+                sentences.append(sentence)
+            if sentences:
+                lines.append(" ".join(sentences))
+            if used > max_tokens:
+                break
+        if lines:
+            kept.append("\n".join(lines))
+        if used > max_tokens:
+            break
+    logging.warning(f"Text cut to {max_tokens} tokens")
+    if not kept:
+        # A single sentence over the budget is cut on characters instead
+        return text[:max_tokens * 4] + "..."
+    return "\n\n".join(kept) + "..."
+
+# Function to compact text before analysis
+def compact_text(text):
+    """Normalize whitespace (keeping line breaks) and drop cookie banners, duplicated paragraphs and repeated sentences"""
+    text = _INVISIBLE_RE.sub('', unicodedata.normalize("NFC", text or ""))
+    seen_paragraphs = set()
+    seen_sentences = set()
+    paragraphs = []
+    for block in re.split(r'\n\s*\n', text):
+        paragraph = '\n'.join(split_lines(block))
+        if not paragraph or paragraph.lower() in seen_paragraphs:
+            continue
+        seen_paragraphs.add(paragraph.lower())
+
+        lines = []
+        for line in paragraph.split('\n'):
+            sentences = []
+            for sentence in split_sentences(line):
+                if BOILERPLATE_SENTENCE_PATTERNS.search(sentence):
+                    continue
+                if len(sentence.split()) >= MIN_DEDUPE_WORDS:
+                    key = sentence.lower()
+                    if key in seen_sentences:
+                        continue
+                    seen_sentences.add(key)
+                sentences.append(sentence)
+            if sentences:
+                lines.append(' '.join(sentences))
+        if lines:
+            paragraphs.append('\n'.join(lines))
+    return '\n\n'.join(paragraphs)
+
+
+class BoilerplateIndex:
+    """SQLite index of the sentence hashes seen on each page of a domain, used to strip site boilerplate"""
+
+    def __init__(self, path=DEFAULT_BOILERPLATE_PATH, min_pages=BOILERPLATE_MIN_PAGES,
+                 max_pages=MAX_PAGES_PER_DOMAIN):
+        self.min_pages = min_pages
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "domain TEXT NOT NULL, page TEXT NOT NULL, seen_at REAL NOT NULL, PRIMARY KEY (domain, page))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sentences ("
+                "domain TEXT NOT NULL, hash TEXT NOT NULL, page TEXT NOT NULL, PRIMARY KEY (domain, hash, page))"
+            )
+            self._db.commit()
+        except Exception as e:
+            # Pages are still compacted, just without the learned site boilerplate
+            logging.error(f"Boilerplate index disabled: {str(e)}")
+            self._db = None
+
+    def clean(self, url, text):
+        """Record the sentences of the page at url, then return text without its domain's boilerplate"""
+        if not text or self._db is None:
+            return text
+        domain = urlsplit(url).netloc.lower()
+        page = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        paragraphs = [[[(sentence, sentence_hash(sentence)) for sentence in split_sentences(line)]
+                       for line in split_lines(block)] for block in re.split(r'\n\s*\n', text)]
+        hashes = sorted({key for lines in paragraphs for sentences in lines for _, key in sentences})
+        try:
+            with self._lock:
+                self._learn(domain, page, hashes)
+                boilerplate = self._boilerplate(domain, hashes)
+        except sqlite3.Error as e:
+            logging.error(f"Boilerplate index error: {str(e)}")
+            return text
+        if not boilerplate:
+            return text
+
+        kept = []
+        for lines in paragraphs:
+            kept_lines = [' '.join(sentence for sentence, key in sentences if key not in boilerplate) for sentences in lines]
+            kept.append('\n'.join(line for line in kept_lines if line))
+        cleaned = '\n\n'.join(paragraph for paragraph in kept if paragraph)
+        if len(cleaned) < MIN_KEPT_RATIO * len(text):
+            logging.info(f"Boilerplate of {domain} would leave too little of {url}, keeping the page as is")
+            return text
+        logging.debug(f"Stripped {len(text) - len(cleaned)} characters of {domain} boilerplate from {url}")
+        return cleaned
+
+    def _learn(self, domain, page, hashes):
+        now = time.time()
+        self._db.execute("INSERT OR REPLACE INTO pages (domain, page, seen_at) VALUES (?, ?, ?)", (domain, page, now))
+        self._db.execute("DELETE FROM sentences WHERE domain = ? AND page = ?", (domain, page))
+        self._db.executemany("INSERT OR IGNORE INTO sentences (domain, hash, page) VALUES (?, ?, ?)",
+                             [(domain, key, page) for key in hashes])
+        forgotten = [row[0] for row in self._db.execute(
+            "SELECT page FROM pages WHERE domain = ? ORDER BY seen_at DESC LIMIT -1 OFFSET ?", (domain, self.max_pages)
+        )]
+        for old_page in forgotten:
+            self._db.execute("DELETE FROM sentences WHERE domain = ? AND page = ?", (domain, old_page))
+            self._db.execute("DELETE FROM pages WHERE domain = ? AND page = ?", (domain, old_page))
+        self._db.commit()
+
+    def _boilerplate(self, domain, hashes):
+        boilerplate = set()
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT hash FROM sentences WHERE domain = ? AND hash IN ({', '.join('?' * len(batch))}) "
+                "GROUP BY hash HAVING COUNT(*) >= ?",
+                (domain, *batch, self.min_pages)
+            )
+            boilerplate.update(row[0] for row in rows)
+        return boilerplate
+
+
+# Function to get the shared boilerplate index
+def get_boilerplate_index():
+    """Get the process-wide boilerplate index"""
+    global _boilerplate_index
+    with _lock:
+        if _boilerplate_index is None:
+            _boilerplate_index = BoilerplateIndex()
+        return _boilerplate_index
@@ -0,0 +1,58 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from analyzer import CRITERIA
+
+
+# Function to build a model response
+def build_analysis_response(score=7, improvement="Add proof", scores=None):
+    """Structured analysis giving every criterion the same score and suggestion, except those in scores"""
+    scores = scores or {}
+    return json.dumps({"criteria": [{"name": name, "score": scores.get(name, score), "improvement": improvement}
+                                    for name in CRITERIA]})
+
+
+class FakeClient:
+    """Stand-in for the Groq client that records each request.
+
+    It answers with response, or with respond(**kwargs) when given (which may raise). failures maps
+    a model to the error its requests raise, and model overrides the model reported as answering.
+    """
+
+    def __init__(self, response=None, respond=None, failures=None, model=None):
+        self.response = build_analysis_response() if response is None else response
+        self.respond = respond
+        self.failures = failures or {}
+        self.model = model
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    @property
+    def calls(self):
+        return len(self.requests)
+
+    @property
+    def models(self):
+        return [request.get("model") for request in self.requests]
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("model") in self.failures:
+            raise self.failures[kwargs["model"]]
+        content = self.respond(**kwargs) if self.respond else self.response
+        return SimpleNamespace(model=self.model or kwargs.get("model"), usage=None,
+                               choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def analysis_response():
+    """Builder of structured model responses"""
+    return build_analysis_response
+
+
+@pytest.fixture
+def fake_client():
+    """Factory of fake Groq clients"""
+    return FakeClient
@@ -0,0 +1,325 @@
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from metrics import inc, span
+from report import create_pdf_report, get_improvement_summary
+
+RESEND_API_URL = "https://api.resend.com"
+# Connect and read timeouts in seconds
+RESEND_TIMEOUT = (5, 30)
+
+# PDF bytes base64-encoded at a time while the email request is sent (a multiple of 3)
+BASE64_CHUNK_BYTES = 3 * 64 * 1024
+_ATTACHMENT_PLACEHOLDER = "@@attachment@@"
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "delivery_queue.sqlite3")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SENT = "sent"
+FAILED = "failed"
+
+
+# Function to build the Resend session
+def create_resend_session(api_key):
+    """Create a keep-alive session authenticated against the Resend API"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount('https://', adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    })
+    return session
+
+# Function to add to audience
+def add_to_audience(session, audience_id, email):
+    """Add email to Copycheck audience in Resend using direct API call"""
+    try:
+        # Resend API endpoint for adding contacts to an audience
+        url = f"{RESEND_API_URL}/audiences/{audience_id}/contacts"
+
+        # Request payload
+        payload = {
+            "email": email,
+            "first_name": "",
+            "last_name": "",
+            "data": {
+                "source": "copycheck_app",
+                "signup_date": datetime.now().isoformat()
+            }
+        }
+
+        # Make the POST request
+        response = session.post(url, json=payload, timeout=RESEND_TIMEOUT)
+
+        # Log response for debugging
+        logging.debug(f"Resend API Response Status: {response.status_code}")
+        logging.debug(f"Resend API Response Body: {response.text}")
+
+        # Check if request was successful
+        if response.status_code in [200, 201]:
+            logging.info(f"Successfully added {email} to audience {audience_id}")
+            return True
+        else:
+            logging.error(f"Failed to add contact. Status code: {response.status_code}")
+            return False
+
+    except Exception as e:
+        logging.error(f"Error adding to audience: {str(e)}")
+        return False
+
+class EmailBody:
+    """JSON request body whose PDF attachment is base64-encoded chunk by chunk as it is sent"""
+
+    def __init__(self, params, pdf_content):
+        self.prefix, self.suffix = (part.encode("utf-8") for part in json.dumps(params).split(_ATTACHMENT_PLACEHOLDER))
+        self.pdf_content = pdf_content
+        if hasattr(pdf_content, "read"):
+            start = pdf_content.tell()
+            self.pdf_size = pdf_content.seek(0, os.SEEK_END) - start
+            pdf_content.seek(start)
+        else:
+            self.pdf_size = len(pdf_content)
+
+    def __len__(self):
+        return len(self.prefix) + 4 * -(-self.pdf_size // 3) + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        if hasattr(self.pdf_content, "read"):
+            while True:
+                chunk = self.pdf_content.read(BASE64_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk)
+        else:
+            view = memoryview(self.pdf_content)
+            for start in range(0, len(view), BASE64_CHUNK_BYTES):
+                yield base64.b64encode(view[start:start + BASE64_CHUNK_BYTES])
+        yield self.suffix
+
+
+# Function to send PDF email
+def send_pdf_email(session, sender_email, email, pdf_content, scores):
+    """Send PDF report (bytes or a binary file object) via email using Resend, raising on failure"""
+    # Calculate average score
+    average_score = sum(scores.values()) / len(scores) if scores else 0
+
+    # Create email with attachment
+    params = {
+        "from": sender_email,
+        "to": [email],
+        "subject": "Your Copycheck Analysis Report",
+        "html": f"""
+            <h2>Your Copycheck Results</h2>
+            <p>Thank you for using Copycheck!</p>
+            <p>Your overall score is: {average_score:.1f}/10</p>
+            <p>A detailed analysis report is attached to this email.</p>
+            <p>Feel free to reach out if you have any questions.</p>
+            <br>
+            <p>Best regards,<br>
+            Copycheck Team</p>
+        """,
+        "attachments": [{
+            "filename": "copycheck_analysis.pdf",
+            "content": _ATTACHMENT_PLACEHOLDER
+        }]
+    }
+
+    # The PDF is base64-encoded in chunks while the request is sent, instead of copied whole into the JSON
+    body = EmailBody(params, pdf_content)
+    with span("send_pdf_email", input_bytes=body.pdf_size) as attributes:
+        response = session.post(f"{RESEND_API_URL}/emails", data=body, timeout=RESEND_TIMEOUT)
+        attributes["status_code"] = response.status_code
+        if response.status_code in [200, 201]:
+            logging.info("Email sent successfully")
+            return True
+        logging.error(f"Failed to send email. Status: {response.status_code}, Response: {response.text}")
+        raise Exception(f"Failed to send email: {response.text}")
+
+
+class DeliveryQueue:
+    """Durable SQLite job queue rendering PDF reports and emailing them from a background thread"""
+
+    def __init__(self, resend_api_key, sender_email, audience_id, path=DEFAULT_QUEUE_PATH,
+                 max_attempts=5, base_delay=5.0, poll_interval=2.0, lease_timeout=600.0):
+        self.sender_email = sender_email
+        self.audience_id = audience_id
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.poll_interval = poll_interval
+        # Seconds after which a running job is considered abandoned by its process
+        self.lease_timeout = lease_timeout
+        self.session = create_resend_session(resend_api_key)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+            "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Queues created before reports could be handed over pre-rendered lack the pdf column
+        columns = [column[1] for column in self._db.execute("PRAGMA table_info(jobs)")]
+        if "pdf" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN pdf BLOB")
+        # Nor do queues created before a report could only be queued once
+        if "report_key" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN report_key TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_report_key ON jobs (report_key)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, next_attempt_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS audience (email TEXT PRIMARY KEY, added_at REAL NOT NULL)")
+        self._db.commit()
+
+    def start(self):
+        """Start the background worker if it is not running yet"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="report-delivery", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the background worker"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, email, text, scores, suggestions, pdf=None, report_key=None):
+        """Queue a report for delivery and return its job id (pdf: already rendered report, if any).
+
+        A report_key identifies one report: while a job with the same key and email is queued,
+        running or sent, its id is returned instead of queuing the report again.
+        """
+        payload = json.dumps({"text": text, "scores": scores, "suggestions": suggestions}, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            if report_key is not None:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE report_key = ? AND email = ? AND status != ? ORDER BY id DESC LIMIT 1",
+                    (report_key, email, FAILED)
+                ).fetchone()
+                if row:
+                    return row["id"]
+            cursor = self._db.execute(
+                "INSERT INTO jobs (email, payload, status, next_attempt_at, created_at, updated_at, pdf, report_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (email, payload, QUEUED, now, now, now, pdf, report_key)
+            )
+            self._db.commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def status(self, job_id):
+        """Return the status, attempts and last error of a job, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, attempts, last_error, next_attempt_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def counts(self):
+        """Return the number of jobs in each state"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def process_next(self):
+        """Deliver the next due job; return False when nothing was due"""
+        job = self._claim()
+        if job is None:
+            return False
+
+        payload = json.loads(job["payload"])
+        try:
+            scores = payload["scores"]
+            if job["pdf"] is not None:
+                self._add_to_audience_once(job["email"])
+                send_pdf_email(self.session, self.sender_email, job["email"], job["pdf"], scores)
+            else:
+                pdf = create_pdf_report(payload["text"], scores, payload["suggestions"], get_improvement_summary(scores))
+                if pdf is None:
+                    raise Exception("PDF generation failed")
+                self._add_to_audience_once(job["email"])
+                send_pdf_email(self.session, self.sender_email, job["email"], pdf, scores)
+            self._finish(job["id"], SENT, job["attempts"] + 1, None, time.time())
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if attempts >= self.max_attempts:
+                logging.error(f"Report delivery {job['id']} failed after {attempts} attempts: {str(e)}")
+                self._finish(job["id"], FAILED, attempts, str(e), time.time())
+            else:
+                delay = self.base_delay * 2 ** (attempts - 1)
+                inc("copycheck_retries_total", stage="send_pdf_email")
+                logging.warning(f"Report delivery {job['id']} attempt {attempts} failed, retrying in {delay:.0f}s: {str(e)}")
+                self._finish(job["id"], QUEUED, attempts, str(e), time.time() + delay)
+        return True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.process_next():
+                    continue
+            except Exception as e:
+                logging.error(f"Report delivery worker error: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            # Jobs of a process that stopped while delivering them are picked up again once their lease ran out
+            self._db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                             (QUEUED, now, RUNNING, now - self.lease_timeout))
+            self._db.commit()
+            while True:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                    (QUEUED, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                # Other processes may share the queue file, only the one whose update matches owns the job
+                claimed = self._db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                           (RUNNING, time.time(), row["id"], QUEUED)).rowcount
+                self._db.commit()
+                if claimed:
+                    return row
+
+    def _finish(self, job_id, status, attempts, error, next_attempt_at):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ?, "
+                "pdf = CASE WHEN ? = ? THEN pdf END WHERE id = ?",
+                (status, attempts, error, next_attempt_at, time.time(), status, QUEUED, job_id)
+            )
+            self._db.commit()
+
+    def _add_to_audience_once(self, email):
+        with self._lock:
+            known = self._db.execute("SELECT 1 FROM audience WHERE email = ?", (email,)).fetchone()
+        if known:
+            return
+        # A failed audience add does not block the report, it is simply tried again next time
+        if add_to_audience(self.session, self.audience_id, email):
+            with self._lock:
+                self._db.execute("INSERT OR IGNORE INTO audience (email, added_at) VALUES (?, ?)", (email, time.time()))
+                self._db.commit()
@@ -0,0 +1,177 @@
+import difflib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from analyzer import (CRITERIA, STRUCTURED_OUTPUT_FORMAT, describe_criteria, format_analysis, output_token_budget,
+                      parse_analysis, request_structured, response_model)
+from chunking import analyze_document, fits_in_one_request, split_paragraphs
+
+DEFAULT_DRAFTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "drafts.sqlite3")
+
+# Above this share of changed text the whole draft is analyzed again
+FULL_REANALYSIS_RATIO = 0.5
+
+EDIT_SYSTEM_PROMPT = (
+    "You are given edited passages of a longer piece of copy. Passages marked [EDITED] were changed; "
+    "passages marked [CONTEXT] are unchanged and only shown for context.\n"
+    "Evaluate the [EDITED] passages on 10 copywriting criteria (10 points each):\n" + describe_criteria(CRITERIA) +
+    "\n\n" + STRUCTURED_OUTPUT_FORMAT
+)
+
+
+# Function to hash a paragraph
+def paragraph_hash(paragraph):
+    """Content hash of a paragraph, insensitive to surrounding whitespace"""
+    return hashlib.sha256(' '.join(paragraph.split()).encode('utf-8')).hexdigest()[:16]
+
+
+class DraftStore:
+    """SQLite history of draft versions with their paragraph hashes and results"""
+
+    def __init__(self, path=DEFAULT_DRAFTS_PATH):
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS draft_versions ("
+            "owner TEXT NOT NULL, name TEXT NOT NULL, version INTEGER NOT NULL, created_at REAL NOT NULL, "
+            "paragraphs TEXT NOT NULL, scores TEXT NOT NULL, suggestions TEXT NOT NULL, mode TEXT NOT NULL, "
+            "changed_ratio REAL NOT NULL, PRIMARY KEY (owner, name, version))"
+        )
+        self._db.commit()
+
+    def latest(self, owner, name):
+        """Return the latest version of a draft as a dict, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM draft_versions WHERE owner = ? AND name = ? ORDER BY version DESC LIMIT 1",
+                (owner, name)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def history(self, owner, name):
+        """Return every version of a draft, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM draft_versions WHERE owner = ? AND name = ? ORDER BY version",
+                (owner, name)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def save(self, owner, name, paragraphs, scores, suggestions, mode, changed_ratio):
+        """Store a new version and return its number"""
+        with self._lock:
+            current = self._db.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM draft_versions WHERE owner = ? AND name = ?", (owner, name)
+            ).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO draft_versions (owner, name, version, created_at, paragraphs, scores, suggestions, mode, changed_ratio) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, name, current + 1, time.time(), json.dumps(paragraphs), json.dumps(scores),
+                 json.dumps(suggestions, ensure_ascii=False), mode, changed_ratio)
+            )
+            self._db.commit()
+        return current + 1
+
+    def _to_dict(self, row):
+        version = dict(row)
+        for key in ("paragraphs", "scores", "suggestions"):
+            version[key] = json.loads(version[key])
+        return version
+
+
+# Function to find edited paragraphs
+def diff_paragraphs(previous_hashes, paragraphs):
+    """Return the indexes of new or changed paragraphs (deletions mark their neighbour as edited)"""
+    hashes = [paragraph_hash(paragraph) for paragraph in paragraphs]
+    edited = set()
+    matcher = difflib.SequenceMatcher(a=previous_hashes, b=hashes, autojunk=False)
+    for tag, _, _, start, end in matcher.get_opcodes():
+        if tag in ('replace', 'insert'):
+            edited.update(range(start, end))
+        elif tag == 'delete' and paragraphs:
+            edited.add(min(start, len(paragraphs) - 1))
+    return sorted(edited)
+
+# Function to build the excerpt sent for edited paragraphs
+def build_edit_excerpt(paragraphs, edited):
+    """Edited paragraphs with one unchanged paragraph of context on each side"""
+    edited = set(edited)
+    shown = set()
+    for index in edited:
+        shown.update(i for i in (index - 1, index, index + 1) if 0 <= i < len(paragraphs))
+    parts = []
+    for index in sorted(shown):
+        marker = "[EDITED]" if index in edited else "[CONTEXT]"
+        parts.append(f"{marker}\n{paragraphs[index]}")
+    return "\n\n".join(parts)
+
+# Function to merge an edit analysis with the previous result
+def merge_edit_result(previous, edit_scores, edit_suggestions, changed_ratio):
+    """Blend previous scores with the edited passages' scores in proportion to the changed text"""
+    scores = dict(previous["scores"])
+    suggestions = dict(previous["suggestions"])
+    for criterion, score in edit_scores.items():
+        if criterion in scores:
+            scores[criterion] = round(scores[criterion] * (1 - changed_ratio) + score * changed_ratio, 1)
+            # The edited passage's suggestion is kept when it is where the criterion got weaker
+            if score < previous["scores"][criterion] and edit_suggestions.get(criterion):
+                suggestions[criterion] = edit_suggestions[criterion]
+        else:
+            scores[criterion] = score
+            suggestions[criterion] = edit_suggestions.get(criterion, "")
+    return scores, suggestions
+
+# Function to analyze a new version of a draft
+def analyze_draft(client, store, owner, name, text, cache=None):
+    """Analyze a draft version, re-scoring only edited paragraphs when possible.
+
+    Returns the analysis as JSON and a dict describing the new version.
+    """
+    paragraphs = split_paragraphs(text)
+    hashes = [paragraph_hash(paragraph) for paragraph in paragraphs]
+    previous = store.latest(owner, name)
+
+    mode = "full"
+    changed_ratio = 1.0
+    response = None
+    if previous and previous["scores"]:
+        edited = diff_paragraphs(previous["paragraphs"], paragraphs)
+        total = sum(len(paragraph) for paragraph in paragraphs) or 1
+        changed_ratio = min(1.0, sum(len(paragraphs[i]) for i in edited) / total)
+        if not edited:
+            mode = "unchanged"
+            changed_ratio = 0.0
+            response = format_analysis(previous["scores"], previous["suggestions"])
+        elif changed_ratio <= FULL_REANALYSIS_RATIO:
+            excerpt = build_edit_excerpt(paragraphs, edited)
+            if fits_in_one_request(excerpt):
+                logging.info(f"Draft '{name}': re-scoring {len(edited)} of {len(paragraphs)} paragraphs")
+                edit_response = request_structured(
+                    client, excerpt, EDIT_SYSTEM_PROMPT, output_token_budget(len(CRITERIA)), cache=cache
+                )
+                edit_scores, edit_suggestions, _ = parse_analysis(edit_response)
+                if edit_scores:
+                    mode = "incremental"
+                    response = format_analysis(*merge_edit_result(previous, edit_scores, edit_suggestions, changed_ratio),
+                                               model=response_model(edit_response))
+
+    if response is None:
+        response = analyze_document(client, text, cache=cache)
+        changed_ratio = 1.0
+        mode = "full"
+
+    scores, suggestions, _ = parse_analysis(response)
+    version = previous["version"] if mode == "unchanged" else None
+    if scores and mode != "unchanged":
+        version = store.save(owner, name, hashes, scores, suggestions, mode, changed_ratio)
+    return response, {"version": version, "mode": mode, "changed_ratio": changed_ratio,
+                      "paragraphs": len(paragraphs)}
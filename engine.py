@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+
+import toml
+
+from admission import AdmissionController
+from analysis_cache import AnalysisCache
+from analyzer import ANALYSIS_MODEL, parse_analysis, response_model
+from chunking import analyze_document
+from ingestion import extract_articles
+from metrics import span
+from routing import DEFAULT_FALLBACK_MODELS, REJECTION_MESSAGES, ModelRouter, triage
+from report import get_final_comment, get_improvement_summary
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+_lock = threading.Lock()
+_settings = None
+_groq_client = None
+_analysis_cache = None
+_history_store = None
+_near_duplicate_index = None
+_admission_controller = None
+
+
+class EngineError(Exception):
+    """Raised when a scoring request cannot be served"""
+
+
+# Function to load settings
+def load_settings(secrets=None):
+    """Read API keys and the model fallback chain from a secrets mapping (st.secrets layout)
+    or .streamlit/secrets.toml, then env"""
+    if secrets is None:
+        secrets = toml.load(SECRETS_PATH) if os.path.exists(SECRETS_PATH) else {}
+    groq = secrets.get("groq", {})
+    resend = secrets.get("resend", {})
+    fallback_models = os.environ.get("GROQ_FALLBACK_MODELS")
+    if fallback_models is not None:
+        fallback_models = [model.strip() for model in fallback_models.split(",") if model.strip()]
+    settings = {
+        "groq_api_key": os.environ.get("GROQ_API_KEY") or groq.get("api_key"),
+        "fallback_models": list(fallback_models if fallback_models is not None
+                                else groq.get("fallback_models", DEFAULT_FALLBACK_MODELS)),
+        "resend_api_key": os.environ.get("RESEND_API_KEY") or resend.get("api_key"),
+        "sender_email": os.environ.get("RESEND_SENDER_EMAIL") or resend.get("sender_email"),
+        "audience_id": os.environ.get("RESEND_AUDIENCE_ID") or resend.get("audience_id")
+    }
+    if not settings["groq_api_key"] or settings["groq_api_key"].isspace():
+        raise ValueError("Groq API key is empty")
+    return settings
+
+# Function to set the process settings
+def configure(secrets=None):
+    """Load settings once for this process (call before the first client is built)"""
+    global _settings
+    with _lock:
+        _settings = load_settings(secrets)
+        return _settings
+
+# Function to get the process settings
+def get_settings():
+    """Get the settings, loading them from disk on first use"""
+    return _settings or configure()
+
+# Function to get the shared Groq client
+def get_groq_client():
+    """Get the process-wide Groq client (and its connection pool), with model fallback"""
+    global _groq_client
+    if _groq_client is None:
+        settings = get_settings()
+        with _lock:
+            if _groq_client is None:
+                # groq (with pydantic) is the heaviest import, so it is only loaded for the first model call
+                from groq import Groq
+                _groq_client = ModelRouter(Groq(api_key=settings["groq_api_key"]), settings["fallback_models"])
+    return _groq_client
+
+# Function to get the shared analysis cache
+def get_analysis_cache():
+    """Get the process-wide analysis cache"""
+    global _analysis_cache
+    with _lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache()
+        return _analysis_cache
+
+# Function to get the shared history store
+def get_history_store():
+    """Get the process-wide analysis history store"""
+    global _history_store
+    with _lock:
+        if _history_store is None:
+            from history import HistoryStore
+            _history_store = HistoryStore()
+        return _history_store
+
+# Function to get the shared near-duplicate index
+def get_near_duplicate_index():
+    """Get the process-wide index of scored texts, used to reuse the scores of near-duplicates"""
+    global _near_duplicate_index
+    with _lock:
+        if _near_duplicate_index is None:
+            from similarity import NearDuplicateIndex
+            _near_duplicate_index = NearDuplicateIndex()
+        return _near_duplicate_index
+
+# Function to get the shared admission controller
+def get_admission_controller():
+    """Get the process-wide fair queue that admits analyses across sessions"""
+    global _admission_controller
+    with _lock:
+        if _admission_controller is None:
+            _admission_controller = AdmissionController()
+        return _admission_controller
+
+# Function to analyze text based on copywriting criteria
+def analyze_text(text, use_cache=True):
+    """Return the raw analysis of text, or None if it failed or was rejected by triage"""
+    if not triage(text)["accepted"]:
+        return None
+    try:
+        with span("analyze_text", input_bytes=len(text.encode('utf-8'))):
+            return analyze_document(get_groq_client(), text, cache=get_analysis_cache() if use_cache else None)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return None
+
+# Function to score a text or URL
+def score_text(text=None, url=None, allow_degraded=False):
+    """Score text (or the article at url) and return scores, suggestions and summary.
+
+    With allow_degraded, local heuristic scores are returned when the model call fails
+    (source is then "heuristic" instead of "llm"); model names the model that answered. A near-duplicate
+    of an already scored text reuses its scores without a model call; near_duplicate then holds the
+    estimated similarity.
+    """
+    if url:
+        contents = [content for content in extract_articles(url.split()) if content]
+        if not contents:
+            raise EngineError("Could not extract article content")
+        text = "\n\n".join(contents)
+    verdict = triage(text)
+    if not verdict["accepted"]:
+        raise EngineError(REJECTION_MESSAGES[verdict["reason"]])
+
+    source = "llm"
+    model = ANALYSIS_MODEL
+    missing = []
+    match = get_near_duplicate_index().lookup(text)
+    if match:
+        (scores, suggestions), similarity = match
+        scores, suggestions = dict(scores), dict(suggestions)
+    else:
+        similarity = None
+        try:
+            with span("analyze_text", input_bytes=len(text.encode('utf-8'))):
+                response = analyze_document(get_groq_client(), text, cache=get_analysis_cache())
+        except Exception as e:
+            if not allow_degraded:
+                raise
+            logging.warning(f"Analysis unavailable ({str(e)}), falling back to local scores")
+            from heuristics import heuristic_analysis
+            response = heuristic_analysis(text)
+            source = "heuristic"
+        model = response_model(response) if source == "llm" else None
+        scores, suggestions, missing = parse_analysis(response)
+        if not scores:
+            raise EngineError("No scores found in response")
+        # Only complete answers of the analysis model are reused, like the analysis cache
+        if model == ANALYSIS_MODEL and not missing:
+            get_near_duplicate_index().add(text, (scores, suggestions))
+
+    average_score = sum(scores.values()) / len(scores)
+    return {
+        "scores": scores,
+        "suggestions": suggestions,
+        "missing": missing,
+        "language": verdict["language"],
+        "warnings": verdict["warnings"],
+        "source": source,
+        "model": model,
+        "near_duplicate": similarity,
+        "average_score": round(average_score, 2),
+        "summary": get_improvement_summary(scores),
+        "comment": get_final_comment(average_score)
+    }
@@ -0,0 +1,185 @@
+import re
+
+import numpy as np
+
+from analyzer import CRITERIA, format_analysis
+
+# Word lists for the features below (English and French, like most of our traffic)
+SECOND_PERSON = ["you", "your", "yours", "yourself", "you're", "you'll", "you've", "vous", "votre", "vos", "tu", "ton", "ta", "tes"]
+FIRST_PERSON_PLURAL = ["we", "our", "ours", "us", "we're", "we've", "nous", "notre", "nos"]
+CTA_VERBS = ["buy", "get", "start", "try", "join", "sign", "subscribe", "download", "order", "book", "call", "discover",
+             "claim", "register", "shop", "grab", "request", "contact", "learn", "reserve", "schedule", "apply",
+             "achetez", "découvrez", "essayez", "inscrivez", "commandez", "réservez", "contactez", "profitez", "rejoignez"]
+URGENCY_WORDS = ["now", "today", "limited", "last", "ends", "hurry", "instantly", "immediately", "only", "deadline",
+                 "maintenant", "aujourd'hui", "limité", "dernier", "vite"]
+BENEFIT_WORDS = ["save", "free", "easy", "easily", "fast", "faster", "more", "better", "results", "without", "boost",
+                 "grow", "increase", "improve", "simple", "effortless", "gain", "win", "benefit", "gratuit", "facile",
+                 "rapide", "économisez", "gagnez", "améliorez", "sans", "plus"]
+BENEFIT_PHRASES = re.compile(r"so (that )?you can|which means|so you|that means|without having to|pour que vous|afin de|"
+                             r"ce qui (vous )?permet", re.IGNORECASE)
+PROOF_WORDS = ["guarantee", "guaranteed", "certified", "proven", "study", "research", "reviews", "review", "customers",
+               "clients", "trusted", "award", "rated", "testimonial", "case", "data", "experts", "garantie", "prouvé",
+               "avis", "étude", "certifié"]
+EMOTION_WORDS = ["love", "hate", "fear", "dream", "imagine", "feel", "frustrated", "tired", "stress", "happy", "proud",
+                 "finally", "struggle", "worry", "excited", "joy", "pain", "relief", "amazing", "beautiful", "secret",
+                 "rêve", "imaginez", "peur", "aimez", "fier", "enfin", "stress", "plaisir"]
+STORY_MARKERS = re.compile(r"\b(imagine|when i|when we|story|remember|one day|years ago|last year|imaginez|il y a)\b", re.IGNORECASE)
+TRANSITIONS = ["but", "so", "because", "then", "however", "that's", "first", "next", "finally", "also", "plus", "instead",
+               "mais", "donc", "car", "ensuite", "puis", "enfin", "aussi", "pourtant"]
+POWER_WORDS = ["new", "free", "proven", "secret", "instant", "easy", "how", "why", "discover", "ultimate", "exclusive",
+               "nouveau", "gratuit", "secret", "comment", "pourquoi"]
+SOCIAL_PROOF = re.compile(r"\b\d[\d,.]*\+?\s*(customers|clients|users|teams|companies|people|reviews|utilisateurs|clients)\b|"
+                          r"\btrusted by\b|\bjoin (over|more than)\b", re.IGNORECASE)
+SCARCITY = re.compile(r"\b(limited|only \d+|last chance|while (stocks|supplies) last|ends (today|soon|tonight)|places limitées)\b", re.IGNORECASE)
+AUTHORITY = re.compile(r"\b(expert|doctor|dr\.|certified|award|featured in|as seen (in|on)|recommended by|harvard|university)\b", re.IGNORECASE)
+RECIPROCITY = re.compile(r"\b(free|bonus|gift|complimentary|no credit card|gratuit|offert|cadeau)\b", re.IGNORECASE)
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*|\d[\d,.]*%?")
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+_VOWEL_GROUP_RE = re.compile(r"[aeiouyàâäéèêëîïôöùûü]+")
+
+NO_SUGGESTION = "No obvious weakness found by the local checks."
+
+# Criterion scores are weighted sums of features in [0, 1]. The weakest weighted feature picks the suggestion.
+SCORING_RULES = {
+    "Empathy": [
+        ("second_person", 0.6, "Speak to the reader directly with \"you\" and \"your\" instead of describing yourself."),
+        ("questions", 0.2, "Ask a question your reader is already asking themselves."),
+        ("reader_focus", 0.2, "Talk less about \"we\" and \"our\" and more about the reader's situation.")
+    ],
+    "Clarity": [
+        ("readability", 0.5, "Use shorter words and sentences so the message reads at a glance."),
+        ("short_sentences", 0.3, "Split sentences longer than 25 words."),
+        ("plain_words", 0.2, "Replace long, abstract words with everyday ones.")
+    ],
+    "Attention": [
+        ("short_headline", 0.3, "Open with a short headline of 12 words or fewer."),
+        ("headline_hook", 0.4, "Put a number, a question or a \"how to\" promise in the headline."),
+        ("short_opening", 0.3, "Make the first sentence short and punchy.")
+    ],
+    "Flow": [
+        ("transitions", 0.4, "Link ideas with transitions such as \"but\", \"so\" and \"because\"."),
+        ("paragraphs", 0.3, "Break the copy into several short paragraphs."),
+        ("rhythm", 0.3, "Vary sentence length to give the copy rhythm.")
+    ],
+    "Benefits": [
+        ("benefit_words", 0.6, "State what the reader gains (time, money, results) rather than listing features."),
+        ("benefit_phrases", 0.4, "Turn features into benefits with \"so you can\" or \"which means\".")
+    ],
+    "Action": [
+        ("cta_verbs", 0.5, "Add a clear call-to-action verb such as \"Start\", \"Get\" or \"Book\"."),
+        ("closing_cta", 0.3, "End with the call to action so the next step is obvious."),
+        ("urgency", 0.2, "Give a reason to act now.")
+    ],
+    "Trust": [
+        ("numbers", 0.4, "Back claims with specific numbers and results."),
+        ("proof_words", 0.4, "Add proof: reviews, guarantees, certifications or case studies."),
+        ("quotes", 0.2, "Quote a real customer.")
+    ],
+    "Emotion": [
+        ("emotion_words", 0.6, "Name the feelings behind the problem and the relief of solving it."),
+        ("story", 0.2, "Tell a short story or ask the reader to imagine the outcome."),
+        ("exclamations", 0.2, "Let some energy show in the copy.")
+    ],
+    "Adaptation": [
+        ("length_fit", 0.5, "Aim for 50 to 1,500 words: enough to persuade, short enough to finish."),
+        ("paragraph_fit", 0.3, "Keep paragraphs under 80 words for screen reading."),
+        ("formatting", 0.2, "Use headings or bullet points so the copy can be skimmed.")
+    ],
+    "Influence": [
+        ("social_proof", 0.3, "Show how many people already use and like the product."),
+        ("scarcity", 0.25, "Use honest scarcity: limited places, deadlines or stock."),
+        ("authority", 0.25, "Mention experts, awards or press coverage."),
+        ("reciprocity", 0.2, "Offer something first: a free trial, bonus or guide.")
+    ]
+}
+
+
+def _ramp(value, low, high):
+    """0 at or below low, 1 at or above high, linear in between"""
+    return float(np.clip((value - low) / (high - low), 0.0, 1.0))
+
+
+# Function to extract text features
+def extract_features(text):
+    """Compute the scoring features of text, each normalized to [0, 1]"""
+    text = text or ""
+    words = np.array([word.lower() for word in _WORD_RE.findall(text)], dtype=object)
+    sentences = [sentence.strip() for sentence in _SENTENCE_RE.findall(text) if _WORD_RE.search(sentence)]
+    paragraphs = [paragraph for paragraph in re.split(r"\n\s*\n", text.strip()) if paragraph.strip()]
+    lines = [line.strip() for line in text.strip().split("\n") if line.strip()]
+    word_count = max(len(words), 1)
+
+    sentence_lengths = np.array([len(_WORD_RE.findall(sentence)) for sentence in sentences] or [0], dtype=float)
+    is_alpha = np.array([word[0].isalpha() for word in words], dtype=bool) if len(words) else np.zeros(0, dtype=bool)
+    alpha_words = words[is_alpha]
+    word_lengths = np.array([len(word) for word in alpha_words] or [0], dtype=float)
+    syllables = np.array([max(1, len(_VOWEL_GROUP_RE.findall(word))) for word in alpha_words] or [1], dtype=float)
+
+    def share(lexicon):
+        return np.isin(words, lexicon).sum() / word_count
+
+    # Flesch reading ease from the average sentence length and syllables per word
+    reading_ease = 206.835 - 1.015 * sentence_lengths.mean() - 84.6 * syllables.mean()
+    second_person = share(SECOND_PERSON)
+    first_person = share(FIRST_PERSON_PLURAL)
+    headline = lines[0] if lines else ""
+    headline_words = [word.lower() for word in _WORD_RE.findall(headline)]
+    closing_words = words[int(len(words) * 0.8):]
+    paragraph_lengths = np.array([len(_WORD_RE.findall(paragraph)) for paragraph in paragraphs] or [0], dtype=float)
+    variation = sentence_lengths.std() / sentence_lengths.mean() if sentence_lengths.mean() else 0.0
+
+    return {
+        "second_person": _ramp(second_person, 0.005, 0.04),
+        "questions": _ramp(text.count("?") / max(len(sentences), 1), 0.0, 0.15),
+        "reader_focus": _ramp(second_person / (second_person + first_person) if second_person + first_person else 0.5, 0.3, 0.8),
+        "readability": _ramp(reading_ease, 20, 70),
+        "short_sentences": 1.0 - _ramp(float((sentence_lengths > 25).mean()), 0.1, 0.4),
+        "plain_words": 1.0 - _ramp(word_lengths.mean(), 5.0, 6.5),
+        "short_headline": 1.0 if 0 < len(headline_words) <= 12 else 0.0,
+        "headline_hook": min(1.0, 0.5 * bool(re.search(r"\d|\?|:", headline)) +
+                             0.5 * bool(re.search(r"\bhow to\b|\bcomment\b|\bwhy\b|\bpourquoi\b", headline, re.IGNORECASE)) +
+                             0.5 * bool(np.isin(headline_words, POWER_WORDS).any()) if headline_words else 0.0),
+        "short_opening": 1.0 - _ramp(sentence_lengths[0], 15, 30),
+        "transitions": _ramp(share(TRANSITIONS), 0.005, 0.03),
+        "paragraphs": _ramp(len(paragraphs) + len(lines) * 0.5, 1, 5),
+        "rhythm": _ramp(variation, 0.2, 0.6),
+        "benefit_words": _ramp(share(BENEFIT_WORDS), 0.005, 0.03),
+        "benefit_phrases": _ramp(len(BENEFIT_PHRASES.findall(text)), 0, 2),
+        "cta_verbs": _ramp(np.isin(words, CTA_VERBS).sum(), 0, 3),
+        "closing_cta": 1.0 if np.isin(closing_words, CTA_VERBS).any() else 0.0,
+        "urgency": _ramp(np.isin(words, URGENCY_WORDS).sum(), 0, 2),
+        "numbers": _ramp((~is_alpha).sum() / word_count, 0.005, 0.03),
+        "proof_words": _ramp(np.isin(words, PROOF_WORDS).sum(), 0, 3),
+        "quotes": 1.0 if re.search(r"[\"“«][^\"”»]{20,}[\"”»]", text) else 0.0,
+        "emotion_words": _ramp(share(EMOTION_WORDS), 0.005, 0.03),
+        "story": _ramp(len(STORY_MARKERS.findall(text)), 0, 2),
+        "exclamations": _ramp(text.count("!"), 0, 2),
+        "length_fit": _ramp(len(words), 20, 50) * (1.0 - _ramp(len(words), 1500, 3000)),
+        "paragraph_fit": 1.0 - _ramp(paragraph_lengths.mean(), 80, 200),
+        "formatting": 1.0 if re.search(r"^\s*([-*•]|\d+[.)]|#+)\s", text, re.MULTILINE) else 0.0,
+        "social_proof": 1.0 if SOCIAL_PROOF.search(text) else 0.0,
+        "scarcity": 1.0 if SCARCITY.search(text) else 0.0,
+        "authority": 1.0 if AUTHORITY.search(text) else 0.0,
+        "reciprocity": 1.0 if RECIPROCITY.search(text) else 0.0
+    }
+
+# Function to score text locally
+def heuristic_scores(text):
+    """Score text on the ten criteria without a model call and return scores and suggestions"""
+    features = extract_features(text)
+    scores = {}
+    suggestions = {}
+    for criterion in CRITERIA:
+        rules = SCORING_RULES[criterion]
+        total = sum(weight * features[feature] for feature, weight, _ in rules)
+        # Scores stay within 1-10, like the model's, and are whole numbers
+        scores[criterion] = int(np.clip(round(10 * total), 1, 10))
+        feature, weight, suggestion = max(rules, key=lambda rule: rule[1] * (1.0 - features[rule[0]]))
+        suggestions[criterion] = suggestion if features[feature] < 1.0 else NO_SUGGESTION
+    return scores, suggestions
+
+# Function to get a local analysis
+def heuristic_analysis(text):
+    """Local analysis in the structured response format"""
+    return format_analysis(*heuristic_scores(text))
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from analysis_cache import normalize_text
+from analyzer import CRITERIA
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history.sqlite3")
+
+# Characters of the analyzed text kept to recognize an entry (the text itself is not stored)
+EXCERPT_LENGTH = 120
+# One score column per criterion, so trends are computed from plain numeric columns
+SCORE_COLUMNS = {criterion: f"score_{criterion.lower()}" for criterion in CRITERIA}
+PERIODS = {"day": 86400, "week": 7 * 86400}
+
+
+# Function to hash an analyzed text
+def text_hash(text):
+    """Content hash of a text, insensitive to cosmetic whitespace changes"""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class HistoryStore:
+    """SQLite history of finished analyses, indexed by email, URL, text and date"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "id INTEGER PRIMARY KEY, created_at REAL NOT NULL, email TEXT, url TEXT, text_hash TEXT NOT NULL, "
+            "excerpt TEXT NOT NULL, characters INTEGER NOT NULL, language TEXT, model TEXT, source TEXT NOT NULL, "
+            "duration_ms REAL, average_score REAL NOT NULL, " +
+            "".join(f"{column} REAL, " for column in SCORE_COLUMNS.values()) +
+            "suggestions TEXT NOT NULL)"
+        )
+        for name, columns in (("email", "email, created_at"), ("url", "url, created_at"),
+                              ("created", "created_at"), ("text", "text_hash, created_at")):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_analyses_{name} ON analyses ({columns})")
+        self._db.commit()
+
+    def record(self, text, scores, suggestions, email=None, url=None, language=None, model=None, source="llm",
+               duration=None, created_at=None):
+        """Store a finished analysis and return its id"""
+        values = {
+            "created_at": created_at or time.time(),
+            "email": email.strip().lower() if email else None,
+            "url": url,
+            "text_hash": text_hash(text),
+            "excerpt": " ".join(text.split())[:EXCERPT_LENGTH],
+            "characters": len(text),
+            "language": language,
+            "model": model,
+            "source": source,
+            "duration_ms": round(duration * 1000, 1) if duration is not None else None,
+            "average_score": round(sum(scores.values()) / len(scores), 2),
+            "suggestions": json.dumps(suggestions, ensure_ascii=False)
+        }
+        values.update({column: scores.get(criterion) for criterion, column in SCORE_COLUMNS.items()})
+        with self._lock:
+            cursor = self._db.execute(
+                f"INSERT INTO analyses ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                tuple(values.values())
+            )
+            self._db.commit()
+        return cursor.lastrowid
+
+    def find(self, text, email=None):
+        """Return the latest analysis of text (by this email, if given) as a dict, or None"""
+        where, params = self._filters(email=email)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT * FROM analyses WHERE text_hash = ?{' AND ' + where if where else ''} "
+                "ORDER BY created_at DESC LIMIT 1",
+                (text_hash(text), *params)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def history(self, email=None, url=None, since=None, limit=100):
+        """Return the latest analyses matching the filters, newest first"""
+        where, params = self._filters(email, url, since)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM analyses{' WHERE ' + where if where else ''} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def score_matrix(self, email=None, url=None, since=None):
+        """Return the creation times and an (analyses x criteria) score array, oldest first"""
+        where, params = self._filters(email, url, since)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT created_at, {', '.join(SCORE_COLUMNS.values())} FROM analyses"
+                f"{' WHERE ' + where if where else ''} ORDER BY created_at",
+                params
+            ).fetchall()
+        # Missing criteria are NaN so they are left out of the means
+        matrix = np.array([tuple(row) for row in rows], dtype=float).reshape(len(rows), len(CRITERIA) + 1)
+        return matrix[:, 0], matrix[:, 1:]
+
+    def _filters(self, email=None, url=None, since=None):
+        clauses, params = [], []
+        if email:
+            clauses.append("email = ?")
+            params.append(email.strip().lower())
+        if url:
+            clauses.append("url = ?")
+            params.append(url)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        return " AND ".join(clauses), params
+
+    def _to_dict(self, row):
+        analysis = {key: row[key] for key in row.keys() if key not in SCORE_COLUMNS.values()}
+        analysis["scores"] = {criterion: row[column] for criterion, column in SCORE_COLUMNS.items()
+                              if row[column] is not None}
+        analysis["suggestions"] = json.loads(analysis["suggestions"])
+        return analysis
+
+
+# Function to aggregate score trends
+def score_trends(times, scores, period="day"):
+    """Average scores per period.
+
+    Returns the period start times, the number of analyses, the overall average and the
+    per-criterion averages (one column per criterion) of each period.
+    """
+    if not len(times):
+        return np.zeros(0), np.zeros(0, dtype=int), np.zeros(0), np.zeros((0, len(CRITERIA)))
+    seconds = PERIODS[period]
+    starts, buckets = np.unique((times // seconds).astype(np.int64), return_inverse=True)
+    counts = np.bincount(buckets)
+
+    # Per-bucket sums and counts of the scores present, so missing criteria do not drag the means down
+    present = ~np.isnan(scores)
+    sums = np.zeros((len(starts), scores.shape[1]))
+    totals = np.zeros((len(starts), scores.shape[1]))
+    np.add.at(sums, buckets, np.where(present, scores, 0.0))
+    np.add.at(totals, buckets, present)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        criteria_means = sums / totals
+        averages = np.nansum(scores, axis=1) / present.sum(axis=1)
+    overall = np.bincount(buckets, weights=averages) / counts
+    return starts * seconds, counts, overall, criteria_means
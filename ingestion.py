@@ -0,0 +1,279 @@
+import codecs
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+from admission import SingleFlight
+from compaction import get_boilerplate_index
+from metrics import timed
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Connect and read timeouts in seconds
+REQUEST_TIMEOUT = (5, 15)
+# Pages are cut off after this many bytes
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+# Connections kept open per host
+MAX_CONNECTIONS_PER_HOST = 4
+MAX_FETCH_WORKERS = 8
+
+DEFAULT_PAGE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "page_cache.sqlite3")
+
+_session = None
+_session_lock = threading.Lock()
+_page_cache = None
+# Sessions extracting the same URL at the same time (a shared campaign link) share one fetch
+_extractions = SingleFlight("fetch")
+
+
+# Function to get the shared HTTP session
+def get_http_session():
+    """Get the process-wide keep-alive session with bounded per-host pools"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is only loaded once the first page is fetched
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            # pool_block makes extra threads wait for a connection instead of opening more per host
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=MAX_CONNECTIONS_PER_HOST, pool_block=True)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'User-Agent': USER_AGENT})
+            _session = session
+        return _session
+
+
+class PageCache:
+    """SQLite store of extracted page content with the validators needed for conditional GETs"""
+
+    def __init__(self, path=DEFAULT_PAGE_CACHE_PATH, max_entries=2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content TEXT, fetched_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except Exception as e:
+            logging.error(f"Page cache disabled: {str(e)}")
+            self._db = None
+
+    def get(self, url):
+        """Return (etag, last_modified, content) for url, or None"""
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                return self._db.execute(
+                    "SELECT etag, last_modified, content FROM pages WHERE url = ?", (url,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"Page cache read failed: {str(e)}")
+                return None
+
+    def set(self, url, etag, last_modified, content):
+        """Remember the extracted content of url and its validators"""
+        if self._db is None or not (etag or last_modified):
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (url, etag, last_modified, content, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, content, time.time())
+                )
+                self._db.execute(
+                    "DELETE FROM pages WHERE url NOT IN (SELECT url FROM pages ORDER BY fetched_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Page cache write failed: {str(e)}")
+
+
+# Function to get the shared page cache
+def get_page_cache():
+    """Get the process-wide page cache"""
+    global _page_cache
+    with _session_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+
+class ParagraphExtractor(HTMLParser):
+    """Streaming extractor for <p> text inside the first <article>, <main> or div.post-content"""
+
+    SKIPPED_TAGS = ('script', 'style', 'nav', 'footer', 'header')
+    CONTAINERS = ('article', 'main', 'post-content')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = {kind: [] for kind in self.CONTAINERS}
+        self._depth = {kind: 0 for kind in self.CONTAINERS}
+        self._closed = set()
+        self._div_stack = []
+        self._skip = 0
+        self._current = None
+
+    def _active(self):
+        return [kind for kind in self.CONTAINERS if self._depth[kind] > 0]
+
+    def _flush(self):
+        if self._current is not None:
+            text = ''.join(self._current[1]).strip()
+            if text:
+                for kind in self._current[0]:
+                    self.paragraphs[kind].append(text)
+            self._current = None
+
+    def _enter(self, kind):
+        if kind not in self._closed:
+            self._depth[kind] += 1
+
+    def _leave(self, kind):
+        if self._depth[kind] > 0:
+            self._depth[kind] -= 1
+            if self._depth[kind] == 0:
+                # Only the first matching container counts, as with soup.find()
+                self._closed.add(kind)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip += 1
+        elif tag in ('article', 'main'):
+            self._enter(tag)
+        elif tag == 'div':
+            classes = (dict(attrs).get('class') or '').split()
+            is_post_content = 'post-content' in classes
+            self._div_stack.append(is_post_content)
+            if is_post_content or self._depth['post-content'] > 0:
+                self._enter('post-content')
+        elif tag == 'p':
+            # An unclosed paragraph ends where the next one starts
+            self._flush()
+            active = self._active()
+            if active and not self._skip:
+                self._current = (active, [])
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in ('article', 'main'):
+            self._flush()
+            self._leave(tag)
+        elif tag == 'div' and self._div_stack:
+            self._div_stack.pop()
+            if self._depth['post-content'] > 0:
+                self._flush()
+                self._leave('post-content')
+        elif tag == 'p':
+            self._flush()
+
+    def handle_data(self, data):
+        if self._current is not None and not self._skip:
+            self._current[1].append(data)
+
+    def content(self):
+        """Return the cleaned text of the best container, one paragraph per block, or None"""
+        self._flush()
+        for kind in self.CONTAINERS:
+            if self.paragraphs[kind]:
+                # Paragraph breaks are kept so long documents can be chunked on them
+                return '\n\n'.join(re.sub(r'\s+', ' ', paragraph).strip() for paragraph in self.paragraphs[kind])
+        return None
+
+
+# Function to extract article text from HTML
+def extract_paragraphs(html):
+    """Extract article paragraphs from an HTML string"""
+    extractor = ParagraphExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.content()
+
+# Function to fetch a page and extract its article
+def fetch_article(url, session=None, page_cache=None, max_bytes=MAX_PAGE_BYTES, timeout=REQUEST_TIMEOUT):
+    """Fetch url with a conditional GET and stream its body through the paragraph extractor"""
+    page_cache = page_cache or get_page_cache()
+    cached = page_cache.get(url)
+    etag, last_modified, _ = cached or (None, None, None)
+
+    page = fetch_page(url, session, etag, last_modified, max_bytes, timeout)
+    if page["not_modified"] and cached:
+        logging.debug(f"Page not modified: {url}")
+        return cached[2]
+    page_cache.set(url, page["etag"], page["last_modified"], page["content"])
+    return page["content"]
+
+# Function to fetch a page
+def fetch_page(url, session=None, etag=None, last_modified=None, max_bytes=MAX_PAGE_BYTES, timeout=REQUEST_TIMEOUT):
+    """Fetch url, conditionally when validators are given, and extract its article.
+
+    Returns a dict with not_modified, content (None when not modified or without an article),
+    etag and last_modified. HTTP errors raise.
+    """
+    session = session or get_http_session()
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            # A 304 may leave out the validators, which then stay as they were
+            return {"not_modified": True, "content": None, "etag": response.headers.get('ETag') or etag,
+                    "last_modified": response.headers.get('Last-Modified') or last_modified}
+        response.raise_for_status()
+
+        extractor = ParagraphExtractor()
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunk = chunk[:max_bytes - received]
+            received += len(chunk)
+            extractor.feed(decoder.decode(chunk))
+            if received >= max_bytes:
+                logging.warning(f"Page cut off after {received} bytes: {url}")
+                break
+        extractor.feed(decoder.decode(b'', final=True))
+        extractor.close()
+        return {"not_modified": False, "content": extractor.content(), "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified')}
+
+# Function to extract article content from URL
+@timed("extract_article_content")
+def extract_article_content(url):
+    """Extract article content from URL, without the boilerplate shared by the site's pages"""
+    return _extractions.do(url, extract_page_content, url)
+
+# Function to extract the content of one page
+def extract_page_content(url):
+    """Fetch url and strip its site boilerplate, returning None on failure"""
+    try:
+        return get_boilerplate_index().clean(url, fetch_article(url))
+    except Exception as e:
+        logging.error(f"Error extracting content: {str(e)}")
+        return None
+
+# Function to extract several articles at once
+def extract_articles(urls, max_workers=MAX_FETCH_WORKERS):
+    """Fetch and extract urls concurrently, returning contents in input order (None on failure)"""
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(extract_article_content, urls))
@@ -0,0 +1,193 @@
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = {
+    "copycheck_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage"),
+    "copycheck_stage_bytes_total": ("counter", "Bytes going into and out of each pipeline stage"),
+    "copycheck_llm_tokens_total": ("counter", "Groq prompt and completion tokens"),
+    "copycheck_llm_requests_total": ("counter", "Groq chat completion requests"),
+    "copycheck_cache_requests_total": ("counter", "Analysis cache lookups by result"),
+    "copycheck_retries_total": ("counter", "Retried calls by stage"),
+    "copycheck_triage_total": ("counter", "Submissions triaged before analysis, by result and language"),
+    "copycheck_near_duplicate_requests_total": ("counter", "Near-duplicate index lookups by result"),
+    "copycheck_coalesced_requests_total": ("counter", "Calls that joined an identical call already in flight, by stage"),
+    "copycheck_admission_total": ("counter", "Analysis admission decisions by result")
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in the Prometheus text format"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        """Add amount to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def value(self, name, **labels):
+        """Current value of a counter, or observation count of a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key]["count"]
+            return self._counters.get(key, 0)
+
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                          for key, h in self._histograms.items()}
+
+        lines = []
+        names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+        for name in names:
+            kind, description = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(float(bound))),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+# Function to increment a counter
+def inc(name, amount=1, **labels):
+    """Add amount to a counter of the process registry"""
+    REGISTRY.inc(name, amount, **labels)
+
+# Function to time a pipeline stage
+@contextmanager
+def span(stage, **attributes):
+    """Time the enclosed block as stage and record its attributes.
+
+    The yielded dict can be filled in while the block runs; input_bytes and output_bytes
+    are exported as byte counters, status overrides the outcome, and every attribute is
+    written to the debug log.
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - started, attributes.pop("status", status), attributes)
+
+# Function to time every call of a function
+def timed(stage):
+    """Decorator recording each call as stage; a None result counts as an error"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage) as attributes:
+                result = func(*args, **kwargs)
+                if result is None:
+                    attributes["status"] = "error"
+                elif isinstance(result, (str, bytes, bytearray)):
+                    attributes["output_bytes"] = len(result.encode('utf-8') if isinstance(result, str) else result)
+                return result
+        return wrapper
+    return decorator
+
+# Function to record a finished stage
+def record_stage(stage, duration, status="ok", attributes=None):
+    """Export the duration and sizes of a finished stage and log its attributes"""
+    attributes = attributes or {}
+    REGISTRY.observe("copycheck_stage_duration_seconds", duration, stage=stage, status=status)
+    for direction in ("input", "output"):
+        size = attributes.get(f"{direction}_bytes")
+        if size:
+            REGISTRY.inc("copycheck_stage_bytes_total", size, stage=stage, direction=direction)
+    logging.debug(f"span {json.dumps(dict(attributes, stage=stage, status=status, duration_ms=round(duration * 1000, 3)), default=str)}")
+
+# Function to record token usage
+def record_usage(usage, model):
+    """Count a Groq request and the prompt/completion tokens from its usage field (if any)"""
+    REGISTRY.inc("copycheck_llm_requests_total", model=model)
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            REGISTRY.inc("copycheck_llm_tokens_total", tokens, model=model, kind=kind)
+
+# Function to start a metrics endpoint
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve GET /metrics from a background thread and return the server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
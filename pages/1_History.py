@@ -0,0 +1,92 @@
+import streamlit as st
+import time
+import numpy as np
+from datetime import datetime
+from analyzer import CRITERIA
+from charts import overall_gauge_svg, score_gauge_svg
+from engine import get_history_store
+from history import score_trends
+
+st.set_page_config(
+    page_title="Copycheck - History",
+    page_icon="📈",
+    layout="wide"
+)
+
+# Function to display a past analysis
+def display_past_analysis(analysis):
+    """Display the scores and suggestions of a stored analysis"""
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.markdown("### Overall Score")
+        st.markdown(overall_gauge_svg(analysis['average_score']), unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"_{analysis['excerpt']}..._")
+        if analysis['url']:
+            st.markdown(f"Source: {analysis['url']}")
+    for criterion, score in analysis['scores'].items():
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            st.markdown(score_gauge_svg(score), unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"### {criterion}")
+            st.progress(score/10)
+            st.markdown(f"_{analysis['suggestions'].get(criterion, '')}_")
+
+# Header
+st.title("Analysis History")
+st.markdown("Your past analyses and how your scores evolve, without analyzing the texts again")
+
+# Filters: emails are not verified, so only those analyses were run with in this session can be looked up
+emails = st.session_state.get('history_emails', [])
+if not emails:
+    st.info('Run an analysis first: the history of the email you use is shown here for the rest of your session.')
+    st.stop()
+email = st.selectbox('Email', emails)
+url = st.text_input('Only show analyses of this URL (optional):').strip()
+col1, col2 = st.columns(2)
+with col1:
+    days = st.selectbox('Period', [7, 30, 90, 365], index=1, format_func=lambda d: f"Last {d} days")
+with col2:
+    period = st.radio('Group by', ['day', 'week'], horizontal=True)
+
+if email:
+    since = time.time() - days * 86400
+    store = get_history_store()
+    times, scores = store.score_matrix(email=email, url=url or None, since=since)
+    if not len(times):
+        st.info('No analyses found for this email in this period.')
+        st.stop()
+    
+    starts, counts, overall, criteria_means = score_trends(times, scores, period)
+    dates = [datetime.fromtimestamp(start) for start in starts]
+    criteria_averages = np.nanmean(scores, axis=0)
+    
+    # Summary
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Analyses", int(counts.sum()))
+    col2.metric("Average Score", f"{(overall * counts).sum() / counts.sum():.1f}/10",
+                delta=f"{overall[-1] - overall[0]:+.1f}" if len(overall) > 1 else None)
+    col3.metric("Weakest Criterion", CRITERIA[int(np.nanargmin(criteria_averages))])
+    
+    # Trends
+    st.markdown("## Trends")
+    st.markdown("### Overall Score")
+    st.line_chart({"Date": dates, "Overall": overall}, x="Date")
+    st.markdown("### Criteria")
+    st.line_chart({"Date": dates, **{criterion: criteria_means[:, i] for i, criterion in enumerate(CRITERIA)}}, x="Date")
+    
+    # Past analyses
+    st.markdown("## Past Analyses")
+    analyses = store.history(email=email, url=url or None, since=since)
+    st.dataframe([
+        {"Date": datetime.fromtimestamp(analysis['created_at']).strftime('%Y-%m-%d %H:%M'),
+         "Text": analysis['excerpt'], "Overall": analysis['average_score'], **analysis['scores']}
+        for analysis in analyses
+    ], hide_index=True)
+    selected = st.selectbox(
+        'Show the details of an analysis', analyses,
+        format_func=lambda analysis: f"{datetime.fromtimestamp(analysis['created_at']).strftime('%Y-%m-%d %H:%M')} - {analysis['excerpt'][:60]}"
+    )
+    if selected:
+        display_past_analysis(selected)
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime
+from charts import get_score_color
+from metrics import timed
+
+# Characters of the analyzed text shown in the report
+REPORT_TEXT_LENGTH = 500
+OVERALL_GAUGE_SIZE = 36
+CRITERION_GAUGE_SIZE = 10
+
+# Function to get improvement summary
+def get_improvement_summary(scores):
+    """Get a summary of the main areas for improvement"""
+    # Sort scores by value to find lowest scores
+    sorted_scores = sorted(scores.items(), key=lambda x: x[1])
+    lowest_scores = sorted_scores[:3]  # Get 3 lowest scores
+    
+    if lowest_scores[0][1] < 5:
+        urgency = "urgent"
+    else:
+        urgency = "important"
+    
+    areas = ", ".join([f"{area}" for area, score in lowest_scores])
+    return f"The {urgency} areas for improvement are: {areas}. Focus on these aspects to significantly enhance your copy's effectiveness."
+
+# Function to get final comment
+def get_final_comment(average_score):
+    """Get final assessment comment based on average score"""
+    if not isinstance(average_score, (int, float)) or average_score < 0:
+        return "Unable to calculate score. Please try again."
+        
+    if average_score >= 9:
+        return "Excellent! Your copy is highly effective and persuasive."
+    elif average_score >= 7:
+        return "Very good! Your copy is effective with some room for improvement."
+    elif average_score >= 5:
+        return "Good start. Your copy needs some work to be more effective."
+    else:
+        return "Your copy needs significant improvement. Consider implementing the suggestions above."
+
+# Function to create PDF report
+@timed("create_pdf_report")
+def create_pdf_report(text, scores, suggestions, final_comment):
+    """Create a PDF report with the analysis results and return it as a bytearray"""
+    try:
+        # fpdf and fontTools are only imported once the first report is rendered
+        from fpdf.enums import XPos, YPos
+        from report_pdf import ReportPDF
+        pdf = ReportPDF()
+        pdf.add_page()
+
+        pdf.text_line('title', 'Copycheck Analysis Report', align='C')
+        pdf.ln(10)
+        pdf.text_line('date', f'Generated on {datetime.now().strftime("%Y-%m-%d %H:%M")}', align='C')
+        pdf.ln(20)
+
+        # Add analyzed text
+        pdf.text_line('heading', 'Analyzed Text:')
+        pdf.ln(5)
+        pdf.paragraph('body', text[:REPORT_TEXT_LENGTH] + '...' if len(text) > REPORT_TEXT_LENGTH else text)
+        pdf.ln(10)
+
+        # Add scores and suggestions
+        pdf.text_line('heading', 'Analysis Results:')
+        pdf.ln(10)
+
+        # Calculate average score
+        average_score = sum(scores.values()) / len(scores) if scores else 0
+        percent = int(average_score * 10)
+
+        if pdf.will_page_break(OVERALL_GAUGE_SIZE):
+            pdf.add_page()
+        top = pdf.get_y()
+        pdf.gauge(pdf.l_margin, top, OVERALL_GAUGE_SIZE, percent / 100, f'{percent}%', get_score_color(average_score), 14)
+        pdf.set_xy(pdf.l_margin + OVERALL_GAUGE_SIZE + 5, top + OVERALL_GAUGE_SIZE / 2 - 5)
+        height = pdf.use_style('criterion')
+        pdf.cell(0, height, f'Overall Score: {percent}%', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_y(top + OVERALL_GAUGE_SIZE + 5)
+
+        for criterion, score in scores.items():
+            if pdf.will_page_break(CRITERION_GAUGE_SIZE + 10):
+                pdf.add_page()
+            top = pdf.get_y()
+            pdf.gauge(pdf.l_margin, top, CRITERION_GAUGE_SIZE, round(score, 1) / 10, f'{score:.0f}', get_score_color(score), 7)
+            pdf.set_xy(pdf.l_margin + CRITERION_GAUGE_SIZE + 3, top)
+            height = pdf.use_style('criterion')
+            pdf.cell(0, height, f'{criterion}: {score:.1f}/10', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            if criterion in suggestions:
+                pdf.paragraph('suggestion', f'Suggestion: {suggestions[criterion]}')
+            pdf.ln(5)
+
+        # Add areas for improvement
+        pdf.ln(10)
+        pdf.text_line('heading', 'Areas for Improvement:')
+        pdf.ln(5)
+        pdf.paragraph('body', get_improvement_summary(scores))
+
+        return pdf.output()
+    except Exception as e:
+        logging.error(f"Error creating PDF: {e}")
+        return None
@@ -0,0 +1,138 @@
+import copy
+import io
+import logging
+import os
+import threading
+from fontTools import subset, ttLib
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import SubsetMap, TTFFont
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+REPORT_FONT = "dejavu"
+REPORT_FONT_FILES = {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf", "I": "DejaVuSans-Oblique.ttf"}
+# fpdf2 drops these tables from every embedded font; dropping them once up front makes each subset cheaper
+UNUSED_FONT_TABLES = ["FFTM", "GDEF", "GPOS", "GSUB", "MATH", "hdmx", "meta"]
+# Characters kept in the process-wide copy of the fonts: Latin, Greek, Cyrillic, punctuation and common symbols
+# (scripts that need text shaping are not rendered correctly by fpdf2 without it anyway)
+REPORT_FONT_UNICODES = [
+    *range(0x0000, 0x0530), *range(0x1E00, 0x2000), *range(0x2000, 0x2070), *range(0x20A0, 0x20D0),
+    *range(0x2100, 0x2150), *range(0x2190, 0x2200), *range(0x2200, 0x2300), *range(0x25A0, 0x2600),
+    *range(0x2600, 0x27C0)
+]
+FALLBACK_FONT = "helvetica"
+
+# Report layout: text styles as (font style, size, line height)
+REPORT_STYLES = {
+    "title": ("B", 24, 20),
+    "date": ("I", 12, 10),
+    "heading": ("B", 14, 10),
+    "body": ("", 12, 10),
+    "criterion": ("B", 12, 10),
+    "suggestion": ("I", 12, 10)
+}
+GAUGE_BACKGROUND = "#f0f2f6"
+
+# fontTools logs every pruned table at INFO while subsetting
+logging.getLogger("fontTools.subset").setLevel(logging.WARNING)
+
+_font_lock = threading.Lock()
+_report_fonts = None
+
+# Function to load the report fonts
+def load_report_fonts():
+    """Parse and subset the report fonts once per process; an empty dict means they are unavailable"""
+    global _report_fonts
+    with _font_lock:
+        if _report_fonts is None:
+            try:
+                _report_fonts = {style: _load_font(style, filename) for style, filename in REPORT_FONT_FILES.items()}
+            except Exception as e:
+                logging.error(f"Report fonts unavailable, falling back to {FALLBACK_FONT}: {e}")
+                _report_fonts = {}
+        return _report_fonts
+
+def _load_font(style, filename):
+    path = os.path.join(FONTS_DIR, filename)
+    ttfont = ttLib.TTFont(path, recalcTimestamp=False)
+    options = subset.Options(notdef_outline=True, recommended_glyphs=True)
+    options.drop_tables += UNUSED_FONT_TABLES
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=REPORT_FONT_UNICODES)
+    subsetter.subset(ttfont)
+    buffer = io.BytesIO()
+    ttfont.save(buffer)
+    data = buffer.getvalue()
+    # Glyph widths and metrics are computed here once; each report only gets a fresh copy of the font tables
+    prototype = TTFFont(FPDF(), io.BytesIO(data), f"{REPORT_FONT}{style}", style)
+    prototype.ttffile = path
+    prototype.ttfont.close()
+    return prototype, data
+
+
+class ReportPDF(FPDF):
+    """FPDF document using the process-wide report fonts and the report layout"""
+
+    def __init__(self):
+        super().__init__()
+        self.report_fonts = load_report_fonts()
+        self.family = REPORT_FONT if self.report_fonts else FALLBACK_FONT
+
+    def set_font(self, family=None, style="", size=0):
+        # Report fonts are attached on first use, since every attached font is embedded
+        if family == REPORT_FONT and f"{REPORT_FONT}{style}" not in self.fonts and style in self.report_fonts:
+            self._attach_font(*self.report_fonts[style])
+        super().set_font(family, style, size)
+
+    def _attach_font(self, prototype, data):
+        identities = "\x00 \r\n"
+        if self.str_alias_nb_pages:
+            identities += "0123456789" + self.str_alias_nb_pages
+        font = copy.copy(prototype)
+        font.i = len(self.fonts) + 1
+        # Subsetting on output modifies the font tables, so every document reads its own copy
+        font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True)
+        font.missing_glyphs = []
+        font.subset = SubsetMap(font, [ord(char) for char in identities])
+        self.fonts[font.fontkey] = font
+
+    def use_style(self, name):
+        """Switch to a text style of the layout and return its line height"""
+        style, size, height = REPORT_STYLES[name]
+        self.set_font(self.family, style, size)
+        return height
+
+    def text_line(self, name, text, align=''):
+        """Write a single line in a layout style"""
+        height = self.use_style(name)
+        self.cell(0, height, self.printable(text), align=align, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def paragraph(self, name, text):
+        """Write wrapped text in a layout style"""
+        height = self.use_style(name)
+        self.multi_cell(0, height, self.printable(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def printable(self, text):
+        """Text as it can be written with the current font family"""
+        if self.family == REPORT_FONT:
+            return text
+        # The core font only covers latin-1
+        return text.encode('latin-1', 'replace').decode('latin-1')
+
+    def gauge(self, x, y, size, fraction, label, color, font_size):
+        """Draw a circular score gauge as vector paths"""
+        fraction = min(max(fraction, 0.0), 1.0)
+        inset = size * 0.1
+        diameter = size - 2 * inset
+        self.set_fill_color(GAUGE_BACKGROUND)
+        self.circle(x + inset, y + inset, diameter, style="F")
+        if fraction > 0:
+            self.set_draw_color(color)
+            self.set_line_width(size * 0.055)
+            # Starts at 3 o'clock and runs counter-clockwise, like the on-screen gauge
+            self.arc(x + inset, y + inset, diameter, 0, 360 * (1 - fraction), clockwise=True)
+            self.set_line_width(0.2)
+            self.set_draw_color(0)
+        self.set_font(self.family, 'B', font_size)
+        self.set_xy(x, y + size / 2 - font_size * 0.2)
+        self.cell(size, font_size * 0.4, label, align='C')
@@ -0,0 +1,156 @@
+import logging
+import re
+from types import SimpleNamespace
+
+from metrics import inc
+
+# Models tried in order when the analysis model is rate-limited or failing
+DEFAULT_FALLBACK_MODELS = ["llama-3.1-8b-instant"]
+
+# Submissions with fewer words than this are not worth a model call
+MIN_WORDS = 8
+# Share of letters among non-space characters below which the input is not prose (code, numbers, markup)
+MIN_LETTER_RATIO = 0.3
+# Below this share the input is still analyzed, with a warning (pricing copy is full of numbers)
+WARN_LETTER_RATIO = 0.6
+# Share of distinct words below which a longer input is considered repetitive
+MIN_DISTINCT_WORD_RATIO = 0.2
+# Boilerplate is only rejected when sentences with at least two different boilerplate phrases make up
+# this share of the words; copy that merely mentions one ("finds every 404") gets a warning
+BOILERPLATE_MIN_SHARE = 0.5
+BOILERPLATE_MIN_PHRASES = 2
+BOILERPLATE_PATTERNS = re.compile(
+    r"lorem ipsum|dolor sit amet|consectetur adipiscing|we use cookies|accept (all )?cookies|"
+    r"cookie (policy|settings|preferences)|page not found|\b404\b|could not be found|access denied|"
+    r"(do not|don't) have permission|enable javascript|javascript is (disabled|required)|"
+    r"subscribe to our newsletter|unsubscribe|all rights reserved|privacy policy|terms of (service|use)",
+    re.IGNORECASE
+)
+_SENTENCE_RE = re.compile(r'[^.!?\n]+[.!?]*')
+
+REJECTION_MESSAGES = {
+    "empty": "Please enter some text to analyze.",
+    "too_short": f"Your text is too short to analyze. Please enter at least {MIN_WORDS} words of copy.",
+    "not_text": "This does not look like copy (mostly code, numbers or markup). Please paste the text itself.",
+    "repetitive": "Your text repeats the same words too much to be analyzed as copy.",
+    "boilerplate": "This looks like page boilerplate (cookie banner, error page or placeholder text) rather than copy."
+}
+
+WARNING_MESSAGES = {
+    "not_text": "Your text contains a lot of numbers, symbols or markup, so some scores may be less reliable.",
+    "boilerplate": "Your text contains phrases usually found in page boilerplate (cookie banners, error pages, "
+                   "newsletter boxes). If they are not part of your copy, remove them for a more accurate analysis."
+}
+
+# Most frequent function words, used to guess the language without a model call
+STOPWORDS = {
+    "en": {"the", "and", "of", "to", "is", "in", "that", "it", "for", "you", "with", "your", "are", "this", "on"},
+    "fr": {"le", "la", "les", "et", "des", "est", "une", "pour", "vous", "dans", "que", "qui", "sur", "pas", "du"},
+    "es": {"el", "la", "los", "las", "y", "de", "que", "es", "para", "con", "una", "por", "su", "del", "se"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "mit", "sie", "ein", "eine", "für", "auf", "den", "zu", "ihr"},
+    "it": {"il", "di", "che", "e", "la", "per", "un", "una", "non", "con", "sono", "del", "della", "gli", "le"},
+    "pt": {"o", "a", "os", "as", "de", "que", "e", "para", "com", "uma", "um", "não", "do", "da", "seu"}
+}
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+
+
+# Function to guess the language of a text
+def detect_language(words):
+    """Guess an ISO 639-1 code from stopword counts, or 'und' when unsure"""
+    counts = {language: 0 for language in STOPWORDS}
+    for word in words[:2000]:
+        for language, stopwords in STOPWORDS.items():
+            if word in stopwords:
+                counts[language] += 1
+    language, hits = max(counts.items(), key=lambda item: item[1])
+    if hits < 2 or hits < 0.05 * len(words):
+        return "und"
+    return language
+
+# Function to measure boilerplate in a text
+def boilerplate_share(text, total_words):
+    """Return the share of words in sentences with boilerplate phrases and the distinct phrases found"""
+    phrases = set()
+    words = 0
+    for sentence in _SENTENCE_RE.findall(text):
+        found = {match.group(0).lower() for match in BOILERPLATE_PATTERNS.finditer(sentence)}
+        if found:
+            phrases |= found
+            words += len(_WORD_RE.findall(sentence))
+    return words / max(total_words, 1), phrases
+
+# Function to triage a submission
+def triage(text):
+    """Decide locally whether text is worth a model call.
+
+    Returns a dict with accepted, reason (None when accepted), warnings (reasons to doubt an
+    accepted text, see WARNING_MESSAGES), language, characters, words and estimated_tokens.
+    """
+    text = text or ""
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    visible = [char for char in text if not char.isspace()]
+    result = {
+        "accepted": False,
+        "reason": None,
+        "warnings": [],
+        "language": detect_language(words),
+        "characters": len(text),
+        "words": len(words),
+        # Rough count for the Llama tokenizer, used for logging and rate limits
+        "estimated_tokens": len(text) // 4 + 1
+    }
+
+    letter_ratio = sum(char.isalpha() for char in visible) / len(visible) if visible else 0
+    share, phrases = boilerplate_share(text, len(words))
+    if not visible:
+        result["reason"] = "empty"
+    elif letter_ratio < MIN_LETTER_RATIO:
+        result["reason"] = "not_text"
+    elif len(words) < MIN_WORDS:
+        result["reason"] = "too_short"
+    elif len(words) >= 20 and len(set(words)) / len(words) < MIN_DISTINCT_WORD_RATIO:
+        result["reason"] = "repetitive"
+    elif share >= BOILERPLATE_MIN_SHARE and len(phrases) >= BOILERPLATE_MIN_PHRASES:
+        result["reason"] = "boilerplate"
+    else:
+        result["accepted"] = True
+        if letter_ratio < WARN_LETTER_RATIO:
+            result["warnings"].append("not_text")
+        if phrases:
+            result["warnings"].append("boilerplate")
+
+    inc("copycheck_triage_total", result=result["reason"] or "accepted", language=result["language"])
+    if not result["accepted"]:
+        logging.info(f"Submission rejected by triage: {result['reason']} ({result['words']} words)")
+    elif result["warnings"]:
+        logging.info(f"Submission accepted with warnings: {', '.join(result['warnings'])} ({result['words']} words)")
+    return result
+
+# Function to tell whether an error is worth retrying
+def is_retryable(error):
+    """Retry on rate limits, server errors and connection problems"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class ModelRouter:
+    """Groq client wrapper that falls back along a model chain when a model is rate-limited or failing"""
+
+    def __init__(self, client, fallback_models=DEFAULT_FALLBACK_MODELS):
+        self.client = client
+        self.fallback_models = list(fallback_models)
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, **kwargs):
+        """Create a chat completion with model, or the first fallback model that answers"""
+        chain = [model] + [fallback for fallback in self.fallback_models if fallback != model]
+        for i, candidate in enumerate(chain):
+            try:
+                return self.client.chat.completions.create(model=candidate, **kwargs)
+            except Exception as e:
+                if i == len(chain) - 1 or not is_retryable(e):
+                    raise
+                logging.warning(f"Model {candidate} unavailable ({str(e)}), falling back to {chain[i + 1]}")
+                inc("copycheck_retries_total", stage="model_fallback")
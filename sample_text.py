@@ -0,0 +1,10 @@
+# Sample marketing copy used by the benchmarks and tests
+SAMPLE_TEXT = """
+    Welcome to our revolutionary product that will transform your life!
+    
+    Our cutting-edge solution addresses all your needs with state-of-the-art technology.
+    Don't miss out on this amazing opportunity to enhance your daily routine.
+    
+    Act now and receive an exclusive bonus package worth $500!
+    Contact us today to learn more about how we can help you achieve your goals.
+    """
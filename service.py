@@ -0,0 +1,173 @@
+# Headless scoring service. Run N worker processes behind a load balancer, for example:
+#     uvicorn service:app --host 0.0.0.0 --port 8000 --workers 4
+# Each worker shares one Groq client, connection pool and analysis cache across its requests.
+import asyncio
+import json
+import logging
+
+from batch import DEFAULT_CONCURRENCY, run_batch
+from engine import EngineError, get_analysis_cache, get_groq_client, score_text
+from metrics import CONTENT_TYPE, REGISTRY, inc
+
+# Request bodies larger than this are rejected
+MAX_BODY_BYTES = 2 * 1024 * 1024
+MAX_BATCH_ITEMS = 500
+# Single analyses running at once in this worker
+MAX_CONCURRENT_ANALYSES = 8
+# Single analyses waiting for a slot; beyond this requests are answered 503 with a Retry-After
+MAX_QUEUED_ANALYSES = 32
+RETRY_AFTER_SECONDS = 10
+
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+_queued_analyses = 0
+
+
+class HTTPError(Exception):
+    """Error returned to the client with an HTTP status"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+# Function to read a JSON request body
+async def read_json(receive):
+    """Read the request body and decode it as a JSON object"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return data
+
+# Function to send a JSON response
+async def send_json(send, status, data, headers=()):
+    """Send a complete JSON response"""
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+# Function to check the input fields of a request
+def check_input_types(data, prefix=""):
+    """Raise a 400 error when the text or url of data is given but is not a string"""
+    for field in ("text", "url"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            raise HTTPError(400, f"{prefix}{field} must be a string")
+
+# Function to handle POST /analyze
+async def handle_analyze(receive, send):
+    """Score one text or URL"""
+    data = await read_json(receive)
+    check_input_types(data)
+    if not data.get("text") and not data.get("url"):
+        raise HTTPError(400, "Provide a text or url")
+    # Under a burst, clients are told when to come back rather than left waiting until they time out
+    global _queued_analyses
+    if _analysis_slots.locked() and _queued_analyses >= MAX_QUEUED_ANALYSES:
+        inc("copycheck_admission_total", result="rejected")
+        raise HTTPError(503, "Too many analyses in progress", retry_after=RETRY_AFTER_SECONDS)
+    _queued_analyses += 1
+    try:
+        await _analysis_slots.acquire()
+    finally:
+        _queued_analyses -= 1
+    try:
+        result = await asyncio.to_thread(score_text, data.get("text"), data.get("url"),
+                                         bool(data.get("allow_degraded")))
+    except EngineError as e:
+        raise HTTPError(422, str(e))
+    except Exception as e:
+        logging.error(f"Analysis failed: {str(e)}")
+        raise HTTPError(502, "Analysis failed")
+    finally:
+        _analysis_slots.release()
+    await send_json(send, 200, result)
+
+# Function to handle POST /analyze/batch
+async def handle_batch(receive, send):
+    """Score many texts or URLs and stream one JSON line per item as it finishes"""
+    data = await read_json(receive)
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPError(400, "Provide a non-empty items list")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPError(413, f"At most {MAX_BATCH_ITEMS} items per batch")
+    items = [item for item in items if isinstance(item, dict)]
+    for index, item in enumerate(items, start=1):
+        check_input_types(item, f"Item {index}: ")
+    items = [{"id": str(item.get("id") or index), "text": item.get("text"), "url": item.get("url")}
+             for index, item in enumerate(items, start=1)]
+    try:
+        concurrency = int(data.get("concurrency") or DEFAULT_CONCURRENCY)
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, "concurrency must be an integer")
+    concurrency = max(1, min(concurrency, MAX_CONCURRENT_ANALYSES))
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    async for result in run_batch(items, get_groq_client(), cache=get_analysis_cache(), concurrency=concurrency):
+        await send({"type": "http.response.body", "body": (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"),
+                    "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+# Function to handle GET /metrics
+async def handle_metrics(receive, send):
+    """Expose this worker's metrics in the Prometheus text format"""
+    body = REGISTRY.render().encode("utf-8")
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", CONTENT_TYPE.encode()), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+# Function to handle GET /health
+async def handle_health(receive, send):
+    """Report liveness and cache counters"""
+    await send_json(send, 200, {"status": "ok", "cache": get_analysis_cache().stats()})
+
+
+ROUTES = {
+    ("POST", "/analyze"): handle_analyze,
+    ("POST", "/analyze/batch"): handle_batch,
+    ("GET", "/health"): handle_health,
+    ("GET", "/metrics"): handle_metrics
+}
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    # Build the shared client up front so the first request does not pay for it
+                    get_groq_client()
+                    await send({"type": "lifespan.startup.complete"})
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+    try:
+        if handler is None:
+            raise HTTPError(404, "Not found")
+        await handler(receive, send)
+    except HTTPError as e:
+        headers = [(b"retry-after", str(e.retry_after).encode())] if e.retry_after else []
+        await send_json(send, e.status, {"error": e.message}, headers)
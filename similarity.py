@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from analysis_cache import normalize_text
+from metrics import inc
+
+# Texts whose estimated Jaccard similarity reaches this share reuse the earlier scores
+DEFAULT_SIMILARITY_THRESHOLD = float(os.environ.get("COPYCHECK_NEAR_DUPLICATE_THRESHOLD", 0.85))
+# Scored texts remembered; the least recently used are forgotten first
+DEFAULT_MAX_ENTRIES = int(os.environ.get("COPYCHECK_NEAR_DUPLICATE_ENTRIES", 5000))
+# Words per shingle: one swapped sentence changes about (sentence words + SHINGLE_WORDS) shingles
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# 32 bands of 4 rows: texts with a Jaccard similarity of 0.6 or more share a band with probability > 0.98
+LSH_BANDS = 32
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+# Function to split a text into shingles
+def shingles(text):
+    """Set of lowercase word n-grams of text, with digits folded so changed dates and prices still match"""
+    words = re.sub(r'\d+', '0', normalize_text(text).lower())
+    words = _WORD_RE.findall(words)
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class NearDuplicateIndex:
+    """Bounded in-memory MinHash/LSH index of scored texts, used to reuse the scores of near-duplicates"""
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, max_entries=DEFAULT_MAX_ENTRIES,
+                 num_permutations=NUM_PERMUTATIONS, bands=LSH_BANDS, seed=1):
+        if num_permutations % bands:
+            raise ValueError("num_permutations must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_permutations // bands
+        # Hash functions (a * x + b) mod p; a and b span the whole prime field (products wrap modulo 2**64),
+        # otherwise a * x would hardly wrap and every permutation would order the shingles alike
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self._b = generator.randint(0, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def signature(self, text):
+        """MinHash signature of text, or None when it has no words"""
+        pieces = shingles(text)
+        if not pieces:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(piece.encode('utf-8'), digest_size=4).digest(), 'little')
+             for piece in pieces),
+            dtype=np.uint64, count=len(pieces)
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % np.uint64(_MERSENNE_PRIME)
+        return (permuted.min(axis=0) & np.uint64(_MAX_HASH)).astype(np.uint32)
+
+    def lookup(self, text):
+        """Return (value, similarity) of the most similar indexed text above the threshold, or None"""
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                # The share of equal MinHash values estimates the Jaccard similarity of the shingle sets
+                similarity = float(np.mean(self._entries[candidate][0] == signature))
+                if similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is None or best_similarity < self.threshold:
+                self._stats["misses"] += 1
+                inc("copycheck_near_duplicate_requests_total", result="miss")
+                return None
+            self._entries.move_to_end(best)
+            self._stats["hits"] += 1
+            value = self._entries[best][1]
+        inc("copycheck_near_duplicate_requests_total", result="hit")
+        logging.info(f"Near-duplicate of an earlier text found ({best_similarity:.0%} similar)")
+        return value, round(best_similarity, 3)
+
+    def add(self, text, value):
+        """Index text with the value to return for its near-duplicates"""
+        signature = self.signature(text)
+        if signature is None or not value:
+            return
+        key = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+            self._entries[key] = (signature, value)
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(band_key, set()).add(key)
+            self._stats["writes"] += 1
+            while len(self._entries) > self.max_entries:
+                self._forget(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        """Return hit/miss counters and the number of indexed texts"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Forget every indexed text"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _forget(self, key):
+        signature, _ = self._entries.pop(key)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
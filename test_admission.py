@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionError, SingleFlight
+from metrics import REGISTRY
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow_call))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1] and results == ["result"] * 5
+    assert flight.do("key", lambda: "next") == "next"
+
+
+def test_single_flight_follower_retries_when_leader_stops():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def interrupted_call():
+        started.set()
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    def leader():
+        with pytest.raises(KeyboardInterrupt):
+            flight.do("key", interrupted_call)
+
+    results = []
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("key", lambda: "own result")))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in (leader_thread, follower):
+        thread.join()
+    assert results == ["own result"]
+
+
+def test_fair_queue_serves_users_round_robin():
+    controller = AdmissionController(max_active=1, max_active_per_user=1, max_queued=10, max_wait=5)
+    started = []
+    positions = {}
+    gate = threading.Event()
+
+    def submit(user, name):
+        def record(position):
+            positions.setdefault(name, position)
+        with controller.admit(user, on_wait=record):
+            started.append(name)
+            gate.wait(5)
+
+    first = threading.Thread(target=submit, args=("busy@example.com", "busy-1"))
+    first.start()
+    time.sleep(0.05)
+    threads = []
+    for user, name in (("busy@example.com", "busy-2"), ("busy@example.com", "busy-3"), ("busy@example.com", "busy-4"),
+                       ("other@example.com", "other")):
+        threads.append(threading.Thread(target=submit, args=(user, name)))
+        threads[-1].start()
+        time.sleep(0.05)
+    gate.set()
+    for thread in [first] + threads:
+        thread.join()
+    # The other user's submission goes ahead of the busy user's backlog, right after the next one
+    assert started == ["busy-1", "busy-2", "other", "busy-3", "busy-4"]
+    assert positions["other"] == 2 and positions["busy-4"] == 3
+
+
+def test_full_queue_is_turned_away():
+    controller = AdmissionController(max_active=1, max_queued=0, max_wait=5)
+    rejected = REGISTRY.value("copycheck_admission_total", result="rejected")
+    with controller.admit("a@example.com"):
+        with pytest.raises(AdmissionError):
+            with controller.admit("b@example.com"):
+                pass
+    assert REGISTRY.value("copycheck_admission_total", result="rejected") == rejected + 1
+    with controller.admit("b@example.com"):
+        assert controller.stats() == {"active": 1, "queued": 0}
@@ -0,0 +1,29 @@
+import time
+from analysis_cache import AnalysisCache, make_cache_key
+
+def test_key_ignores_whitespace_but_not_settings():
+    params = {"temperature": 0.1, "seed": 42}
+    key = make_cache_key("Buy  now!\n", "model-a", "prompt", params)
+    assert key == make_cache_key("Buy now!", "model-a", "prompt", params)
+    assert key != make_cache_key("Buy now!", "model-b", "prompt", params)
+    assert key != make_cache_key("Buy now!", "model-a", "prompt", {"temperature": 0.2, "seed": 42})
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = AnalysisCache(path=path)
+    assert cache.get("k") is None
+    cache.set("k", "Score: 8/10")
+    assert cache.get("k") == "Score: 8/10"
+
+    reopened = AnalysisCache(path=path)
+    assert reopened.get("k") == "Score: 8/10"
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 0
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = AnalysisCache(path=str(tmp_path / "cache.sqlite3"), memory_size=1, ttl=0.05, max_disk_bytes=10)
+    cache.set("a", "12345678")
+    cache.set("b", "12345678")
+    assert cache.stats()["disk_entries"] == 1
+    time.sleep(0.1)
+    assert cache.get("b") is None
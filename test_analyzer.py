@@ -0,0 +1,64 @@
+import json
+from analyzer import CRITERIA, iter_parsed_criteria, parse_analysis, parse_analysis_result, request_analysis
+
+RESPONSE = """1. Empathy (audience understanding)
+Score: 7/10
+Reasoning: Clarity of the audience is good
+Improvement: Speak to one reader
+
+2. Clarity (clear message)
+Score: 8/10
+
+3. Attention (headlines/hooks)
+Score: 5/10
+Improvement: Open with a stronger hook"""
+
+
+def test_incremental_parser_matches_full_parse():
+    chunks = [RESPONSE[i:i + 7] for i in range(0, len(RESPONSE), 7)]
+    criteria = list(iter_parsed_criteria(chunks))
+    assert criteria == [
+        ("Empathy", 7, "Speak to one reader"),
+        ("Clarity", 8, ""),
+        ("Attention", 5, "Open with a stronger hook"),
+    ]
+    scores, _ = parse_analysis_result(RESPONSE)
+    assert scores == {criterion: score for criterion, score, _ in criteria}
+
+
+def test_incremental_parser_emits_before_stream_ends():
+    def chunks():
+        yield RESPONSE.split("\n\n2.")[0] + "\n"
+        raise AssertionError("parser read past the first criterion")
+
+    assert next(iter_parsed_criteria(chunks())) == ("Empathy", 7, "Speak to one reader")
+
+
+def test_structured_result_reports_missing_criteria():
+    response = json.dumps({"criteria": [
+        {"name": "empathy", "score": "8/10", "improvement": "Name the reader"},
+        {"name": "Clarity", "score": 12},
+        {"name": "Unknown", "score": 5},
+    ]})
+    scores, suggestions, missing = parse_analysis(response)
+    assert scores == {"Empathy": 8, "Clarity": 10}
+    assert suggestions["Empathy"] == "Name the reader"
+    assert missing == CRITERIA[2:]
+
+
+def test_text_fallback_ignores_names_inside_reasoning():
+    scores, suggestions, _ = parse_analysis(RESPONSE)
+    assert scores == {"Empathy": 7, "Clarity": 8, "Attention": 5}
+    assert suggestions["Empathy"] == "Speak to one reader"
+
+
+def test_request_analysis_requeries_only_missing_criteria(fake_client):
+    responses = [json.dumps({"criteria": [{"name": name, "score": 6} for name in CRITERIA[:8]]}),
+                 json.dumps({"criteria": [{"name": name, "score": 4} for name in CRITERIA[8:]]})]
+    client = fake_client(respond=lambda **kwargs: responses.pop(0))
+
+    scores, _, missing = parse_analysis(request_analysis(client, "Buy now"))
+    assert missing == [] and scores["Influence"] == 4 and scores["Empathy"] == 6
+    followup = client.requests[1]["messages"][0]["content"]
+    assert "Adaptation" in followup and "Empathy" not in followup
+    assert client.requests[1]["max_tokens"] < client.requests[0]["max_tokens"]
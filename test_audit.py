@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import audit
+import compaction
+from audit import AuditStore, HostLimiter, build_report, format_report, run_audit
+
+PAGES = {
+    "/pricing": "Plans start at ten dollars a month and every plan includes unlimited projects for your team.",
+    "/about": "We started this company to help small teams ship marketing pages faster and with more confidence.",
+    "/private/draft": "This page is blocked by robots.txt and must never be fetched by the audit crawler at all."
+}
+
+
+def serve_site(fetched):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            fetched.append(self.path)
+            host = f"http://{self.headers['Host']}"
+            if self.path == "/robots.txt":
+                body = f"User-agent: *\nDisallow: /private/\nSitemap: {host}/sitemap_index.xml\n"
+            elif self.path == "/sitemap_index.xml":
+                body = f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><sitemap><loc>{host}/pages.xml</loc></sitemap></sitemapindex>'
+            elif self.path == "/pages.xml":
+                body = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + "".join(
+                    f"<url><loc>{host}{path}</loc></url>" for path in PAGES) + "</urlset>"
+            elif self.path in PAGES:
+                etag = f'"{self.path}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(f"<article><p>{PAGES[self.path]}</p></article>".encode())
+                return
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_audit_scores_changed_pages_only(monkeypatch, fake_client, analysis_response):
+    monkeypatch.setattr(compaction, "_boilerplate_index", compaction.BoilerplateIndex(path=":memory:"))
+    fetched = []
+    server = serve_site(fetched)
+    site = f"127.0.0.1:{server.server_port}"
+    store = AuditStore(path=":memory:")
+
+    def respond(messages, **kwargs):
+        # Pages about pricing score low on Trust, the others on Action
+        weak = "Trust" if "dollars" in messages[-1]["content"] else "Action"
+        return analysis_response(score=8, scores={weak: 3})
+    client = fake_client(respond=respond)
+
+    def audit():
+        return asyncio.run(run_audit(f"http://{site}/", client, store=store, session=requests.Session(),
+                                     delay=0, rpm=6000, tpm=10 ** 7))
+    try:
+        first = audit()
+        second = audit()
+    finally:
+        server.shutdown()
+
+    assert (first["analyzed"], first["unchanged"], client.calls) == (2, 0, 2)
+    # The second audit only revalidates the pages with their ETags
+    assert (second["analyzed"], second["unchanged"], client.calls) == (0, 2, 2)
+    assert "/private/draft" not in fetched
+
+    report = build_report(store, second)
+    assert set(list(report["criteria"])[:2]) == {"Action", "Trust"} and report["criteria"]["Trust"] == 5.5
+    assert report["weakest_pages"]["Trust"][0]["url"].endswith("/pricing")
+    assert [page["weakest"] for page in report["ranked"]] == ["Action", "Trust"]
+    assert "## Pages ranked by weakest criterion" in format_report(report)
+
+
+def test_audit_reports_a_page_whose_check_raises(monkeypatch, fake_client, analysis_response):
+    monkeypatch.setattr(compaction, "_boilerplate_index", compaction.BoilerplateIndex(path=":memory:"))
+    server = serve_site([])
+    site = f"127.0.0.1:{server.server_port}"
+    store = AuditStore(path=":memory:")
+    check_page = audit.check_page
+
+    def flaky_check_page(url, *args):
+        if url.endswith("/about"):
+            raise RuntimeError("database is locked")
+        return check_page(url, *args)
+    monkeypatch.setattr(audit, "check_page", flaky_check_page)
+    client = fake_client(respond=lambda **kwargs: analysis_response(score=7))
+
+    try:
+        summary = asyncio.run(asyncio.wait_for(
+            run_audit(f"http://{site}/", client, store=store, session=requests.Session(), delay=0,
+                      rpm=6000, tpm=10 ** 7), timeout=30))
+    finally:
+        server.shutdown()
+
+    assert (summary["analyzed"], summary["failed"]) == (1, 1)
+    report = build_report(store, summary)
+    assert [page["url"] for page in report["ranked"]] == [f"http://{site}/pricing"]
+    assert report["failed"] == [{"url": f"http://{site}/about", "error": "database is locked"}]
+
+
+def test_host_limiter_spaces_requests_per_host():
+    limiter = HostLimiter(delay=0.05)
+    started = time.monotonic()
+    for host in ("a.example", "a.example", "b.example", "a.example"):
+        limiter.wait(host)
+    assert 0.1 <= time.monotonic() - started < 0.2
+
+    # A Crawl-delay set for the site applies whatever the case of the host in a URL
+    limiter.set_delay("c.example", 0.2)
+    for host in ("c.example", "C.Example"):
+        limiter.wait(host)
+    assert time.monotonic() - started >= 0.3
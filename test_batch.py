@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from analyzer import CRITERIA
+from batch import read_batch_input, run_batch
+
+SCORES = {name: 7 for name in CRITERIA}
+
+
+class RateLimitError(Exception):
+    status_code = 429
+    response = None
+
+
+def test_read_batch_input_detects_urls(tmp_path):
+    path = tmp_path / "items.csv"
+    path.write_text("id,input\na,https://example.com/page\nb,Buy our product today\n")
+    items = list(read_batch_input(str(path)))
+    assert items == [{"id": "a", "url": "https://example.com/page"}, {"id": "b", "text": "Buy our product today"}]
+
+
+def test_run_batch_retries_rate_limits(monkeypatch, fake_client, analysis_response):
+    monkeypatch.setattr("batch.retry_delay", lambda error, attempt: 0)
+
+    def respond(**kwargs):
+        if client.calls == 1:
+            raise RateLimitError("rate limited")
+        return analysis_response(improvement="Tighten it")
+    client = fake_client(respond=respond)
+    items = [{"id": str(i), "text": f"Copy number {i}: save two hours a week with our scheduling tool"} for i in range(3)]
+
+    async def collect():
+        return [result async for result in run_batch(items, client, concurrency=2, rpm=600, tpm=10 ** 6)]
+
+    results = asyncio.run(collect())
+    assert sorted(r["id"] for r in results) == ["0", "1", "2"]
+    assert all(r["status"] == "ok" and r["scores"] == SCORES for r in results)
+    assert client.calls == 4
+
+
+def test_run_batch_raises_input_errors_after_finishing(fake_client, analysis_response):
+    client = fake_client(respond=lambda **kwargs: analysis_response())
+
+    def items():
+        yield {"id": "1", "text": "Copy number 1: save two hours a week with our scheduling tool"}
+        raise ValueError("bad input line")
+
+    results = []
+
+    async def collect():
+        async for result in run_batch(items(), client, concurrency=2, rpm=600, tpm=10 ** 6):
+            results.append(result)
+
+    with pytest.raises(ValueError, match="bad input line"):
+        asyncio.run(asyncio.wait_for(collect(), timeout=10))
+    assert [r["id"] for r in results] == ["1"]
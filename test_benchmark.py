@@ -0,0 +1,20 @@
+from benchmark import STAGES, find_regressions, profile_import, run_benchmark
+
+
+def test_benchmark_reports_every_stage():
+    results = run_benchmark(iterations=3, sessions=2)
+    assert set(results["stages"]) == set(STAGES)
+    assert all(summary["count"] == 3 for summary in results["stages"].values())
+    assert results["throughput_per_s"] > 0 and results["peak_rss_mb"] > 0
+
+
+def test_find_regressions():
+    baseline = {"stages": {"pdf": {"p95_ms": 10.0}, "llm": {"p95_ms": 100.0}}}
+    results = {"stages": {"pdf": {"p95_ms": 15.0}, "llm": {"p95_ms": 105.0}}}
+    assert find_regressions(results, baseline) == ["pdf: p95 10.00ms -> 15.00ms"]
+
+
+def test_entry_points_defer_heavy_packages():
+    for module in ("engine", "report"):
+        profile = profile_import(module)
+        assert profile["deferred_loaded"] == [] and profile["import_ms"] > 0
@@ -0,0 +1,17 @@
+from charts import gauge_svg, overall_gauge_svg, score_gauge_svg
+
+
+def test_criterion_gauges_are_memoized():
+    gauge_svg.cache_clear()
+    for _ in range(3):
+        for score in range(11):
+            score_gauge_svg(score)
+    info = gauge_svg.cache_info()
+    assert info.misses == 11 and info.hits == 22
+
+
+def test_gauge_content():
+    svg = score_gauge_svg(7)
+    assert '>7.0</text>' in svg and '#ffc107' in svg
+    assert 'stroke-dasharray="0.00' in score_gauge_svg(0)
+    assert '>85%</text>' in overall_gauge_svg(8.5)
@@ -0,0 +1,49 @@
+from analysis_cache import AnalysisCache
+from analyzer import MAX_INPUT_TOKENS, parse_analysis
+from chunking import CHUNK_MAX_LENGTH, aggregate_chunk_results, analyze_document, split_into_chunks
+from compaction import count_tokens
+
+PARAGRAPHS = [f"Section {i}. " + " ".join(f"Our product saves you {j} minutes on step {i} every single day." for j in range(20 + i % 7))
+              for i in range(60)]
+DOCUMENT = "\n\n".join(PARAGRAPHS)
+
+
+def test_chunks_respect_limits_and_keep_all_paragraphs():
+    chunks = split_into_chunks(DOCUMENT)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= CHUNK_MAX_LENGTH for chunk in chunks)
+    assert "\n\n".join(chunks) == DOCUMENT
+
+
+def test_non_latin_chunks_fit_the_token_budget(fake_client):
+    # Cyrillic takes more tokens per character: 12,000 characters of this are about 4,300 tokens
+    document = "\n\n".join(f"Раздел {i}, преимущества нашего решения: автоматизированная отчётность, круглосуточная "
+                           f"поддержка, интеграция с бухгалтерией." for i in range(250))
+    client = fake_client()
+    analyze_document(client, document, max_workers=1)
+    sent = [request["messages"][1]["content"] for request in client.requests]
+    assert len(sent) > 1 and all(count_tokens(text) <= MAX_INPUT_TOKENS for text in sent)
+    # Nothing is cut off by prepare_text: every section reaches the model, without a trailing "..."
+    assert "\n\n".join(sent) == document
+
+
+def test_editing_one_section_rescores_only_its_chunk(tmp_path, fake_client, analysis_response):
+    cache = AnalysisCache(path=str(tmp_path / "cache.sqlite3"))
+    client = fake_client(analysis_response(score=6, improvement="Be specific"))
+    scores, _, missing = parse_analysis(analyze_document(client, DOCUMENT, cache=cache))
+    assert missing == [] and scores["Empathy"] == 6
+    first_run = client.calls
+    assert first_run == len(split_into_chunks(DOCUMENT))
+
+    edited = DOCUMENT.replace("Section 30.", "Section thirty, rewritten.")
+    analyze_document(client, edited, cache=cache)
+    assert client.calls == first_run + 1
+
+
+def test_aggregate_weights_by_length():
+    scores, suggestions = aggregate_chunk_results([
+        (3000, {"Clarity": 8}, {"Clarity": "Fine"}),
+        (1000, {"Clarity": 4}, {"Clarity": "Cut jargon"}),
+    ])
+    assert scores == {"Clarity": 7.0}
+    assert suggestions == {"Clarity": "Cut jargon"}
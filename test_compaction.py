@@ -0,0 +1,48 @@
+from chunking import split_paragraphs
+from compaction import BoilerplateIndex, compact_text, count_tokens, fit_to_budget
+
+COPY = """Save 3.5 hours   a week on reporting.  Our dashboard builds your reports for you.
+
+We use cookies to improve your experience. Accept all cookies.
+
+Save 3.5 hours a week on reporting. Our dashboard builds your reports for you.
+
+Your clients get their numbers on Monday morning. Our dashboard builds your reports for you."""
+
+
+def test_compact_text_drops_banners_and_repeats():
+    compacted = compact_text(COPY)
+    assert compacted == ("Save 3.5 hours a week on reporting. Our dashboard builds your reports for you.\n\n"
+                         "Your clients get their numbers on Monday morning.")
+    assert compact_text(compacted) == compacted
+
+
+def test_compact_text_keeps_line_breaks():
+    text = "HEADLINE:   Ship pages faster\nOur tool  writes the first draft.\n- Feature one\n\n- Feature two  "
+    assert compact_text(text) == "HEADLINE: Ship pages faster\nOur tool writes the first draft.\n- Feature one\n\n- Feature two"
+    lines = "\n".join(f"Line {i} of a long list of features that keeps going." for i in range(200))
+    assert len(split_paragraphs(compact_text(lines))) == 200
+
+
+def test_token_count_and_budget():
+    assert count_tokens("Start your free trial today.") == 6
+    assert count_tokens("Купите сейчас") > count_tokens("Buy now")
+    cut = fit_to_budget(compact_text(COPY), 25)
+    assert cut == "Save 3.5 hours a week on reporting. Our dashboard builds your reports for you...."
+    assert fit_to_budget("Short text.", 20) == "Short text."
+
+
+def test_boilerplate_learned_per_domain():
+    index = BoilerplateIndex(path=":memory:", min_pages=3)
+    nav = "Home. Pricing. Sign in to your account."
+
+    topics = ["planning", "hiring", "pricing", "support", "onboarding"]
+
+    def page(i):
+        return f"{nav}\n\nThis article explains {topics[i]} for small teams."
+    assert index.clean("https://blog.example.com/1", page(1)) == page(1)
+    assert index.clean("https://blog.example.com/2", page(2)) == page(2)
+    # Fetching the same page again does not count as another page
+    assert index.clean("https://blog.example.com/2", page(2)) == page(2)
+    assert index.clean("https://blog.example.com/3", page(3)) == "This article explains support for small teams."
+    assert index.clean("https://other.example.org/1", page(4)) == page(4)
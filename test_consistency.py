@@ -1,34 +1,45 @@
-import streamlit as st
-from app import analyze_text
+import os
 import time
 
+import pytest
+
+from analyzer import CRITERIA, parse_analysis
+from engine import analyze_text
+from sample_text import SAMPLE_TEXT
+
+# Scores of repeated analyses of the same text may differ by at most this much per criterion
+MAX_SCORE_SPREAD = 1
+
+
+# Calls the live Groq API, so it only runs when asked for
+@pytest.mark.skipif(not os.environ.get("COPYCHECK_LIVE_TESTS"), reason="set COPYCHECK_LIVE_TESTS=1 to call the live API")
 def test_consistency():
-    # Test text
-    test_text = """
-    Welcome to our revolutionary product that will transform your life!
-    
-    Our cutting-edge solution addresses all your needs with state-of-the-art technology.
-    Don't miss out on this amazing opportunity to enhance your daily routine.
-    
-    Act now and receive an exclusive bonus package worth $500!
-    Contact us today to learn more about how we can help you achieve your goals.
-    """
-    
     print("Running consistency test with the same text 3 times...")
-    print("\nTest text:", test_text)
+    print("\nTest text:", SAMPLE_TEXT)
     
     # Run analysis 3 times
+    runs = []
     for i in range(3):
         print(f"\nTest #{i+1}")
         print("-" * 50)
         start_time = time.time()
-        result = analyze_text(test_text)
+        # The cache is bypassed so every run is a real model call
+        result = analyze_text(SAMPLE_TEXT, use_cache=False)
         end_time = time.time()
         print(f"Analysis completed in {end_time - start_time:.2f} seconds")
         print("\nResults:")
         print(result)
         print("-" * 50)
+        assert result is not None, "The analysis failed"
+        scores, _, missing = parse_analysis(result)
+        assert missing == []
+        runs.append(scores)
         time.sleep(2)  # Wait a bit between tests
+    
+    for criterion in CRITERIA:
+        values = [scores[criterion] for scores in runs]
+        assert max(values) - min(values) <= MAX_SCORE_SPREAD, f"{criterion} scores vary: {values}"
 
 if __name__ == "__main__":
+    os.environ["COPYCHECK_LIVE_TESTS"] = "1"
     test_consistency()
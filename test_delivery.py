@@ -0,0 +1,118 @@
+import base64
+import io
+import json
+from types import SimpleNamespace
+from delivery import DeliveryQueue, EmailBody
+
+SCORES = {"Empathy": 7, "Clarity": 4}
+SUGGESTIONS = {"Empathy": "Speak to one reader", "Clarity": "Shorter sentences"}
+
+
+class FakeSession:
+    def __init__(self, email_failures=0):
+        self.email_failures = email_failures
+        self.posts = []
+        self.bodies = []
+
+    def post(self, url, json=None, data=None, timeout=None):
+        self.posts.append(url)
+        if data is not None:
+            self.bodies.append(b"".join(data))
+        if url.endswith("/emails") and self.email_failures:
+            self.email_failures -= 1
+            return SimpleNamespace(status_code=500, text="server error")
+        return SimpleNamespace(status_code=200, text="{}")
+
+
+def make_queue(session):
+    queue = DeliveryQueue("re_key", "team@example.com", "aud", path=":memory:", base_delay=0)
+    queue.session = session
+    return queue
+
+
+def test_delivery_retries_then_sends():
+    session = FakeSession(email_failures=1)
+    queue = make_queue(session)
+    job_id = queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS)
+
+    assert queue.process_next()
+    assert queue.status(job_id)["status"] == "queued" and queue.status(job_id)["attempts"] == 1
+    assert queue.process_next()
+    assert queue.status(job_id)["status"] == "sent"
+    assert not queue.process_next()
+
+
+def test_audience_add_is_deduplicated():
+    session = FakeSession()
+    queue = make_queue(session)
+    for _ in range(2):
+        queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS)
+        queue.process_next()
+    assert sum(url.endswith("/contacts") for url in session.posts) == 1
+    assert queue.counts() == {"sent": 2}
+
+
+def test_job_fails_after_max_attempts():
+    queue = make_queue(FakeSession(email_failures=10))
+    queue.max_attempts = 2
+    job_id = queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS)
+    queue.process_next()
+    queue.process_next()
+    assert queue.status(job_id)["status"] == "failed"
+
+
+def test_email_body_streams_base64_attachment():
+    session = FakeSession()
+    queue = make_queue(session)
+    queue.enqueue("me@example.com", "Achetez maintenant — Купите сейчас", SCORES, SUGGESTIONS)
+    queue.process_next()
+    body = json.loads(session.bodies[0])
+    pdf = base64.b64decode(body["attachments"][0]["content"])
+    assert pdf.startswith(b"%PDF") and body["to"] == ["me@example.com"]
+
+
+def test_email_body_length_matches_content():
+    params = {"attachments": [{"content": "@@attachment@@"}]}
+    for pdf in (b"", b"%PDF-1", bytes(range(256)) * 3000):
+        body = EmailBody(params, io.BytesIO(pdf))
+        assert len(body) == len(b"".join(body)) == len(b"".join(EmailBody(params, pdf)))
+
+
+def test_prerendered_report_is_sent_as_is_and_dropped_after_delivery():
+    session = FakeSession()
+    queue = make_queue(session)
+    job_id = queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS, pdf=b"%PDF-prerendered")
+    queue.process_next()
+    body = json.loads(session.bodies[0])
+    assert base64.b64decode(body["attachments"][0]["content"]) == b"%PDF-prerendered"
+    assert queue.status(job_id)["status"] == "sent"
+    assert queue._db.execute("SELECT pdf FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] is None
+
+
+def test_job_is_claimed_by_one_queue_only(tmp_path):
+    path = str(tmp_path / "delivery.sqlite3")
+    first = DeliveryQueue("re_key", "team@example.com", "aud", path=path, base_delay=0)
+    job_id = first.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS)
+    assert first._claim()["id"] == job_id
+
+    # A second process sharing the file neither claims nor re-queues the job while its lease runs
+    second = DeliveryQueue("re_key", "team@example.com", "aud", path=path, base_delay=0)
+    assert second._claim() is None
+    assert second.status(job_id)["status"] == "running"
+
+    second.lease_timeout = -1
+    assert second._claim()["id"] == job_id
+
+
+def test_report_is_queued_once_per_key():
+    queue = make_queue(FakeSession(email_failures=10))
+    queue.max_attempts = 1
+    job_id = queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS, report_key="results-1")
+    assert queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS, report_key="results-1") == job_id
+    assert queue.enqueue("you@example.com", "Buy now", SCORES, SUGGESTIONS, report_key="results-1") != job_id
+    assert queue.counts() == {"queued": 2}
+
+    # A report whose delivery failed can be queued again
+    queue.process_next()
+    assert queue.status(job_id)["status"] == "failed"
+    assert queue.enqueue("me@example.com", "Buy now", SCORES, SUGGESTIONS, report_key="results-1") != job_id
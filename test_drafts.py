@@ -0,0 +1,33 @@
+from analyzer import parse_analysis
+from drafts import DraftStore, analyze_draft
+
+DRAFT = "\n\n".join(f"Paragraph {i}: our tool saves your team hours every week." for i in range(6))
+
+
+def test_only_edited_paragraphs_are_resent(fake_client, analysis_response):
+    store = DraftStore(path=":memory:")
+    client = fake_client(analysis_response(score=8, improvement="New hook"))
+    _, version = analyze_draft(client, store, "me@example.com", "landing", DRAFT)
+    assert version == {"version": 1, "mode": "full", "changed_ratio": 1.0, "paragraphs": 6}
+
+    client.response = analysis_response(score=2, improvement="New hook")
+    edited = DRAFT.replace("Paragraph 3: our tool", "Paragraph 3: this brand new tool")
+    response, version = analyze_draft(client, store, "me@example.com", "landing", edited)
+    assert version["mode"] == "incremental" and version["version"] == 2
+    excerpt = client.requests[-1]["messages"][1]["content"]
+    assert excerpt.count("[EDITED]") == 1 and excerpt.count("[CONTEXT]") == 2
+    assert "Paragraph 0" not in excerpt
+
+    scores, suggestions, _ = parse_analysis(response)
+    assert 2 < scores["Empathy"] < 8
+    assert suggestions["Empathy"] == "New hook"
+
+
+def test_unchanged_draft_does_not_call_the_model(fake_client):
+    store = DraftStore(path=":memory:")
+    client = fake_client()
+    analyze_draft(client, store, "me@example.com", "landing", DRAFT)
+    calls = len(client.requests)
+    _, version = analyze_draft(client, store, "me@example.com", "landing", DRAFT.replace("\n\n", "\n\n  "))
+    assert version["mode"] == "unchanged" and len(client.requests) == calls
+    assert len(store.history("me@example.com", "landing")) == 1
@@ -0,0 +1,43 @@
+import time
+
+from analyzer import CRITERIA, parse_analysis_result
+from heuristics import heuristic_analysis, heuristic_scores
+from sample_text import SAMPLE_TEXT
+
+STRONG_COPY = """How to save 5 hours a week on client reporting
+
+You know the feeling: it's Friday, and you're still copying numbers into slides. Imagine finishing at noon instead.
+
+Our dashboard builds your reports automatically, so you can spend that time with clients. Trusted by 2,000+ agencies, rated 4.9 in 300 reviews.
+
+"We cut reporting from a day to twenty minutes," says Dana, head of accounts.
+
+- Free 14-day trial, no credit card
+- Setup in 5 minutes
+
+Places are limited this month. Start your free trial today."""
+FLAT_COPY = ("The company was founded a number of years ago and has developed a considerable range of "
+             "organizational capabilities in the domain of enterprise-level information management "
+             "infrastructure, which it continues to maintain according to established internal procedures.")
+
+
+def test_scores_every_criterion_deterministically():
+    scores, suggestions = heuristic_scores(SAMPLE_TEXT)
+    assert list(scores) == CRITERIA and list(suggestions) == CRITERIA
+    assert all(1 <= score <= 10 for score in scores.values())
+    assert heuristic_scores(SAMPLE_TEXT) == (scores, suggestions)
+
+
+def test_strong_copy_scores_higher():
+    strong, _ = heuristic_scores(STRONG_COPY)
+    flat, _ = heuristic_scores(FLAT_COPY)
+    assert sum(strong.values()) > sum(flat.values()) + 20
+    for criterion in ("Empathy", "Action", "Trust", "Influence"):
+        assert strong[criterion] > flat[criterion]
+
+
+def test_analysis_is_parseable_and_fast():
+    assert parse_analysis_result(heuristic_analysis(STRONG_COPY)) == heuristic_scores(STRONG_COPY)
+    started = time.perf_counter()
+    heuristic_scores(SAMPLE_TEXT * 20)
+    assert time.perf_counter() - started < 0.5
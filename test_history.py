@@ -0,0 +1,43 @@
+import numpy as np
+
+from analyzer import CRITERIA
+from history import HistoryStore, score_trends
+
+DAY = 86400
+
+
+def scores_of(value):
+    return {criterion: value for criterion in CRITERIA}
+
+
+def test_record_and_find_by_email_and_text():
+    store = HistoryStore(path=":memory:")
+    store.record("Our  new planner\nsaves you time.", scores_of(6), {"Trust": "Add proof"}, email="Me@Example.com",
+                 language="en", duration=1.5)
+    store.record("Another text entirely.", scores_of(4), {}, email="other@example.com")
+    found = store.find("Our new planner saves you time.", email="me@example.com")
+    assert found["scores"] == scores_of(6) and found["suggestions"] == {"Trust": "Add proof"}
+    assert found["duration_ms"] == 1500 and found["average_score"] == 6
+    assert store.find("Our new planner saves you time.", email="other@example.com") is None
+    assert [item["average_score"] for item in store.history()] == [4, 6]
+
+
+def test_score_matrix_filters_by_url_and_date():
+    store = HistoryStore(path=":memory:")
+    for day in range(10):
+        store.record(f"Text {day}", scores_of(day % 10 + 1), {}, url="https://example.com/a" if day % 2 else None,
+                     created_at=1_700_000_000 + day * DAY)
+    times, scores = store.score_matrix(url="https://example.com/a", since=1_700_000_000 + 5 * DAY)
+    assert scores.shape == (3, len(CRITERIA)) and list(scores[:, 0]) == [6, 8, 10]
+    assert list(times) == sorted(times)
+
+
+def test_score_trends_ignores_missing_criteria():
+    times = np.array([0, 3600, DAY + 10, DAY + 20], dtype=float)
+    scores = np.full((4, len(CRITERIA)), 5.0)
+    scores[1] = 7.0
+    scores[3, 0] = np.nan
+    starts, counts, overall, criteria_means = score_trends(times, scores, "day")
+    assert list(starts) == [0, DAY] and list(counts) == [2, 2]
+    assert list(overall) == [6.0, 5.0]
+    assert criteria_means[0, 0] == 6.0 and criteria_means[1, 0] == 5.0
@@ -0,0 +1,53 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from ingestion import PageCache, extract_paragraphs, fetch_article
+
+PAGE = b"""<html><head><script>var p = "<p>nope</p>";</script></head><body>
+<nav><p>Menu</p></nav>
+<article><header><p>Byline</p></header>
+<p>First <b>paragraph</b>.</p><p>Second
+paragraph<p>Third</article>
+<main><p>Ignored because an article exists</p></main>
+</body></html>"""
+
+
+def test_extract_paragraphs_prefers_article():
+    assert extract_paragraphs(PAGE.decode()) == "First paragraph.\n\nSecond paragraph\n\nThird"
+
+
+def test_extract_paragraphs_falls_back_to_post_content():
+    html = '<div class="post-content lead"><div><p>Nested</p></div><p>Body</p></div><p>Outside</p>'
+    assert extract_paragraphs(html) == "Nested\n\nBody"
+    assert extract_paragraphs("<p>No container</p>") is None
+
+
+def test_fetch_article_uses_conditional_get(tmp_path):
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/page"
+        cache = PageCache(path=str(tmp_path / "pages.sqlite3"))
+        assert fetch_article(url, page_cache=cache) == "First paragraph.\n\nSecond paragraph\n\nThird"
+        assert fetch_article(url, page_cache=cache) == "First paragraph.\n\nSecond paragraph\n\nThird"
+        assert requests_seen == [None, '"v1"']
+        assert fetch_article(url, page_cache=PageCache(path=":memory:"), max_bytes=10) is None
+    finally:
+        server.shutdown()
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+import pytest
+from metrics import MetricsRegistry, REGISTRY, record_usage, span, timed
+
+
+def test_span_records_duration_sizes_and_errors():
+    REGISTRY.reset()
+    with span("unit", input_bytes=10) as attributes:
+        attributes["output_bytes"] = 4
+    with pytest.raises(ValueError):
+        with span("unit"):
+            raise ValueError("boom")
+    assert REGISTRY.value("copycheck_stage_duration_seconds", stage="unit", status="ok") == 1
+    assert REGISTRY.value("copycheck_stage_duration_seconds", stage="unit", status="error") == 1
+    assert REGISTRY.value("copycheck_stage_bytes_total", stage="unit", direction="output") == 4
+
+
+def test_timed_counts_none_as_error_and_usage_tokens():
+    REGISTRY.reset()
+    timed("unit")(lambda: None)()
+    record_usage(SimpleNamespace(prompt_tokens=120, completion_tokens=30), "model")
+    assert REGISTRY.value("copycheck_stage_duration_seconds", stage="unit", status="error") == 1
+    assert REGISTRY.value("copycheck_llm_tokens_total", model="model", kind="prompt") == 120
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.observe("copycheck_stage_duration_seconds", 0.5, stage="pdf")
+    registry.inc("copycheck_retries_total", stage='say "hi"')
+    text = registry.render()
+    assert "# TYPE copycheck_stage_duration_seconds histogram" in text
+    assert 'copycheck_stage_duration_seconds_bucket{stage="pdf",le="0.1"} 0' in text
+    assert 'copycheck_stage_duration_seconds_bucket{stage="pdf",le="+Inf"} 1' in text
+    assert 'copycheck_retries_total{stage="say \\"hi\\""} 1' in text
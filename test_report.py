@@ -0,0 +1,16 @@
+import report_pdf
+from report import create_pdf_report
+
+SCORES = {"Empathy": 7.5, "Clarity": 4}
+SUGGESTIONS = {"Empathy": "Parlez à un seul lecteur", "Clarity": "Короче предложения"}
+
+
+def test_report_embeds_unicode_font():
+    pdf = create_pdf_report("Achetez maintenant — Купите сейчас", SCORES, SUGGESTIONS, "")
+    assert bytes(pdf).startswith(b"%PDF") and b"DejaVuSans" in pdf
+
+
+def test_report_falls_back_to_core_font(monkeypatch):
+    monkeypatch.setattr(report_pdf, "_report_fonts", {})
+    pdf = create_pdf_report("Купите сейчас", SCORES, SUGGESTIONS, "")
+    assert pdf is not None and b"DejaVuSans" not in pdf
@@ -0,0 +1,59 @@
+import json
+import pytest
+from analysis_cache import AnalysisCache
+from analyzer import ANALYSIS_MODEL, analysis_cache_key, request_analysis
+from routing import ModelRouter, triage
+
+COPY = "Stop losing leads to slow follow-ups. Our assistant answers every enquiry in under a minute, day or night."
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("   ", "empty"),
+    ("Buy now!", "too_short"),
+    ("<div>{{ 1234 }}</div> <div>{{ 5678 }}</div> <div>{{ 9012 }}</div> 3456 7890 1234 5678 9012", "not_text"),
+    ("buy " * 40, "repetitive"),
+    ("We use cookies to improve your experience on our site. Accept all cookies to continue.", "boilerplate"),
+    ("404 - Page not found. The page you are looking for could not be found. Go back to the home page.", "boilerplate"),
+])
+def test_triage_rejects_junk(text, reason):
+    verdict = triage(text)
+    assert not verdict["accepted"] and verdict["reason"] == reason
+
+
+def test_triage_accepts_copy_and_detects_language():
+    assert triage(COPY) == {"accepted": True, "reason": None, "warnings": [], "language": "en", "characters": len(COPY),
+                            "words": 19, "estimated_tokens": len(COPY) // 4 + 1}
+    assert triage("Découvrez la solution qui vous fait gagner du temps pour les tâches de tous les jours.")["language"] == "fr"
+
+
+@pytest.mark.parametrize("text, warning", [
+    ("Subscribe to our newsletter and get one practical copywriting tip every week, from people who write for a living.",
+     "boilerplate"),
+    ("Our crawler finds every 404 on your site before your customers do. Fix broken links in one click.", "boilerplate"),
+    ("Never show your team an access denied page. Our SSO connects every app you use in minutes.", "boilerplate"),
+    ("Save 50% today: 3 plans from $9/mo, 14-day trial. 2x faster, 24/7, 99.9% SLA, 10k+ teams.", "not_text"),
+])
+def test_triage_warns_about_plausible_copy(text, warning):
+    verdict = triage(text)
+    assert verdict["accepted"] and verdict["warnings"] == [warning]
+
+
+def test_router_falls_back_and_skips_cache(fake_client):
+    client = fake_client(failures={ANALYSIS_MODEL: RateLimited("rate limited")})
+    cache = AnalysisCache(path=":memory:")
+    router = ModelRouter(client, ["small-model"])
+    assert json.loads(request_analysis(router, COPY, cache=cache))["criteria"][0]["score"] == 7
+    assert client.models == [ANALYSIS_MODEL, "small-model"]
+    # The fallback answer is not stored under the analysis model's key
+    assert cache.get(analysis_cache_key(COPY)) is None
+
+
+def test_router_raises_non_retryable_errors(fake_client):
+    client = fake_client(failures={ANALYSIS_MODEL: ValueError("bad request")})
+    with pytest.raises(ValueError):
+        ModelRouter(client, ["small-model"]).chat.completions.create(model=ANALYSIS_MODEL, messages=[])
+    assert client.models == [ANALYSIS_MODEL]
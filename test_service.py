@@ -0,0 +1,111 @@
+import asyncio
+import json
+import httpx
+import pytest
+import engine
+from analysis_cache import AnalysisCache
+from analyzer import CRITERIA
+import service
+from service import app
+
+def request(method, path, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def groq_client(monkeypatch, fake_client, analysis_response):
+    client = fake_client(analysis_response(score=6))
+    monkeypatch.setattr(engine, "_groq_client", client)
+    monkeypatch.setattr(engine, "_analysis_cache", AnalysisCache(path=":memory:"))
+    monkeypatch.setattr(engine, "_near_duplicate_index", None)
+    return client
+
+
+def test_analyze_returns_scores(groq_client):
+    response = request("POST", "/analyze", json={"text": "Get more leads with less effort, starting with your very next campaign."})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["average_score"] == 6 and body["missing"] == []
+    assert body["suggestions"]["Trust"] == "Add proof"
+
+
+def test_analyze_batch_streams_ndjson(groq_client):
+    items = [{"id": "a", "text": "First copy: save two hours a week with our scheduling tool"},
+             {"id": "b", "text": "Second copy: your team ships faster when reviews take minutes"}]
+    response = request("POST", "/analyze/batch", json={"items": items})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["id"] for line in lines) == ["a", "b"]
+    assert all(line["status"] == "ok" for line in lines)
+
+
+def test_errors(groq_client):
+    assert request("POST", "/analyze", json={}).status_code == 400
+    assert request("POST", "/analyze", content=b"not json").status_code == 400
+    assert request("GET", "/missing").status_code == 404
+    for concurrency in ("fast", [2], "Infinity"):
+        body = {"items": [{"text": "Some copy"}], "concurrency": concurrency}
+        assert request("POST", "/analyze/batch", json=body).status_code == 400
+
+
+def test_non_string_input_is_a_client_error(groq_client):
+    for body in ({"text": 123}, {"url": ["https://example.com"]}, {"text": {"copy": "Buy now"}}):
+        response = request("POST", "/analyze", json=body)
+        assert response.status_code == 400 and "must be a string" in response.json()["error"]
+    body = {"items": [{"text": "Some copy"}, {"url": 42}]}
+    response = request("POST", "/analyze/batch", json=body)
+    assert response.status_code == 400 and response.json()["error"] == "Item 2: url must be a string"
+    assert groq_client.calls == 0
+
+
+def test_metrics_after_analysis(groq_client):
+    request("POST", "/analyze", json={"text": "Metrics test copy that reads like a real landing page headline."})
+    response = request("GET", "/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'copycheck_stage_duration_seconds_count{stage="analyze_text",status="ok"}' in response.text
+    assert 'copycheck_cache_requests_total{result="miss"}' in response.text
+    assert "# TYPE copycheck_near_duplicate_requests_total counter" in response.text
+    assert 'copycheck_near_duplicate_requests_total{result="miss"}' in response.text
+
+
+def test_analyze_degrades_to_local_scores(groq_client):
+
+    def unavailable(**kwargs):
+        raise ConnectionError("Groq is down")
+    groq_client.respond = unavailable
+    text = "Get more leads with less effort, starting with your very next campaign."
+    assert request("POST", "/analyze", json={"text": text}).status_code == 502
+    response = request("POST", "/analyze", json={"text": text, "allow_degraded": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["source"] == "heuristic" and sorted(body["scores"]) == sorted(CRITERIA)
+
+
+def test_analyze_reuses_scores_of_near_duplicates(groq_client):
+    text = "Spring sale ends on 12 March: get {} off every plan, with onboarding included for teams of any size."
+    assert request("POST", "/analyze", json={"text": text.format("20%")}).json()["near_duplicate"] is None
+
+    def unavailable(**kwargs):
+        raise ConnectionError("Groq is down")
+    groq_client.respond = unavailable
+    body = request("POST", "/analyze", json={"text": text.replace("12", "19").format("25%")}).json()
+    assert body["near_duplicate"] == 1.0 and body["average_score"] == 6
+
+
+def test_fallback_answers_are_not_reused_for_near_duplicates(groq_client):
+
+    groq_client.model = "llama-3.1-8b-instant"
+    text = "Spring sale ends on 12 March: get 20% off every plan, with onboarding included for teams of any size."
+    assert request("POST", "/analyze", json={"text": text}).json()["model"] == "llama-3.1-8b-instant"
+    assert request("POST", "/analyze", json={"text": text.replace("12", "19")}).json()["near_duplicate"] is None
+
+
+def test_analyze_turns_away_bursts_with_retry_after(monkeypatch, groq_client):
+    monkeypatch.setattr(service, "_analysis_slots", asyncio.Semaphore(0))
+    monkeypatch.setattr(service, "MAX_QUEUED_ANALYSES", 0)
+    response = request("POST", "/analyze", json={"text": "Get more leads with less effort, starting with your very next campaign."})
+    assert response.status_code == 503 and response.headers["retry-after"] == "10"
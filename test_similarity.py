@@ -0,0 +1,27 @@
+from similarity import NearDuplicateIndex
+
+PAGE = ("Plan your week in minutes. Our planner turns your task list into a realistic schedule, moves what slips "
+        "and keeps your team in sync without another status meeting. Teams that switched report fewer missed "
+        "deadlines and calmer Mondays. Start your free trial today and cancel anytime before 12 March.")
+
+
+def test_finds_near_duplicates_only():
+    index = NearDuplicateIndex(threshold=0.6)
+    index.add(PAGE, ({"Clarity": 8}, {"Clarity": "Shorten the headline"}))
+    assert index.lookup(PAGE.replace("12 March", "19 March")) == (({"Clarity": 8}, {"Clarity": "Shorten the headline"}), 1.0)
+
+    value, similarity = index.lookup(PAGE.replace("calmer Mondays", "happier clients"))
+    assert value[0] == {"Clarity": 8} and 0.6 <= similarity < 1.0
+    assert index.lookup("Fresh coffee beans roasted every morning and delivered to your door within two days.") is None
+    assert index.stats()["hits"] == 2 and index.stats()["misses"] == 1
+
+
+def test_memory_is_bounded():
+    index = NearDuplicateIndex(max_entries=2)
+    pages = [PAGE.replace("planner", name) for name in ("calendar", "organizer", "assistant")]
+    for page in pages:
+        index.add(page, ({"Clarity": 8}, {}))
+    assert index.stats()["entries"] == 2 and index.stats()["evictions"] == 1
+    assert index.lookup(pages[0]) is None or index.lookup(pages[0])[1] < 1.0
+    index.clear()
+    assert index.stats()["entries"] == 0 and index.lookup(pages[2]) is None
@@ -0,0 +1,47 @@
+import io
+import zipfile
+
+import pytest
+
+from uploads import UploadError, extract_upload, iter_txt_paragraphs
+
+DOCUMENT_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>Ship landing pages</w:t></w:r><w:r><w:t xml:space="preserve"> in minutes.</w:t></w:r></w:p>'
+    '<w:p></w:p>'
+    '<w:p><w:r><w:t>Start your free trial</w:t><w:tab/><w:t>today.</w:t></w:r></w:p>'
+    '</w:body></w:document>'
+)
+
+
+def named_file(name, data):
+    uploaded = io.BytesIO(data)
+    uploaded.name = name
+    return uploaded
+
+
+def test_txt_paragraphs_span_read_chunks(tmp_path):
+    path = tmp_path / "copy.txt"
+    path.write_bytes("First paragraph\nstill first.\n\n\nSecond café paragraph.\n".encode("utf-8-sig"))
+    # Reads of 7 bytes split paragraphs and the two-byte "é" across chunks
+    assert list(iter_txt_paragraphs(path, chunk_size=7)) == ["First paragraph still first.", "Second café paragraph."]
+
+
+def test_extract_upload_reads_docx_in_worker():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as docx:
+        docx.writestr("word/document.xml", DOCUMENT_XML)
+    text = extract_upload(named_file("copy.docx", archive.getvalue()))
+    assert text == "Ship landing pages in minutes.\n\nStart your free trial today."
+
+
+def test_extract_upload_limits():
+    body = "\n\n".join(f"Paragraph number {i} of the uploaded copy." for i in range(100)).encode()
+    text = extract_upload(named_file("copy.TXT", body), max_characters=100)
+    assert text.count("\n\n") == 1 and len(text) <= 100
+    with pytest.raises(UploadError):
+        extract_upload(named_file("copy.odt", body))
+    with pytest.raises(UploadError):
+        extract_upload(named_file("copy.txt", body), timeout=0)
+    with pytest.raises(UploadError):
+        extract_upload(named_file("copy.docx", b"not a zip archive"))
@@ -0,0 +1,172 @@
+import codecs
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+from chunking import CHUNK_MAX_LENGTH, MAX_CHUNKS
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# Seconds the worker process may spend extracting a file
+MAX_EXTRACTION_SECONDS = 60
+# Text kept from a file: past this, the analysis would cut the document off anyway
+MAX_UPLOAD_CHARACTERS = MAX_CHUNKS * CHUNK_MAX_LENGTH
+# Address space of the worker process, so a pathological file fails alone instead of swapping the server
+WORKER_MEMORY_BYTES = 1024 * 1024 * 1024
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+
+
+class UploadError(Exception):
+    """Raised when an uploaded file cannot be read within the limits"""
+
+
+# Function to split a block of text into paragraphs
+def split_blocks(text):
+    """Yield the non-empty paragraphs of text, with whitespace collapsed"""
+    for block in _PARAGRAPH_BREAK_RE.split(text):
+        paragraph = ' '.join(block.split())
+        if paragraph:
+            yield paragraph
+
+# Function to read paragraphs from a text file
+def iter_txt_paragraphs(path, chunk_size=64 * 1024, max_paragraph=64 * 1024):
+    """Yield the paragraphs of a UTF-8 text file, decoding it chunk by chunk"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            pending += decoder.decode(chunk, final=not chunk)
+            # Only complete paragraphs are emitted; the last one may continue in the next chunk
+            blocks = _PARAGRAPH_BREAK_RE.split(pending)
+            pending = blocks.pop() if chunk else ""
+            if len(pending) > max_paragraph:
+                # A file without blank lines is still emitted in pieces, cut between words
+                cut = pending.rfind(' ') + 1 or len(pending)
+                blocks.append(pending[:cut])
+                pending = pending[cut:]
+            for block in blocks:
+                yield from split_blocks(block)
+            if not chunk:
+                break
+
+# Function to read paragraphs from a Word document
+def iter_docx_paragraphs(path):
+    """Yield the paragraphs of a .docx file, parsing its XML as it is decompressed"""
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for _, element in ET.iterparse(document, events=("end",)):
+            if element.tag != _WORD_NAMESPACE + "p":
+                continue
+            parts = []
+            for node in element.iter():
+                if node.tag == _WORD_NAMESPACE + "t" and node.text:
+                    parts.append(node.text)
+                elif node.tag in (_WORD_NAMESPACE + "tab", _WORD_NAMESPACE + "br"):
+                    parts.append(" ")
+            yield from split_blocks("".join(parts))
+            # Paragraphs are dropped once read so the document tree never builds up
+            element.clear()
+
+# Function to read paragraphs from a PDF
+def iter_pdf_paragraphs(path):
+    """Yield the paragraphs of a PDF page by page"""
+    # pypdf is only needed (and loaded) in the extraction worker
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    for page in reader.pages:
+        yield from split_blocks(page.extract_text() or "")
+
+
+EXTRACTORS = {".pdf": iter_pdf_paragraphs, ".docx": iter_docx_paragraphs, ".txt": iter_txt_paragraphs}
+
+
+# Function run in the extraction worker process
+def extraction_worker(path, extension, connection, memory_limit=WORKER_MEMORY_BYTES):
+    """Send ("paragraph", text) messages through connection, then None, or ("error", message)"""
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ImportError, ValueError, OSError) as e:
+        logging.warning(f"Could not limit the extraction worker memory: {str(e)}")
+    try:
+        for paragraph in EXTRACTORS[extension](path):
+            # send blocks while the pipe is full, so the worker never runs far ahead of the reader
+            connection.send(("paragraph", paragraph))
+        connection.send(None)
+    except MemoryError:
+        connection.send(("error", "The file needs too much memory to be read"))
+    except Exception as e:
+        connection.send(("error", f"The file could not be read ({type(e).__name__})"))
+    finally:
+        connection.close()
+
+# Function to extract paragraphs in a worker process
+def iter_file_paragraphs(path, extension, timeout=MAX_EXTRACTION_SECONDS):
+    """Yield the paragraphs of a file as a worker process extracts them.
+
+    The worker is killed when the caller stops early or the time limit passes (UploadError).
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=extraction_worker, args=(path, extension, sender), daemon=True)
+    process.start()
+    sender.close()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not receiver.poll(remaining):
+                raise UploadError(f"The file took more than {timeout} seconds to read")
+            try:
+                message = receiver.recv()
+            except EOFError:
+                raise UploadError("The file could not be read")
+            if message is None:
+                return
+            kind, value = message
+            if kind == "error":
+                raise UploadError(value)
+            yield value
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+# Function to extract the text of an uploaded file
+def extract_upload(uploaded_file, max_characters=MAX_UPLOAD_CHARACTERS, timeout=MAX_EXTRACTION_SECONDS):
+    """Return the text of an uploaded PDF, DOCX or TXT file (a file object with a name), cut at
+    max_characters, one paragraph per block"""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise UploadError(f"Unsupported file type: {extension or 'none'}")
+
+    uploaded_file.seek(0, os.SEEK_END)
+    if uploaded_file.tell() > MAX_UPLOAD_BYTES:
+        raise UploadError(f"The file is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    uploaded_file.seek(0)
+
+    with tempfile.NamedTemporaryFile(suffix=extension) as copy:
+        # The worker reads from disk, so the upload is copied over in chunks rather than pickled whole
+        shutil.copyfileobj(uploaded_file, copy, 1024 * 1024)
+        copy.flush()
+
+        paragraphs = []
+        length = 0
+        for paragraph in iter_file_paragraphs(copy.name, extension, timeout):
+            if length + len(paragraph) > max_characters:
+                logging.warning(f"Upload {uploaded_file.name} cut off after {length} characters")
+                break
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+    if not paragraphs:
+        raise UploadError("No text found in the file")
+    return '\n\n'.join(paragraphs)